@@ -0,0 +1,444 @@
+import select
+import socket
+import socketserver
+import struct
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from capture import BufferPool
+
+
+ADB_HOST = '127.0.0.1'
+ADB_PORT = 5037
+
+# screencap's raw pixel formats (android.graphics.PixelFormat): bytes per pixel, channel order
+PIXEL_FORMATS = {
+    1: (4, 'RGBA'),     # RGBA_8888
+    2: (4, 'RGBA'),     # RGBX_8888, alpha byte unused
+    3: (3, 'RGB'),      # RGB_888
+    5: (4, 'BGRA'),     # BGRA_8888
+}
+
+# Echoed after every batch of shell commands, so one read tells us they have all finished
+DONE_MARKER = '--adb-batch-done--'
+
+# Shell commands sent per round trip during a deployment
+MAX_BATCH = 32
+
+
+class AdbError(Exception):
+    """The ADB server refused a request or the device connection dropped"""
+
+
+# ========== HOST PROTOCOL ==========
+# The adb server speaks "smart sockets" on 127.0.0.1:5037: each request is its length in
+# 4 hex digits followed by the text, and the reply is OKAY, or FAIL plus a length-prefixed
+# message. After host:transport the same socket talks to the device, and after a service
+# such as exec:sh it carries that service's raw byte stream until closed.
+
+def recv_exact(sock, size):
+    chunks = []
+    while size:
+        chunk = sock.recv(size)
+        if not chunk:
+            raise AdbError("ADB connection closed")
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b''.join(chunks)
+
+
+def adb_request(sock, request):
+    data = request.encode()
+    sock.sendall(b'%04x' % len(data) + data)
+    status = recv_exact(sock, 4)
+    if status == b'OKAY':
+        return
+    if status == b'FAIL':
+        message = recv_exact(sock, int(recv_exact(sock, 4), 16)).decode(errors='replace')
+        raise AdbError(f"ADB refused '{request}': {message}")
+    raise AdbError(f"Unexpected ADB reply {status!r} to '{request}'")
+
+
+def open_service(service, serial=None, host=ADB_HOST, port=ADB_PORT, timeout=10.0):
+    """Socket connected to a device service, e.g. 'exec:sh'"""
+    sock = socket.create_connection((host, port), timeout=timeout)
+    try:
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        adb_request(sock, f'host:transport:{serial}' if serial else 'host:transport-any')
+        adb_request(sock, service)
+    except BaseException:
+        sock.close()
+        raise
+    return sock
+
+
+class AdbShell:
+    """One long-lived 'exec:sh' session on the device
+
+    exec: runs without a pty, so output is binary-safe and nothing is rewritten. Commands
+    go to the shell's stdin and the session stays open between them: no connection,
+    handshake or extra process per frame or tap.
+    """
+
+    def __init__(self, serial=None, host=ADB_HOST, port=ADB_PORT, timeout=10.0):
+        self.serial = serial
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.sock = None
+        self.buffer = bytearray()
+        self.round_trips = 0
+
+    def open(self):
+        """Connect if needed, replacing a session the device has closed since its last use"""
+        if self.sock is not None and self.closed_by_device():
+            self.close()
+        if self.sock is None:
+            self.sock = open_service('exec:sh', self.serial, self.host, self.port, self.timeout)
+            self.buffer.clear()
+        return self
+
+    def closed_by_device(self):
+        """True if the session has hit end-of-stream (adbd restarted, emulator snapshot)"""
+        readable, _, _ = select.select([self.sock], [], [], 0)
+        if not readable:
+            return False
+        try:
+            return not self.sock.recv(1, socket.MSG_PEEK)
+        except OSError:
+            return True
+
+    def close(self):
+        if self.sock is not None:
+            try:
+                self.sock.sendall(b'exit\n')
+            except OSError:
+                pass
+            self.sock.close()
+            self.sock = None
+
+    def send(self, command):
+        self.open()
+        self.sock.sendall(command.encode() + b'\n')
+
+    def read_into(self, out):
+        """Fill a writable buffer (e.g. a NumPy array) with the next bytes of output"""
+        view = memoryview(out).cast('B')
+        filled = min(len(self.buffer), len(view))
+        if filled:
+            view[:filled] = self.buffer[:filled]
+            del self.buffer[:filled]
+        while filled < len(view):
+            n = self.sock.recv_into(view[filled:])
+            if not n:
+                raise AdbError("ADB shell closed")
+            filled += n
+
+    def read_until(self, marker):
+        """Output up to marker; the marker and its line end are consumed"""
+        marker = marker.encode()
+        while True:
+            index = self.buffer.find(marker)
+            if index >= 0:
+                end = self.buffer.find(b'\n', index)
+                if end >= 0:
+                    data = bytes(self.buffer[:index])
+                    del self.buffer[:end + 1]
+                    return data
+            chunk = self.sock.recv(65536)
+            if not chunk:
+                raise AdbError("ADB shell closed")
+            self.buffer += chunk
+
+    def run(self, commands):
+        """Run several commands in one round trip; returns their combined output"""
+        self.send('\n'.join(list(commands) + [f'echo {DONE_MARKER}']))
+        self.round_trips += 1
+        return self.read_until(DONE_MARKER)
+
+
+# ========== CAPTURE ==========
+
+class AdbBackend:
+    """Device screen streamed as raw screencap output over a persistent adb shell
+
+    `screencap` without -p writes a short header and the raw framebuffer, which is
+    received straight into a NumPy array: no PNG encode on the device and no decode
+    here. The header length differs between Android versions (12 or 16 bytes) and is
+    measured once when connecting. The device always sends the full screen; a bbox
+    is a view into it. Frames are received into pooled arrays (capture.BufferPool).
+    """
+    name = 'adb'
+
+    def __init__(self, serial=None, host=ADB_HOST, port=ADB_PORT, timeout=10.0):
+        self.shell = AdbShell(serial, host, port, timeout)
+        self.buffers = BufferPool()
+        self.frames = 0
+        self.bytes = 0
+        self.connect()
+
+    def connect(self):
+        # Size and format from the first 12 header bytes, header length from the byte count
+        output = self.shell.open().run(['screencap 2>/dev/null | head -c 12',
+                                        'screencap 2>/dev/null | wc -c'])
+        if len(output) < 13:
+            raise AdbError(f"screencap failed: {output[:200]!r}")
+        width, height, fmt = struct.unpack('<III', output[:12])
+        if fmt not in PIXEL_FORMATS:
+            raise AdbError(f"Unsupported screencap pixel format {fmt}")
+        self.channels, self.order = PIXEL_FORMATS[fmt]
+        self.shape = (height, width, self.channels)
+        self.header_size = int(output[12:]) - width * height * self.channels
+        if self.header_size not in (12, 16):
+            raise AdbError(f"Unexpected screencap output size for {width}x{height}")
+        self.header = bytearray(self.header_size)
+
+    def grab(self, bbox=None):
+        try:
+            image = self.read_frame()
+        except (OSError, AdbError):
+            # One reconnect: adbd restarts and emulator snapshots drop the shell
+            self.shell.close()
+            self.connect()
+            image = self.read_frame()
+        if bbox is not None:
+            x1, y1, x2, y2 = bbox
+            image = image[y1:y2, x1:x2]
+        return image
+
+    def read_frame(self):
+        self.shell.send('screencap 2>/dev/null')
+        self.shell.read_into(self.header)
+        width, height, fmt = struct.unpack_from('<III', self.header)
+        if (height, width, self.channels) != self.shape or PIXEL_FORMATS.get(fmt, (0, ''))[1] != self.order:
+            # Rotated or reconfigured display: the stream is out of step, so start over
+            raise AdbError(f"Screen changed to {width}x{height} (format {fmt})")
+        # Reused only once callers have let go of the frame it last held
+        image = self.buffers.get(self.shape)
+        self.shell.read_into(image)
+        self.frames += 1
+        self.bytes += self.header_size + image.nbytes
+        return image
+
+    def close(self):
+        self.shell.close()
+
+
+# ========== INPUT ==========
+
+class AdbInput:
+    """Taps and swipes through `input` commands on a persistent adb shell
+
+    Clicks go out at once. Deploy events are queued: a tap becomes `input tap`, a
+    down/move/up drag becomes one `input swipe` lasting as long as the drag did, and the
+    queue is sent as a single shell round trip every MAX_BATCH commands and on flush().
+    A batch is never sent twice: once it has gone out, a failure may come after some of
+    its taps ran, so it is dropped and reported rather than repeated.
+    """
+    name = 'adb'
+
+    def __init__(self, serial=None, host=ADB_HOST, port=ADB_PORT, timeout=10.0,
+                 max_batch=MAX_BATCH, drag_ms=300, clock=time.perf_counter):
+        self.shell = AdbShell(serial, host, port, timeout)
+        self.max_batch = max_batch
+        self.drag_ms = drag_ms
+        self.clock = clock
+        self.pending = []
+        self.position = None
+        self.press = None
+        self.sent = 0
+        self.dropped = 0
+
+    def click(self, pos):
+        self.position = pos
+        self.queue(f'input tap {int(pos[0])} {int(pos[1])}')
+        self.flush()
+
+    def drag_to(self, pos):
+        start = self.position or pos
+        self.position = pos
+        self.queue(f'input swipe {int(start[0])} {int(start[1])} {int(pos[0])} {int(pos[1])} {self.drag_ms}')
+        self.flush()
+
+    def event(self, kind, pos):
+        if kind == 'down':
+            self.press = (pos, self.clock())
+        elif kind == 'move':
+            pass
+        elif kind == 'up':
+            start, pressed = self.press or (pos, self.clock())
+            self.press = None
+            ms = max(1, round((self.clock() - pressed) * 1000))
+            self.queue(f'input swipe {int(start[0])} {int(start[1])} {int(pos[0])} {int(pos[1])} {ms}')
+        elif kind == 'tap':
+            self.queue(f'input tap {int(pos[0])} {int(pos[1])}')
+        else:
+            raise ValueError(f"Unknown input event '{kind}'")
+        self.position = pos
+        if len(self.pending) >= self.max_batch:
+            self.flush()
+
+    def queue(self, command):
+        self.pending.append(command)
+
+    def flush(self):
+        """Send every queued command in one round trip and wait for them to finish"""
+        if not self.pending:
+            return
+        commands, self.pending = self.pending, []
+        try:
+            self.shell.open()
+        except (OSError, AdbError):
+            # Nothing has been sent yet, so one more connection attempt is safe
+            self.shell.close()
+            self.shell.open()
+        try:
+            self.shell.run(commands)
+        except (OSError, AdbError) as e:
+            self.shell.close()
+            self.dropped += len(commands)
+            print(f"  ⚠ adb input failed after sending ({e}); {len(commands)} command(s) dropped, not resent")
+            return
+        self.sent += len(commands)
+
+    def close(self):
+        self.flush()
+        self.shell.close()
+
+
+# ========== FAKE SERVER ==========
+
+class FakeAdbServer:
+    """Local stand-in for the adb server and one device, for tests and benchmarks
+
+    Speaks the host protocol on 127.0.0.1 (a free port by default) and runs a tiny
+    shell: `screencap` streams the current frame in raw RGBA_8888 with a 16-byte
+    header, `| head -c N` and `| wc -c` work on it, `echo` echoes, and every `input`
+    command is recorded in `commands` and advances to the next frame. drop_sessions()
+    and `crash_after` cut shells off the way a restarting adbd does.
+    """
+
+    def __init__(self, frames, port=0, serial='fake-5554'):
+        self.serial = serial
+        self.frames = []
+        for frame in frames:
+            h, w = frame.shape[:2]
+            pixels = cv2.cvtColor(frame, cv2.COLOR_BGR2RGBA)
+            self.frames.append(struct.pack('<IIII', w, h, 1, 0) + pixels.tobytes())
+        self.index = 0
+        self.commands = []
+        self.requests = []
+        self.sessions = set()
+        # Close the shell, once, when it reaches a line after this many input commands
+        self.crash_after = None
+        self.lock = threading.Lock()
+
+        server = self
+
+        class Handler(socketserver.BaseRequestHandler):
+            def handle(self):
+                server.handle(self.request)
+
+        socketserver.ThreadingTCPServer.allow_reuse_address = True
+        self.server = socketserver.ThreadingTCPServer((ADB_HOST, port), Handler)
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def drop_sessions(self):
+        """Close every open shell from the device side"""
+        with self.lock:
+            sessions = list(self.sessions)
+        for sock in sessions:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def handle(self, sock):
+        try:
+            while True:
+                size = int(recv_exact(sock, 4), 16)
+                request = recv_exact(sock, size).decode()
+                with self.lock:
+                    self.requests.append(request)
+                if request in ('host:transport-any', f'host:transport:{self.serial}'):
+                    sock.sendall(b'OKAY')
+                elif request == 'exec:sh':
+                    sock.sendall(b'OKAY')
+                    with self.lock:
+                        self.sessions.add(sock)
+                    try:
+                        self.shell(sock)
+                    finally:
+                        with self.lock:
+                            self.sessions.discard(sock)
+                    return
+                else:
+                    message = f"unknown request or device: {request}".encode()
+                    sock.sendall(b'FAIL' + b'%04x' % len(message) + message)
+                    return
+        except (AdbError, OSError, ValueError):
+            pass
+
+    def shell(self, sock):
+        pending = b''
+        while True:
+            chunk = sock.recv(65536)
+            if not chunk:
+                return
+            pending += chunk
+            *lines, pending = pending.split(b'\n')
+            for line in lines:
+                if line.strip() == b'exit':
+                    return
+                with self.lock:
+                    crash = self.crash_after is not None and len(self.commands) >= self.crash_after
+                    if crash:
+                        self.crash_after = None
+                if crash:
+                    return
+                sock.sendall(self.run(line.decode().strip()))
+
+    def run(self, line):
+        out = []
+        for command in filter(None, (part.strip() for part in line.split(';'))):
+            stages = [stage.strip() for stage in command.split('|')]
+            program = stages[0].split()
+            if program[0] == 'screencap':
+                data = self.frames[self.index % len(self.frames)]
+            elif program[0] == 'echo':
+                data = (' '.join(program[1:]) + '\n').encode()
+            elif program[0] == 'input':
+                with self.lock:
+                    self.commands.append(command)
+                    self.index += 1
+                data = b''
+            else:
+                data = f"sh: {program[0]}: not found\n".encode()
+            for stage in stages[1:]:
+                words = stage.split()
+                if words[:2] == ['head', '-c']:
+                    data = data[:int(words[2])]
+                elif words[:2] == ['wc', '-c']:
+                    data = f'{len(data)}\n'.encode()
+            out.append(data)
+        return b''.join(out)
@@ -0,0 +1,174 @@
+import sqlite3
+
+import numpy as np
+
+from thresholds import RESOURCES, DEFAULT_QUANTILES, fit_model
+
+
+COLUMNS = ('gold, elixir, dark, search_s, attacked, attack_s, '
+           'earned_gold, earned_elixir, earned_dark')
+
+# Offline runs can afford a much finer grid than the live controller
+GRID_QUANTILES = tuple(np.round(np.linspace(0.5, 0.995, 16), 3))
+
+# Changes whenever rows are added or an attack/result is filled in
+CACHE_KEY_SQL = 'SELECT COUNT(*), MAX(id), SUM(attacked), COUNT(earned_gold) FROM bases'
+
+
+def load_log(path, cache=True):
+    """Rows of one base log in BaseStore.recent() column order
+
+    Pulling millions of rows through sqlite3 is by far the slowest step, so the
+    array is cached next to the log (<path>.npz) until the log changes.
+    """
+    db = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+    try:
+        key = np.array(db.execute(CACHE_KEY_SQL).fetchone(), dtype=np.float64)
+        cache_path = f'{path}.npz'
+        if cache:
+            try:
+                with np.load(cache_path) as cached:
+                    if np.array_equal(cached['key'], key, equal_nan=True):
+                        return cached['rows']
+            except (OSError, KeyError, ValueError):
+                pass
+        rows = db.execute(f'SELECT {COLUMNS} FROM bases ORDER BY id').fetchall()
+    finally:
+        db.close()
+    rows = np.array(rows, dtype=np.float64) if rows else np.empty((0, 9))
+    if cache:
+        try:
+            np.savez(cache_path, key=key, rows=rows)
+        except OSError:
+            pass
+    return rows
+
+
+def load_logs(paths, cache=True):
+    """Rows of one or more base logs, concatenated"""
+    parts = [load_log(path, cache) for path in paths]
+    return np.concatenate(parts) if parts else np.empty((0, 9))
+
+
+def candidates(column, quantiles=DEFAULT_QUANTILES):
+    """Thresholds to try for one score: its quantiles plus "never" (inf)"""
+    return np.append(np.unique(np.ceil(np.quantile(column, quantiles))), np.inf)
+
+
+class Backtester:
+    """Simulated loot/hour of attack rules over logged bases
+
+    Every rule family below skips a base when each of its keys is under that key's
+    cutoff. Binning the bases by cutoff on each axis and taking a cumulative sum of
+    the resulting histogram gives the skipped count and loot for every cutoff
+    combination at once, so a family costs one O(n) pass however many rules it has.
+    """
+
+    def __init__(self, model, weights=None):
+        self.values = model['values']
+        self.search_s = model['search_s']
+        self.attack_s = model['attack_s']
+        self.yields = model['yields']
+        self.weights = np.array([(weights or {}).get(name, 1.0) for name in RESOURCES])
+        self.total = self.values.sum(axis=0)
+
+    def accepted(self, keys, cutoffs):
+        """Attack count and offered loot per cutoff combination, shape (k1, ..., kd) and (..., 3)
+
+        A base is skipped when keys[a] < cutoffs[a] on every axis a; cutoffs must be ascending.
+        """
+        # bin = number of cutoffs <= key, so key < cutoffs[i] exactly when bin <= i
+        bins = [np.searchsorted(cut, key, side='right') for key, cut in zip(keys, cutoffs)]
+        shape = tuple(len(cut) + 1 for cut in cutoffs)
+        flat = np.ravel_multi_index(bins, shape)
+        size = int(np.prod(shape))
+
+        hist = np.empty((size, 4))
+        hist[:, 0] = np.bincount(flat, minlength=size)
+        for r in range(3):
+            hist[:, r + 1] = np.bincount(flat, weights=self.values[:, r], minlength=size)
+        hist = hist.reshape(shape + (4,))
+        for axis in range(len(shape)):
+            hist = np.cumsum(hist, axis=axis)
+
+        skipped = hist[tuple(slice(0, len(cut)) for cut in cutoffs)]
+        return len(self.values) - skipped[..., 0], self.total - skipped[..., 1:]
+
+    def score(self, labels, attacks, offered):
+        """Rows for the ranked table"""
+        attacks = attacks.ravel()
+        offered = offered.reshape(-1, 3)
+        n = len(self.values)
+        hours = (n * self.search_s + attacks * self.attack_s) / 3600.0
+        per_hour = offered * self.yields / hours[:, None]
+        weighted = per_hour @ self.weights
+        return [
+            {
+                'rule': label,
+                'loot_per_hour': float(weighted[i]),
+                'gold_per_hour': float(per_hour[i, 0]),
+                'elixir_per_hour': float(per_hour[i, 1]),
+                'dark_per_hour': float(per_hour[i, 2]),
+                'attacks_per_hour': float(attacks[i] / hours[i]),
+                'bases_per_attack': float(n / attacks[i]) if attacks[i] else float('inf'),
+            }
+            for i, label in enumerate(labels)
+        ]
+
+    def or_rules(self, gold, elixir, dark):
+        """checkif's rule: attack when any resource reaches its threshold"""
+        gold, elixir, dark = (np.sort(np.asarray(c, dtype=np.float64)) for c in (gold, elixir, dark))
+        attacks, offered = self.accepted([self.values[:, 0], self.values[:, 1], self.values[:, 2]],
+                                         [gold, elixir, dark])
+        labels = [f'OR  G≥{g:,.0f} E≥{e:,.0f} D≥{d:,.0f}' for g in gold for e in elixir for d in dark]
+        return self.score(labels, attacks, offered)
+
+    def weighted_rules(self, weights, cutoffs=None):
+        """Attack when the weighted sum of all three reaches a cutoff"""
+        weights = np.asarray(weights, dtype=np.float64)
+        key = self.values @ weights
+        cutoffs = candidates(key) if cutoffs is None else np.sort(np.asarray(cutoffs, dtype=np.float64))
+        attacks, offered = self.accepted([key], [cutoffs])
+        name = '+'.join(f'{w:.3g}·{r}' for w, r in zip(weights, ('G', 'E', 'D')))
+        return self.score([f'SUM {name} ≥ {c:,.0f}' for c in cutoffs], attacks, offered)
+
+    def dark_first_rules(self, dark, gold_elixir):
+        """Attack on dark elixir alone, otherwise only on combined gold + elixir"""
+        dark, gold_elixir = (np.sort(np.asarray(c, dtype=np.float64)) for c in (dark, gold_elixir))
+        attacks, offered = self.accepted([self.values[:, 2], self.values[:, 0] + self.values[:, 1]],
+                                         [dark, gold_elixir])
+        labels = [f'DARK≥{d:,.0f} else G+E≥{t:,.0f}' for d in dark for t in gold_elixir]
+        return self.score(labels, attacks, offered)
+
+    def default_grid(self, quantiles=DEFAULT_QUANTILES):
+        """Every rule family over quantile cutoffs of the logged loot"""
+        gold, elixir, dark = (candidates(self.values[:, r], quantiles) for r in range(3))
+        rows = self.or_rules(gold, elixir, dark)
+        rows += self.weighted_rules([1.0, 1.0, 0.0])
+        rows += self.weighted_rules(self.weights * self.yields)
+        rows += self.dark_first_rules(dark, candidates(self.values[:, 0] + self.values[:, 1], quantiles))
+        return rows
+
+
+def rank(rows):
+    return sorted(rows, key=lambda row: row['loot_per_hour'], reverse=True)
+
+
+def backtest(rows, weights=None, reference=None, quantiles=GRID_QUANTILES, **fit):
+    """Fit the cost model on logged rows and rank every default rule
+
+    `reference` is an optional {resource: threshold} dict (e.g. the live thresholds)
+    scored alongside so the table shows how far it is from the best rule.
+    """
+    model = fit_model(rows, **fit)
+    if not len(model['values']):
+        raise ValueError("no complete bases in log")
+    if np.isnan(model['search_s']):
+        raise ValueError("Base log has no skipped bases to measure search time from")
+    tester = Backtester(model, weights)
+    results = tester.default_grid(quantiles)
+    if reference is not None:
+        ref = tester.or_rules(*([float(reference[name])] for name in RESOURCES))[0]
+        ref['rule'] = 'live ' + ref['rule']
+        results.append(ref)
+    return model, rank(results)
@@ -0,0 +1,120 @@
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS bases (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    gold INTEGER,
+    elixir INTEGER,
+    dark INTEGER,
+    search_s REAL,
+    attacked INTEGER NOT NULL DEFAULT 0,
+    attack_s REAL,
+    earned_gold INTEGER,
+    earned_elixir INTEGER,
+    earned_dark INTEGER
+);
+CREATE INDEX IF NOT EXISTS bases_attacked ON bases (attacked, id);
+"""
+
+
+class BaseStore:
+    """Append-only SQLite log of every evaluated base, written in small batches
+
+    Row ids are assigned by SQLite when a batch is written, so several processes can
+    share one log. Until then a base is known by a per-process handle, which is what
+    log_base returns and log_attack/log_result take.
+    """
+
+    def __init__(self, path='bases.db', flush_every=20, id_window=1024):
+        self.path = path
+        self.flush_every = flush_every
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        self.db.executescript(SCHEMA)
+        self.lock = threading.Lock()
+        self.inserts = []
+        self.updates = []
+        self.next_handle = 1
+        # Row ids of the most recently written handles, for attacks and results that come later
+        self.row_ids = OrderedDict()
+        self.id_window = id_window
+        self.logged = 0
+
+    def log_base(self, gold, elixir, dark, search_s):
+        """Record one evaluated base; unread values may be None. Returns its handle"""
+        with self.lock:
+            base_id = self.next_handle
+            self.next_handle += 1
+            self.inserts.append((base_id, (time.time(), gold, elixir, dark, search_s)))
+            self.logged += 1
+            pending = len(self.inserts) + len(self.updates)
+        if pending >= self.flush_every:
+            self.flush()
+        return base_id
+
+    def log_attack(self, base_id, attack_s):
+        with self.lock:
+            self.updates.append(('UPDATE bases SET attacked = 1, attack_s = ? WHERE id = ?',
+                                 (attack_s,), base_id))
+
+    def log_result(self, base_id, gold, elixir, dark):
+        with self.lock:
+            self.updates.append(('UPDATE bases SET earned_gold = ?, earned_elixir = ?, '
+                                 'earned_dark = ? WHERE id = ?', (gold, elixir, dark), base_id))
+
+    def flush(self):
+        """Write everything buffered in one transaction; returns False if it failed
+
+        The buffers are only cleared once the transaction has committed, so a failed
+        write (another process holding the lock too long) is retried by the next flush.
+        """
+        with self.lock:
+            if not self.inserts and not self.updates:
+                return True
+            row_ids = {}
+            try:
+                with self.db:
+                    for handle, row in self.inserts:
+                        row_ids[handle] = self.db.execute(
+                            'INSERT INTO bases (ts, gold, elixir, dark, search_s) VALUES (?, ?, ?, ?, ?)',
+                            row).lastrowid
+                    for sql, params, handle in self.updates:
+                        row_id = row_ids.get(handle, self.row_ids.get(handle))
+                        if row_id is not None:
+                            self.db.execute(sql, params + (row_id,))
+            except sqlite3.Error as e:
+                print(f"  ⚠ Base log write failed ({e}); will retry")
+                return False
+            self.inserts = []
+            self.updates = []
+            self.row_ids.update(row_ids)
+            while len(self.row_ids) > self.id_window:
+                self.row_ids.popitem(last=False)
+            return True
+
+    def recent(self, limit=5000):
+        """Latest rows as a float array (NaN for NULL), oldest first
+
+        Columns: gold, elixir, dark, search_s, attacked, attack_s, earned_gold,
+        earned_elixir, earned_dark.
+        """
+        self.flush()
+        with self.lock:
+            rows = self.db.execute(
+                'SELECT gold, elixir, dark, search_s, attacked, attack_s, earned_gold, '
+                'earned_elixir, earned_dark FROM bases ORDER BY id DESC LIMIT ?', (limit,)).fetchall()
+        if not rows:
+            return np.empty((0, 9))
+        return np.array(rows, dtype=np.float64)[::-1]
+
+    def close(self):
+        self.flush()
+        self.db.close()
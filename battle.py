@@ -0,0 +1,58 @@
+import time
+
+
+class BattleMonitor:
+    """Watches the remaining-loot counters and says when a battle stops paying off"""
+
+    def __init__(self, read, interval=1.0, idle_window=5.0, min_time=5.0, max_time=60.0,
+                 clock=time.monotonic, sleep=time.sleep):
+        self.read = read
+        self.interval = interval
+        self.idle_window = idle_window
+        self.min_time = min_time
+        self.max_time = max_time
+        self.clock = clock
+        self.sleep = sleep
+
+    def run(self):
+        """Sample until loot has not dropped for idle_window seconds (or max_time)
+
+        Returns (reason, elapsed seconds, samples) where reason is 'loot_stopped' or 'max_time'.
+        A reading only counts as a drop when the total goes below the lowest seen so far,
+        so an occasional high misread cannot end the battle early. A reading with any
+        counter unread (None) is dropped: summing it as 0 would set a lowest total that
+        real loot never gets below, and the battle would look stopped.
+
+        The idle window starts at the first reading or at min_time, whichever is later,
+        so troops get time to reach the base. With no reading at all the battle runs
+        to max_time.
+        """
+        start = self.clock()
+        lowest = None
+        last_drop = None
+        samples = []
+
+        while True:
+            try:
+                values = self.read()
+            except Exception:
+                values = None
+
+            now = self.clock()
+            elapsed = now - start
+            if values and None not in values.values():
+                total = sum(values.values())
+                samples.append((elapsed, total))
+                if lowest is None:
+                    lowest = total
+                    last_drop = max(now, start + self.min_time)
+                elif total < lowest:
+                    lowest = total
+                    last_drop = now
+
+            if elapsed >= self.max_time:
+                return 'max_time', elapsed, samples
+            if last_drop is not None and now - last_drop >= self.idle_window:
+                return 'loot_stopped', elapsed, samples
+
+            self.sleep(self.interval)
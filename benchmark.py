@@ -0,0 +1,50 @@
+import os
+import time
+
+import cv2
+
+
+def percentiles(values, points=(50, 90, 99)):
+    """Nearest-rank percentiles of a list of numbers"""
+    if not values:
+        return {p: 0.0 for p in points}
+    ordered = sorted(values)
+    return {p: ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))] for p in points}
+
+
+def load_labelled_crops(label_dir):
+    """(value, BGR crop) pairs from files named '<value>_anything.png'"""
+    samples = []
+    for name in sorted(os.listdir(label_dir)):
+        label = os.path.splitext(name)[0].split('_')[0]
+        if not label.isdigit():
+            continue
+        crop = cv2.imread(os.path.join(label_dir, name), cv2.IMREAD_COLOR)
+        if crop is not None:
+            samples.append((int(label), crop))
+    return samples
+
+
+def accuracy_report(read, label_dir):
+    """Run read(crop) -> value over labelled crops; returns accuracy and latency stats"""
+    samples = load_labelled_crops(label_dir)
+    correct = 0
+    latencies = []
+    misreads = []
+
+    for label, crop in samples:
+        start = time.perf_counter()
+        value = read(crop)
+        latencies.append(time.perf_counter() - start)
+        if value == label:
+            correct += 1
+        else:
+            misreads.append((label, value))
+
+    return {
+        'samples': len(samples),
+        'correct': correct,
+        'accuracy': correct / len(samples) if samples else 0.0,
+        'latency_ms': {p: v * 1000 for p, v in percentiles(latencies).items()},
+        'misreads': misreads,
+    }
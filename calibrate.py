@@ -0,0 +1,242 @@
+import json
+import os
+
+import cv2
+import numpy as np
+
+from preprocess import GREY_CODES
+
+
+ANCHOR_FILE = 'anchors.npz'
+
+# Half-size of the patch kept around a button as its template
+BUTTON_RADIUS = 24
+# Pixels whose grey level varies by more than this across bases belong to the digits
+DIGIT_STD = 12.0
+# Padding kept around the varying pixels of a tight digit box
+DIGIT_PAD = 3
+# Narrower static strips are not distinctive enough to be an icon anchor
+MIN_ICON_WIDTH = 10
+
+# Relative scales tried around the screen-size ratio when localising anchors
+SCALE_SPAN = np.geomspace(0.9, 1.1, 9)
+# Normalised correlation needed to accept an anchor match
+MIN_MATCH = 0.7
+# Search window (pixels) and tolerated shift for the runtime alignment check
+CHECK_WINDOW = 8
+CHECK_TOLERANCE = 2
+# Largest fall in an anchor's match score (vs. right after calibrating) still called aligned
+MAX_SCORE_DROP = 0.2
+
+
+def to_grey_image(image, order='BGR'):
+    if image.ndim == 2:
+        return image
+    return cv2.cvtColor(image, GREY_CODES[order])
+
+
+def resolution_key(shape):
+    h, w = shape[:2]
+    return f'{w}x{h}'
+
+
+# ========== BUILDING ANCHORS ==========
+
+def digit_box(stack, coord):
+    """Tight box around the pixels that change between bases, plus the static icon strip
+
+    `stack` holds the same loose region (grey) from several different bases. Returns
+    (tight box, icon box) in absolute coordinates; icon box is None without one.
+    """
+    x1, y1, x2, y2 = coord
+    varying = stack.astype(np.float32).std(axis=0) > DIGIT_STD
+    if not varying.any():
+        return tuple(coord), None
+    rows = np.flatnonzero(varying.any(axis=1))
+    cols = np.flatnonzero(varying.any(axis=0))
+    h, w = varying.shape
+    tx1, tx2 = max(0, cols[0] - DIGIT_PAD), min(w, cols[-1] + 1 + DIGIT_PAD)
+    ty1, ty2 = max(0, rows[0] - DIGIT_PAD), min(h, rows[-1] + 1 + DIGIT_PAD)
+    tight = (x1 + tx1, y1 + ty1, x1 + tx2, y1 + ty2)
+
+    # Loot icons sit beside the number; take the wider static side
+    left, right = tx1, w - tx2
+    if max(left, right) < MIN_ICON_WIDTH:
+        return tight, None
+    if right >= left:
+        icon = (x1 + tx2, y1, x2, y2)
+    else:
+        icon = (x1, y1, x1 + tx1, y2)
+    return tight, icon
+
+
+def build_anchors(frames, regions, buttons, reference, path=ANCHOR_FILE):
+    """Derive templates and tight digit boxes from several search-screen frames
+
+    `frames` are full-screen grey images of different bases, `regions` the loose
+    {name: box} loot regions, `buttons` {name: position} of buttons visible on the
+    search screen, and `reference` the whole coordinate config they were taken with.
+    """
+    first = frames[0]
+    anchors = []
+    tight = {}
+    for name, coord in regions.items():
+        x1, y1, x2, y2 = coord
+        stack = np.stack([frame[y1:y2, x1:x2] for frame in frames])
+        tight[name], icon = digit_box(stack, coord)
+        if icon is not None:
+            anchors.append((f'{name}_icon', icon))
+    for name, (x, y) in buttons.items():
+        anchors.append((name, (x - BUTTON_RADIUS, y - BUTTON_RADIUS, x + BUTTON_RADIUS, y + BUTTON_RADIUS)))
+
+    arrays = {}
+    boxes = {}
+    for i, (name, (x1, y1, x2, y2)) in enumerate(anchors):
+        arrays[f'anchor_{i}'] = first[y1:y2, x1:x2].copy()
+        boxes[name] = [int(x1), int(y1), int(x2), int(y2)]
+
+    meta = {
+        'size': [int(first.shape[1]), int(first.shape[0])],
+        'anchors': [name for name, _ in anchors],
+        'boxes': boxes,
+        'tight': {name: [int(v) for v in box] for name, box in tight.items()},
+        'reference': reference,
+    }
+    np.savez_compressed(path, meta=np.array(json.dumps(meta)), **arrays)
+    return meta
+
+
+# ========== LOCALISING ==========
+
+def map_point(point, calibration):
+    s = calibration['scale']
+    ox, oy = calibration['offset']
+    return (int(round(point[0] * s + ox)), int(round(point[1] * s + oy)))
+
+
+def map_box(box, calibration):
+    x1, y1 = map_point(box[:2], calibration)
+    x2, y2 = map_point(box[2:], calibration)
+    return (x1, y1, x2, y2)
+
+
+class Calibrator:
+    """Finds the anchors on a new screen and maps reference coordinates onto it
+
+    A resolution change or moved emulator window is modelled as one uniform scale
+    plus an offset, fitted by least squares over every anchor found.
+    """
+
+    def __init__(self, templates, meta):
+        self.templates = templates
+        self.meta = meta
+        self.scaled = {}
+
+    @classmethod
+    def load(cls, path=ANCHOR_FILE):
+        """Load anchors built by build_anchors, or None if there are none"""
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as data:
+            meta = json.loads(str(data['meta']))
+            templates = [data[f'anchor_{i}'] for i in range(len(meta['anchors']))]
+        return cls(templates, meta)
+
+    def template(self, index, scale):
+        key = (index, round(scale, 4))
+        if key not in self.scaled:
+            t = self.templates[index]
+            size = (max(4, round(t.shape[1] * scale)), max(4, round(t.shape[0] * scale)))
+            self.scaled[key] = cv2.resize(t, size, interpolation=cv2.INTER_AREA if scale < 1 else cv2.INTER_LINEAR)
+        return self.scaled[key]
+
+    def locate(self, grey):
+        """Best (scale, top-left, score) for every anchor over the whole screen"""
+        ref_w, ref_h = self.meta['size']
+        hint = (grey.shape[1] / ref_w + grey.shape[0] / ref_h) / 2
+        matches = []
+        for i, _ in enumerate(self.templates):
+            best = (0.0, None, None)
+            for scale in hint * SCALE_SPAN:
+                t = self.template(i, scale)
+                if t.shape[0] > grey.shape[0] or t.shape[1] > grey.shape[1]:
+                    continue
+                result = cv2.matchTemplate(grey, t, cv2.TM_CCOEFF_NORMED)
+                _, score, _, loc = cv2.minMaxLoc(result)
+                if score > best[0]:
+                    best = (score, scale, loc)
+            matches.append(best)
+        return matches
+
+    def calibrate(self, image, order='BGR'):
+        """Calibration for this screen, or None when no anchor was found"""
+        grey = to_grey_image(image, order)
+        names = self.meta['anchors']
+        found, src, dst, scales = [], [], [], []
+        for i, (name, (score, scale, loc)) in enumerate(zip(names, self.locate(grey))):
+            if score < MIN_MATCH:
+                continue
+            x1, y1, _, _ = self.meta['boxes'][name]
+            found.append(i)
+            src.append((x1, y1))
+            dst.append(loc)
+            scales.append(scale)
+        if not found:
+            return None
+
+        src = np.array(src, dtype=np.float64)
+        dst = np.array(dst, dtype=np.float64)
+        if len(src) >= 2 and np.ptp(src, axis=0).max() > 0:
+            # x' = s*x + ox and y' = s*y + oy, solved jointly
+            a = np.zeros((2 * len(src), 3))
+            a[0::2, 0], a[0::2, 1] = src[:, 0], 1
+            a[1::2, 0], a[1::2, 2] = src[:, 1], 1
+            (scale, ox, oy), *_ = np.linalg.lstsq(a, dst.ravel(), rcond=None)
+        else:
+            scale = float(np.mean(scales))
+            ox, oy = (dst - src * scale).mean(axis=0)
+
+        calibration = {'scale': float(scale), 'offset': [float(ox), float(oy)], 'anchors': found}
+        calibration['regions'] = {name: list(map_box(box, calibration))
+                                  for name, box in self.meta['tight'].items()}
+        # Scores at the fitted scale and place are what later checks compare against
+        calibration['baseline'] = [score for _, score in self.match_near(grey, calibration)]
+        return calibration
+
+    def match_near(self, grey, calibration, origin=(0, 0)):
+        """(shift in pixels, score) of each calibrated anchor searched near its expected spot"""
+        ox, oy = origin
+        matches = []
+        for i in calibration['anchors']:
+            t = self.template(i, calibration['scale'])
+            x, y = map_point(self.meta['boxes'][self.meta['anchors'][i]][:2], calibration)
+            x, y = x - ox, y - oy
+            x1, y1 = max(0, x - CHECK_WINDOW), max(0, y - CHECK_WINDOW)
+            roi = grey[y1:y + t.shape[0] + CHECK_WINDOW, x1:x + t.shape[1] + CHECK_WINDOW]
+            if roi.shape[0] < t.shape[0] or roi.shape[1] < t.shape[1]:
+                matches.append((CHECK_WINDOW, 0.0))
+                continue
+            _, score, _, loc = cv2.minMaxLoc(cv2.matchTemplate(roi, t, cv2.TM_CCOEFF_NORMED))
+            matches.append((max(abs(x1 + loc[0] - x), abs(y1 + loc[1] - y)), score))
+        return matches
+
+    def check(self, image, calibration, order='BGR', origin=(0, 0)):
+        """Re-find each anchor near where the calibration puts it
+
+        Returns (aligned, worst shift in pixels, worst score drop). Costs one small
+        matchTemplate per anchor, so it can run every few bases.
+        """
+        matches = self.match_near(to_grey_image(image, order), calibration, origin)
+        shift = max(shift for shift, _ in matches)
+        drop = max(base - score for (_, score), base in zip(matches, calibration['baseline']))
+        return shift <= CHECK_TOLERANCE and drop <= MAX_SCORE_DROP, shift, drop
+
+    def check_boxes(self, calibration, margin=CHECK_WINDOW):
+        """Screen boxes the alignment check needs captured"""
+        boxes = []
+        for i in calibration['anchors']:
+            t = self.template(i, calibration['scale'])
+            x, y = map_point(self.meta['boxes'][self.meta['anchors'][i]][:2], calibration)
+            boxes.append((max(0, x - margin), max(0, y - margin),
+                          x + t.shape[1] + margin, y + t.shape[0] + margin))
+        return boxes
@@ -0,0 +1,201 @@
+import sys
+import threading
+import time
+from collections import OrderedDict, deque
+
+import numpy as np
+
+
+# ========== FRAME BUFFERS ==========
+
+class BufferPool:
+    """Reusable frame arrays, each handed out again only once nothing else references it
+
+    A grabbed frame can be held for a while (the runtime's latest-frame slot, a read
+    still running on the OCR thread), so a fixed ring could overwrite pixels in use.
+    Instead an array is recycled when the pool holds its only reference; crops are views
+    that reference their frame's array, so they keep it busy too. With every array of a
+    shape busy a fresh one is allocated, pooled while there is room.
+    """
+
+    def __init__(self, per_shape=4, shapes=8):
+        self.per_shape = per_shape
+        self.shapes = shapes
+        self.arrays = OrderedDict()
+        self.lock = threading.Lock()
+        self.allocations = 0
+
+    def get(self, shape, dtype=np.uint8):
+        key = (tuple(shape), np.dtype(dtype).str)
+        with self.lock:
+            arrays = self.arrays.get(key)
+            if arrays is None:
+                arrays = self.arrays[key] = []
+                if len(self.arrays) > self.shapes:
+                    self.arrays.popitem(last=False)
+            self.arrays.move_to_end(key)
+            for array in arrays:
+                # References: the pool's list, this loop and getrefcount's argument
+                if sys.getrefcount(array) <= 3:
+                    return array
+            array = np.empty(shape, dtype=dtype)
+            self.allocations += 1
+            if len(arrays) < self.per_shape:
+                arrays.append(array)
+            return array
+
+
+# ========== CAPTURE BACKENDS ==========
+
+class ImageGrabBackend:
+    """Desktop capture through PIL ImageGrab"""
+    name = 'imagegrab'
+    order = 'RGB'
+
+    def grab(self, bbox=None):
+        from PIL import ImageGrab
+        im = ImageGrab.grab(bbox=bbox)
+        if im.mode != 'RGB':
+            im = im.convert('RGB')
+        return np.asarray(im)
+
+    def close(self):
+        pass
+
+
+class MssBackend:
+    """Desktop capture through a persistent mss handle (BGRA, no re-encode)
+
+    mss returns a new bytearray per shot; it is copied into a pooled frame array and
+    released at once, so frames themselves come from reused memory.
+    """
+    name = 'mss'
+    order = 'BGRA'
+
+    def __init__(self):
+        import mss
+        self.sct = mss.mss()
+        self.buffers = BufferPool()
+
+    def grab(self, bbox=None):
+        if bbox is None:
+            monitor = self.sct.monitors[1]
+        else:
+            x1, y1, x2, y2 = bbox
+            monitor = {'left': x1, 'top': y1, 'width': x2 - x1, 'height': y2 - y1}
+        shot = self.sct.grab(monitor)
+        image = self.buffers.get((shot.height, shot.width, 4))
+        np.copyto(image.reshape(-1), np.frombuffer(shot.raw, dtype=np.uint8))
+        return image
+
+    def close(self):
+        self.sct.close()
+
+
+class FakeBackend:
+    """Serves pre-made frames in order (loops), for tests and offline runs"""
+    name = 'fake'
+
+    def __init__(self, frames, order='BGR', loop=True):
+        self.frames = list(frames)
+        self.order = order
+        self.loop = loop
+        self.index = 0
+
+    def grab(self, bbox=None):
+        if not self.frames:
+            raise ValueError("FakeBackend has no frames!")
+        if self.index >= len(self.frames):
+            if not self.loop:
+                raise StopIteration("FakeBackend ran out of frames")
+            self.index = 0
+        image = self.frames[self.index]
+        self.index += 1
+        if bbox is not None:
+            x1, y1, x2, y2 = bbox
+            image = image[y1:y2, x1:x2]
+        return image
+
+    def close(self):
+        pass
+
+
+def default_backend():
+    """Pick the fastest desktop backend available"""
+    try:
+        return MssBackend()
+    except Exception:
+        # mss missing, or no display it can open
+        return ImageGrabBackend()
+
+
+# ========== FRAMES ==========
+
+def union_bbox(coords):
+    """Smallest box (x1, y1, x2, y2) covering every region"""
+    coords = list(coords)
+    return (
+        min(c[0] for c in coords),
+        min(c[1] for c in coords),
+        max(c[2] for c in coords),
+        max(c[3] for c in coords),
+    )
+
+
+class Frame:
+    """One captured screen image; regions are cropped as zero-copy views"""
+
+    def __init__(self, image, origin=(0, 0), order='RGB', timestamp=None, latency=0.0):
+        self.image = image
+        self.origin = origin
+        self.order = order
+        self.timestamp = time.time() if timestamp is None else timestamp
+        self.latency = latency
+
+    def crop(self, coord):
+        """Slice a screen region (absolute x1, y1, x2, y2) out of the frame"""
+        if coord is None:
+            raise ValueError("Coordinates not set!")
+        x1, y1, x2, y2 = coord
+        ox, oy = self.origin
+        return self.image[y1 - oy:y2 - oy, x1 - ox:x2 - ox]
+
+
+class FrameCapture:
+    """Grabs the screen once per call through a reusable backend handle
+
+    Safe to call from several threads; grabs are serialised, as backend handles are not.
+    """
+
+    def __init__(self, backend=None, history=500):
+        self.backend = backend if backend is not None else default_backend()
+        self.latencies = deque(maxlen=history)
+        self.frame_count = 0
+        self.lock = threading.Lock()
+
+    def grab(self, coords=None):
+        """Capture one frame covering all coords (or the whole screen)"""
+        bbox = union_bbox(coords) if coords else None
+        with self.lock:
+            start = time.perf_counter()
+            image = self.backend.grab(bbox)
+            latency = time.perf_counter() - start
+            self.latencies.append(latency)
+            self.frame_count += 1
+        origin = (bbox[0], bbox[1]) if bbox else (0, 0)
+        return Frame(image, origin, self.backend.order, latency=latency)
+
+    def stats(self):
+        """Capture latency summary in milliseconds"""
+        if not self.latencies:
+            return {'frames': self.frame_count, 'last_ms': 0.0, 'mean_ms': 0.0, 'p95_ms': 0.0}
+        values = sorted(self.latencies)
+        return {
+            'frames': self.frame_count,
+            'last_ms': self.latencies[-1] * 1000,
+            'mean_ms': sum(values) / len(values) * 1000,
+            'p95_ms': values[int(0.95 * (len(values) - 1))] * 1000,
+        }
+
+    def close(self):
+        self.backend.close()
@@ -0,0 +1,85 @@
+import time
+
+import numpy as np
+
+
+# Event kinds, stored as small ints in the schedule
+DOWN, MOVE, UP, TAP = range(4)
+KIND_NAMES = ('down', 'move', 'up', 'tap')
+
+DEPLOY_PATTERNS = ('drag', 'taps')
+
+
+class DeploySchedule:
+    """Every input event of a deployment, precomputed once"""
+
+    def __init__(self, kinds, points, interval):
+        self.kinds = kinds
+        self.points = points
+        self.times = np.arange(len(kinds)) * interval
+        # Plain Python lists so the send loop does no NumPy work per event
+        self.events = [(KIND_NAMES[k], (x, y)) for k, (x, y) in zip(kinds.tolist(), points.tolist())]
+
+    def __len__(self):
+        return len(self.events)
+
+
+def line_points(start, end, density):
+    """density evenly spaced integer points from start to end"""
+    steps = np.linspace(0.0, 1.0, max(density, 2))[:, None]
+    start = np.asarray(start, dtype=np.float64)
+    end = np.asarray(end, dtype=np.float64)
+    return np.rint(start + (end - start) * steps).astype(np.int32)
+
+
+def build_schedule(lines, rounds=15, pattern='drag', density=12, interval=0.004):
+    """Precompute the deployment along each [start, end] line, repeated rounds times
+
+    'drag' presses at the start, moves through density points and releases at the end;
+    'taps' taps density points along the line.
+    """
+    if pattern not in DEPLOY_PATTERNS:
+        raise ValueError(f"Unknown deploy pattern '{pattern}' (use one of {DEPLOY_PATTERNS})")
+
+    kinds = []
+    points = []
+    for start, end in lines:
+        pts = line_points(start, end, density)
+        if pattern == 'drag':
+            kinds += [DOWN] + [MOVE] * (len(pts) - 1) + [UP]
+            points += [pts[:1], pts[1:], pts[-1:]]
+        else:
+            kinds += [TAP] * len(pts)
+            points.append(pts)
+
+    kinds = np.tile(np.array(kinds, dtype=np.uint8), rounds)
+    points = np.tile(np.concatenate(points), (rounds, 1))
+    return DeploySchedule(kinds, points, interval)
+
+
+class DeployEngine:
+    """Sends a DeploySchedule through an input backend on its own explicit timing"""
+
+    def __init__(self, inputs, clock=time.perf_counter, sleep=time.sleep):
+        self.inputs = inputs
+        self.clock = clock
+        self.sleep = sleep
+        self.last_rate = 0.0
+
+    def run(self, schedule):
+        """Issue every event at its scheduled offset; returns achieved events per second"""
+        send = self.inputs.event
+        times = schedule.times.tolist()
+        start = self.clock()
+
+        for offset, (kind, pos) in zip(times, schedule.events):
+            delay = start + offset - self.clock()
+            if delay > 0:
+                self.sleep(delay)
+            send(kind, pos)
+        # Backends that queue events (adb) send the rest now
+        self.inputs.flush()
+
+        elapsed = self.clock() - start
+        self.last_rate = len(schedule) / elapsed if elapsed > 0 else 0.0
+        return self.last_rate
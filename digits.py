@@ -0,0 +1,145 @@
+import os
+import threading
+
+import cv2
+import numpy as np
+
+
+TEMPLATE_FILE = 'digit_templates.npz'
+GLYPH_SIZE = (16, 24)   # (width, height) every glyph is scaled to
+DIGITS = '0123456789'
+
+
+# ========== GLYPH SEGMENTATION ==========
+
+def binarize(grey, out=None):
+    """Otsu threshold with the digits always white on black (written into out if given)"""
+    _, binary = cv2.threshold(grey, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU, dst=out)
+    if cv2.countNonZero(binary) > binary.size // 2:
+        cv2.bitwise_not(binary, dst=binary)
+    return binary
+
+
+def normalise_glyph(glyph):
+    """Scale a glyph mask to GLYPH_SIZE as a zero-mean, unit-length vector"""
+    resized = cv2.resize(glyph, GLYPH_SIZE, interpolation=cv2.INTER_AREA).astype(np.float32)
+    vector = resized.ravel() - resized.mean()
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def segment_glyphs(binary, min_area=4, labels=None):
+    """Connected components left-to-right, dropping short separators (, and .)
+
+    `labels` is an optional int32 buffer the size of `binary` for the label image.
+    """
+    count, labels, stats, _ = cv2.connectedComponentsWithStats(binary, labels=labels, connectivity=8,
+                                                               ltype=cv2.CV_32S)
+    parts = [i for i in range(1, count) if stats[i, cv2.CC_STAT_AREA] >= min_area]
+    if not parts:
+        return []
+
+    tallest = max(stats[i, cv2.CC_STAT_HEIGHT] for i in parts)
+    glyphs = []
+    for i in sorted(parts, key=lambda i: stats[i, cv2.CC_STAT_LEFT]):
+        x, y, w, h = stats[i, :4]
+        if h < 0.6 * tallest:
+            continue
+        mask = cv2.compare(labels[y:y + h, x:x + w], int(i), cv2.CMP_EQ)
+        glyphs.append(normalise_glyph(mask))
+    return glyphs
+
+
+# ========== RECOGNIZER ==========
+
+class DigitRecognizer:
+    """Reads fixed-font loot counters by per-glyph template correlation"""
+
+    def __init__(self, templates):
+        self.templates = templates.reshape(len(DIGITS), -1).astype(np.float32)
+        self.reads = 0
+        self.fallbacks = 0
+        self.lock = threading.Lock()
+        # Binary and label images reused between reads; per thread, as the results
+        # worker reads alongside the search loop
+        self.scratch = threading.local()
+
+    @classmethod
+    def load(cls, path=TEMPLATE_FILE):
+        """Load templates built by build_templates, or None if there are none"""
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as data:
+            return cls(data['templates'])
+
+    def read(self, grey):
+        """Return (value, confidence); value is None when nothing was segmented"""
+        scratch = self.scratch
+        if getattr(scratch, 'shape', None) != grey.shape:
+            scratch.shape = grey.shape
+            scratch.binary = np.empty(grey.shape, dtype=np.uint8)
+            scratch.labels = np.empty(grey.shape, dtype=np.int32)
+        glyphs = segment_glyphs(binarize(grey, scratch.binary), labels=scratch.labels)
+        if not glyphs:
+            return None, 0.0
+        scores = np.stack(glyphs) @ self.templates.T
+        best = scores.argmax(axis=1)
+        value = int(''.join(DIGITS[d] for d in best))
+        confidence = float(scores[np.arange(len(best)), best].min())
+        return value, max(confidence, 0.0)
+
+    def record(self, fell_back):
+        """Count one read, and whether it had to go to EasyOCR"""
+        with self.lock:
+            self.reads += 1
+            if fell_back:
+                self.fallbacks += 1
+
+    def stats(self):
+        """Per-read fast-path statistics"""
+        with self.lock:
+            reads, fallbacks = self.reads, self.fallbacks
+        rate = fallbacks / reads if reads else 0.0
+        return {
+            'reads': reads,
+            'fast': reads - fallbacks,
+            'fallbacks': fallbacks,
+            'fallback_rate': rate,
+        }
+
+
+# ========== TEMPLATE BUILDING ==========
+
+def build_templates(crop_dir, path=TEMPLATE_FILE):
+    """Average glyphs from labelled crops ('<value>_anything.png') into templates"""
+    samples = {d: [] for d in DIGITS}
+    used = skipped = 0
+
+    for name in sorted(os.listdir(crop_dir)):
+        label = os.path.splitext(name)[0].split('_')[0]
+        if not label.isdigit():
+            continue
+        grey = cv2.imread(os.path.join(crop_dir, name), cv2.IMREAD_GRAYSCALE)
+        if grey is None:
+            skipped += 1
+            continue
+        glyphs = segment_glyphs(binarize(grey))
+        if len(glyphs) != len(label):
+            skipped += 1
+            continue
+        for digit, glyph in zip(label, glyphs):
+            samples[digit].append(glyph)
+        used += 1
+
+    size = GLYPH_SIZE[0] * GLYPH_SIZE[1]
+    templates = np.zeros((len(DIGITS), size), dtype=np.float32)
+    for k, digit in enumerate(DIGITS):
+        if samples[digit]:
+            mean = np.mean(samples[digit], axis=0)
+            mean -= mean.mean()
+            norm = np.linalg.norm(mean)
+            templates[k] = mean / norm if norm else mean
+
+    np.savez_compressed(path, templates=templates)
+    missing = [d for d in DIGITS if not samples[d]]
+    return used, skipped, missing
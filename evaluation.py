@@ -0,0 +1,93 @@
+import time
+
+
+class AdaptiveEvaluator:
+    """Reads resources for an OR-of-thresholds check, cheapest likely hit first
+
+    The likeliest resource is read alone; only if it fails are the rest read, together
+    in one batch. That keeps the short-circuit on the read most likely to end the
+    check without going back to one recognizer call per region.
+    """
+
+    def __init__(self, names, default_cost=0.05, smoothing=0.2):
+        self.default_cost = default_cost
+        self.smoothing = smoothing
+        self.stats = {name: {'reads': 0, 'hits': 0, 'cost': default_cost} for name in names}
+        self.evaluations = 0
+        self.reads = 0
+        self.saved = 0
+
+    def hit_rate(self, name):
+        """Laplace-smoothed probability that this resource passes its threshold"""
+        entry = self.stats[name]
+        return (entry['hits'] + 1) / (entry['reads'] + 2)
+
+    def order(self, resource_list):
+        """Sort by expected cost per hit (lowest first), the optimal order for an OR"""
+        for name, _ in resource_list:
+            self.stats.setdefault(name, {'reads': 0, 'hits': 0, 'cost': self.default_cost})
+        return sorted(resource_list, key=lambda item: self.stats[item[0]]['cost'] / self.hit_rate(item[0]))
+
+    def record(self, name, cost, hit):
+        entry = self.stats[name]
+        entry['reads'] += 1
+        entry['hits'] += int(hit)
+        entry['cost'] += self.smoothing * (cost - entry['cost'])
+
+    def evaluate(self, resource_list, thresholds, read):
+        """trial() and commit() in one: True if any resource reaches its threshold"""
+        passed, trace = self.trial(resource_list, thresholds, read)
+        self.commit(trace)
+        return passed
+
+    def trial(self, resource_list, thresholds, read):
+        """Evaluate without counting anything; returns (passed, trace for commit())
+
+        read([(name, coord), ...]) returns {name: value} for those resources. A
+        speculative read is tried, and only committed if it turns out to be of the
+        base the bot then acts on.
+        """
+        order = self.order(resource_list)
+        steps = []
+        for group in (order[:1], order[1:]):
+            if not group:
+                continue
+            start = time.perf_counter()
+            values = read(group)
+            # A batch's cost is shared by the regions in it
+            cost = (time.perf_counter() - start) / len(group)
+            hits = [values[name] >= thresholds[name] for name, _ in group]
+            steps += [(name, cost, hit) for (name, _), hit in zip(group, hits)]
+            if any(hits):
+                return True, (len(order), steps)
+        return False, (len(order), steps)
+
+    def commit(self, trace):
+        """Count one evaluation, its reads and what they taught about each resource"""
+        total, steps = trace
+        self.evaluations += 1
+        for name, cost, hit in steps:
+            self.record(name, cost, hit)
+        self.reads += len(steps)
+        if any(hit for _, _, hit in steps):
+            self.saved += total - len(steps)
+
+    def read_later(self, count):
+        """Count reads the caller made after all for resources evaluate() skipped
+
+        They were not saved, only postponed, so they move from `saved` to `reads`.
+        """
+        self.saved -= count
+        self.reads += count
+
+    def summary(self):
+        """Reads done vs. saved, plus the learned per-resource stats"""
+        return {
+            'evaluations': self.evaluations,
+            'reads': self.reads,
+            'saved': self.saved,
+            'resources': {
+                name: {'hit_rate': self.hit_rate(name), 'cost_ms': entry['cost'] * 1000}
+                for name, entry in self.stats.items()
+            },
+        }
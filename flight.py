@@ -0,0 +1,226 @@
+import json
+import os
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from preprocess import BGR_CODES
+
+
+FLIGHT_DIR = 'flight'
+
+# What can fire a dump; see the triggers passed in from main.py
+TRIGGERS = ('empty_read', 'zero_read', 'exception', 'recovery', 'stuck')
+DEFAULT_TRIGGERS = ('empty_read', 'exception', 'stuck')
+
+FRAME_META = np.dtype([('t', 'f8'), ('seq', 'i8'), ('tag', 'S20'), ('box', 'i4', 4), ('size', 'i4', 2)])
+OCR_META = np.dtype([('t', 'f8'), ('frame', 'i8'), ('region', 'S16'), ('text', 'S24'),
+                     ('value', 'i8'), ('confidence', 'f4')])
+EVENT_META = np.dtype([('t', 'f8'), ('kind', 'S8'), ('pos', 'i4', 2)])
+
+
+class Ring:
+    """Fixed-size structured array written round-robin"""
+
+    def __init__(self, dtype, capacity):
+        self.data = np.zeros(capacity, dtype=dtype)
+        self.count = 0
+
+    def slot(self):
+        index = self.count % len(self.data)
+        self.count += 1
+        return index
+
+    def order(self):
+        """Slot indices oldest first"""
+        n = len(self.data)
+        if self.count <= n:
+            return np.arange(self.count)
+        return (np.arange(n) + self.count) % n
+
+
+class FlightRecorder:
+    """Always-on ring of the last few downscaled frames, OCR reads and input events
+
+    Every buffer is allocated up front; recording a frame is one resize (and channel
+    conversion) into scratch sized for that grab and a copy into the ring. Nothing
+    touches the disk until an enabled trigger fires, when the rings are written oldest
+    first as .npy files (open them with np.load(..., mmap_mode='r')).
+    """
+
+    def __init__(self, frames=64, size=(256, 144), ocr=256, events=1024, triggers=DEFAULT_TRIGGERS,
+                 path=FLIGHT_DIR, min_gap=30.0, max_dumps=20):
+        self.size = size
+        self.images = np.zeros((frames, size[1], size[0], 3), dtype=np.uint8)
+        self.frames = Ring(FRAME_META, frames)
+        self.ocr = Ring(OCR_META, ocr)
+        self.events = Ring(EVENT_META, events)
+        self.triggers = set(triggers)
+        self.path = path
+        self.min_gap = min_gap
+        self.max_dumps = max_dumps
+
+        self.scratch = {}
+        self.lock = threading.Lock()
+        self.frame_time = 0.0
+        self.other_time = 0.0
+        self.dumps = []
+        self.fired = {}
+        self.last_dump = {}
+
+    def fit(self, w, h):
+        """Thumbnail size inside the slot, keeping the aspect ratio and never enlarging"""
+        scale = min(1.0, self.size[0] / w, self.size[1] / h)
+        return max(1, int(w * scale)), max(1, int(h * scale))
+
+    def frame(self, frame, tag=''):
+        """Downscale a captured Frame into the next slot"""
+        start = time.perf_counter()
+        image = frame.image
+        h, w = image.shape[:2]
+        tw, th = self.fit(w, h)
+        channels = image.shape[2] if image.ndim == 3 else 1
+        with self.lock:
+            key = (th, tw, channels)
+            buffers = self.scratch.get(key)
+            if buffers is None:
+                shape = (th, tw) if channels == 1 else (th, tw, channels)
+                buffers = self.scratch[key] = (np.empty(shape, dtype=np.uint8),
+                                               np.empty((th, tw, 3), dtype=np.uint8))
+            small, bgr = buffers
+            if (tw, th) == (w, h):
+                np.copyto(small, image)
+            else:
+                # Linear touches only ~4 source pixels per output pixel: a full screen costs
+                # ~0.2 ms where INTER_AREA would average every pixel (~10 ms)
+                cv2.resize(image, (tw, th), dst=small, interpolation=cv2.INTER_LINEAR)
+            if channels == 1:
+                cv2.cvtColor(small, cv2.COLOR_GRAY2BGR, dst=bgr)
+            elif frame.order in BGR_CODES:
+                cv2.cvtColor(small, BGR_CODES[frame.order], dst=bgr)
+            else:
+                bgr = small
+
+            index = self.frames.slot()
+            slot = self.images[index]
+            slot[:th, :tw] = bgr
+            slot[th:] = 0
+            slot[:th, tw:] = 0
+            ox, oy = frame.origin
+            # Whole-record tuple assignment is several times faster than field by field
+            self.frames.data[index] = (frame.timestamp, self.frames.count - 1, tag,
+                                       (ox, oy, ox + w, oy + h), (tw, th))
+            self.frame_time += time.perf_counter() - start
+
+    def read(self, region, text, value, confidence):
+        """One parsed OCR fragment; value is -1 when it did not parse"""
+        start = time.perf_counter()
+        with self.lock:
+            self.ocr.data[self.ocr.slot()] = (time.time(), self.frames.count - 1, region,
+                                              text or '', -1 if value is None else value, confidence)
+            self.other_time += time.perf_counter() - start
+
+    def event(self, kind, pos):
+        """One input event (kind, position)"""
+        start = time.perf_counter()
+        with self.lock:
+            self.events.data[self.events.slot()] = (time.time(), kind, (pos[0], pos[1]))
+            self.other_time += time.perf_counter() - start
+
+    # ========== DUMPS ==========
+
+    def trigger(self, kind, detail=''):
+        """Dump the rings if this kind of anomaly is enabled; returns the dump path or None"""
+        self.fired[kind] = self.fired.get(kind, 0) + 1
+        if kind not in self.triggers or len(self.dumps) >= self.max_dumps:
+            return None
+        # Rate-limited per kind, so a burst of zero reads cannot hide a later stall
+        now = time.monotonic()
+        if now - self.last_dump.get(kind, -self.min_gap) < self.min_gap:
+            return None
+        self.last_dump[kind] = now
+        try:
+            path = self.dump(kind, detail)
+        except OSError as e:
+            print(f"  ⚠ Flight recorder dump failed: {e}")
+            return None
+        self.dumps.append(path)
+        print(f"  🛩️  Flight recorder: {kind} ({detail}) -> {path}")
+        return path
+
+    def dump(self, reason, detail=''):
+        """Write every ring oldest first to a new directory under self.path"""
+        stamp = time.strftime('%Y%m%d-%H%M%S')
+        path = os.path.join(self.path, f'{stamp}_{len(self.dumps):02d}_{reason}')
+        os.makedirs(path, exist_ok=True)
+        with self.lock:
+            order = self.frames.order()
+            out = np.lib.format.open_memmap(os.path.join(path, 'frames.npy'), mode='w+',
+                                            dtype=np.uint8, shape=(len(order),) + self.images.shape[1:])
+            for i, index in enumerate(order):
+                out[i] = self.images[index]
+            out.flush()
+            del out
+            np.save(os.path.join(path, 'frames_meta.npy'), self.frames.data[order])
+            np.save(os.path.join(path, 'ocr.npy'), self.ocr.data[self.ocr.order()])
+            np.save(os.path.join(path, 'events.npy'), self.events.data[self.events.order()])
+            info = {
+                'reason': reason,
+                'detail': detail,
+                'time': time.time(),
+                'frames_seen': self.frames.count,
+                'reads_seen': self.ocr.count,
+                'events_seen': self.events.count,
+                'slot_size': list(self.size),
+            }
+        with open(os.path.join(path, 'info.json'), 'w') as f:
+            json.dump(info, f, indent=2)
+        return path
+
+    def stats(self):
+        frames = self.frames.count
+        return {
+            'frames': frames,
+            'mean_ms': self.frame_time / frames * 1000 if frames else 0.0,
+            'time_s': self.frame_time + self.other_time,
+            'dumps': len(self.dumps),
+            'fired': dict(self.fired),
+        }
+
+
+class FlightInput:
+    """Passes events through to another backend, logging clicks and drags to a FlightRecorder
+
+    Raw deploy events are not logged: hundreds per attack would flush every click
+    out of the ring, and the schedule they come from is fixed anyway.
+    """
+
+    def __init__(self, inner, recorder):
+        self.inner = inner
+        self.recorder = recorder
+        self.name = inner.name
+
+    def click(self, pos):
+        self.recorder.event('click', pos)
+        self.inner.click(pos)
+
+    def drag_to(self, pos):
+        self.recorder.event('drag_to', pos)
+        self.inner.drag_to(pos)
+
+    def event(self, kind, pos):
+        self.inner.event(kind, pos)
+
+    def flush(self):
+        self.inner.flush()
+
+
+def load_dump(path):
+    """Memory-mapped arrays of a dump plus its info.json"""
+    with open(os.path.join(path, 'info.json')) as f:
+        info = json.load(f)
+    arrays = {name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r')
+              for name in ('frames', 'frames_meta', 'ocr', 'events')}
+    return info, arrays
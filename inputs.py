@@ -0,0 +1,112 @@
+import time
+
+
+# ========== INPUT BACKENDS ==========
+
+class PyAutoGUIInput:
+    """Desktop mouse input through pyautogui (imported on first use)"""
+    name = 'pyautogui'
+
+    def __init__(self):
+        self._pyautogui = None
+
+    @property
+    def pyautogui(self):
+        if self._pyautogui is None:
+            import pyautogui
+            self._pyautogui = pyautogui
+        return self._pyautogui
+
+    def click(self, pos):
+        self.pyautogui.click(pos)
+
+    def drag_to(self, pos):
+        self.pyautogui.dragTo(pos, button='left')
+
+    def event(self, kind, pos):
+        """Single low-level event, skipping pyautogui's global PAUSE"""
+        gui = self.pyautogui
+        x, y = pos
+        if kind == 'down':
+            gui.mouseDown(x, y, _pause=False)
+        elif kind == 'move':
+            gui.moveTo(x, y, _pause=False)
+        elif kind == 'up':
+            gui.mouseUp(x, y, _pause=False)
+        elif kind == 'tap':
+            gui.click(x, y, _pause=False)
+        else:
+            raise ValueError(f"Unknown input event '{kind}'")
+
+    def flush(self):
+        """Events are sent as they come; nothing is queued"""
+
+
+class FakeInput:
+    """Records every input event instead of sending it, for tests and offline runs"""
+    name = 'fake'
+
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self.events = []
+
+    def click(self, pos):
+        self.events.append((self.clock(), 'click', tuple(pos)))
+
+    def drag_to(self, pos):
+        self.events.append((self.clock(), 'drag_to', tuple(pos)))
+
+    def event(self, kind, pos):
+        self.events.append((self.clock(), kind, tuple(pos)))
+
+    def flush(self):
+        pass
+
+
+class RecordingInput:
+    """Passes events through to another backend and logs them to a recorder"""
+
+    def __init__(self, inner, recorder):
+        self.inner = inner
+        self.recorder = recorder
+        self.name = f'recording({inner.name})'
+
+    def click(self, pos):
+        self.recorder.event('click', pos)
+        self.inner.click(pos)
+
+    def drag_to(self, pos):
+        self.recorder.event('drag_to', pos)
+        self.inner.drag_to(pos)
+
+    def event(self, kind, pos):
+        self.recorder.event(kind, pos)
+        self.inner.event(kind, pos)
+
+    def flush(self):
+        self.inner.flush()
+
+
+class TimedInput:
+    """Passes events through to another backend and times each one"""
+
+    def __init__(self, inner, metrics):
+        self.inner = inner
+        self.metrics = metrics
+        self.name = inner.name
+
+    def click(self, pos):
+        with self.metrics.timer('input.click'):
+            self.inner.click(pos)
+
+    def drag_to(self, pos):
+        with self.metrics.timer('input.drag_to'):
+            self.inner.drag_to(pos)
+
+    def event(self, kind, pos):
+        # Deploy events are timed as a whole by the caller; keep this path lean
+        self.inner.event(kind, pos)
+
+    def flush(self):
+        with self.metrics.timer('input.flush'):
+            self.inner.flush()
@@ -1,12 +1,43 @@
-from PIL import ImageGrab
-import pyautogui
-import easyocr
 import cv2 
 import numpy as np
 import time
+import asyncio
+import contextlib
 import os
 import json
+import shutil
+import signal
+import sqlite3
+import subprocess
 import sys
+import tempfile
+import threading
+
+from capture import FrameCapture, Frame, union_bbox, default_backend
+from ocr import (recognize_batch, left_to_right, to_grey, parse_number, parse_reading, best_reading,
+                 ReaderLoader, OCRCache)
+from digits import DigitRecognizer, build_templates
+from waits import ScreenWaiter, button_box
+from evaluation import AdaptiveEvaluator
+from inputs import PyAutoGUIInput, RecordingInput, TimedInput
+from replay import SessionRecorder, RecordingBackend, ReplaySession, ReplayFinished
+from benchmark import percentiles, accuracy_report, load_labelled_crops
+from metrics import Metrics, ThreadProfiles, append_snapshot, serve_prometheus, install_profile_signal
+from ocr_server import serve, RemoteReaderLoader, DEFAULT_SOCKET
+from deploy import build_schedule, DeployEngine
+from battle import BattleMonitor
+from preprocess import PreprocessorBank, RegionPreprocessor
+from pipeline import ResultsPipeline
+from basedb import BaseStore
+from thresholds import ThresholdController
+from backtest import load_logs, backtest
+from onnx_ocr import BACKENDS, ensure_model
+from calibrate import Calibrator, build_anchors, map_point, map_box, resolution_key, to_grey_image
+from screens import ScreenClassifier, RecoveryMachine, StuckError, build_screen_states, UNKNOWN
+from flight import FlightRecorder, FlightInput, FLIGHT_DIR, TRIGGERS, DEFAULT_TRIGGERS
+from soak import MemoryTracker, SoakFinished, SyntheticSession, synthetic_frames, TRACED_BUDGET_MB, RSS_BUDGET_MB
+from adb import AdbBackend, AdbInput, FakeAdbServer, ADB_PORT
+from runtime import Runtime
 
 
 # ========== HARDCODED COORDINATES (DEFAULT VALUES) ==========
@@ -37,6 +68,15 @@ DEFAULT_DEPLOY_LINE3 = [(1600, 570), (1260, 850)]
 DEFAULT_DEPLOY_LINE4 = [(710, 840), (380, 580)]
 
 
+# ========== LOOT THRESHOLDS ==========
+
+# Starting thresholds; the controller moves them once enough bases are logged
+INITIAL_THRESHOLDS = {'Gold': 500000, 'Elixir': 500000, 'Dark Elixir': 50000}
+
+# Loot/hour is scored in gold-equivalents; dark elixir is worth more per unit
+LOOT_WEIGHTS = {'Gold': 1.0, 'Elixir': 1.0, 'Dark Elixir': 10.0}
+
+
 def clear_console():
     """Clears the console screen"""
     if os.name == 'nt':
@@ -47,6 +87,8 @@ def clear_console():
 
 def set_region(region_name, instruction=""):
     """Interactive region selection (2 corners)"""
+    import pyautogui
+    
     print(f"\n--- Setting {region_name} ---")
     if instruction:
         print(f"ℹ️  {instruction}")
@@ -66,6 +108,8 @@ def set_region(region_name, instruction=""):
 
 def set_button(button_name, instruction=""):
     """Interactive button position selection"""
+    import pyautogui
+    
     print(f"\n--- Setting {button_name} ---")
     if instruction:
         print(f"ℹ️  {instruction}")
@@ -78,6 +122,8 @@ def set_button(button_name, instruction=""):
 
 def set_deploy_line(line_number):
     """Interactive deployment line selection"""
+    import pyautogui
+    
     print(f"\n--- Setting Deployment Line {line_number} ---")
     
     pyautogui.alert(f'Move mouse to START point of Line {line_number} and press Enter')
@@ -92,17 +138,17 @@ def set_deploy_line(line_number):
     return [start, end]
 
 
-def save_config(config_data):
-    """Save all coordinates to cache.json"""
-    with open('cache.json', 'w') as f:
+def save_config(config_data, path='cache.json'):
+    """Save all coordinates to cache.json (or another profile)"""
+    with open(path, 'w') as f:
         json.dump(config_data, f, indent=4)
-    print("\n✓ Configuration saved to cache.json!\n")
+    print(f"\n✓ Configuration saved to {path}!\n")
 
 
-def load_config():
-    """Load all coordinates from cache.json"""
+def load_config(path='cache.json'):
+    """Load all coordinates from cache.json (or another profile)"""
     try:
-        with open('cache.json', 'r') as f:
+        with open(path, 'r') as f:
             config = json.load(f)
         
         # Convert lists to tuples where needed
@@ -262,7 +308,7 @@ def setup_mode():
         return
     
     # Load existing config or start fresh
-    config = load_config() or {}
+    config = load_config(config_path) or {}
     
     # Execute chosen setup
     if choice == 1:
@@ -280,29 +326,317 @@ def setup_mode():
         setup_action_buttons(config)
         setup_deployment_zones(config)
     
+    # A calibration maps the old coordinates; the next run localises the new ones afresh
+    if config.pop('calibration', None):
+        print("📐 Cached calibration cleared; it is redone on the next search screen")
+    
     # Save configuration
-    save_config(config)
+    save_config(config, config_path)
     
     print("=" * 65)
     print("✓ Setup Complete!")
     print("=" * 65)
-    print("\nYour coordinates have been saved to cache.json")
+    print(f"\nYour coordinates have been saved to {config_path}")
     print("Run the bot normally: python main.py\n")
 
 
+def get_flag_value(flag, default=None):
+    """Value following a command-line flag, e.g. --save-crops crops/"""
+    if flag in sys.argv:
+        index = sys.argv.index(flag)
+        if index + 1 < len(sys.argv):
+            return sys.argv[index + 1]
+    return default
+
+
+# Coordinate profile; one per emulator instance when running several
+config_path = get_flag_value("--config", "cache.json")
+
+# Android device driven over adb instead of the desktop ('any' when only one is attached)
+adb_serial = get_flag_value("--adb")
+adb_device = None if adb_serial == 'any' else adb_serial
+adb_port = int(get_flag_value("--adb-port", ADB_PORT))
+
+
+def build_templates_mode(crop_dir):
+    """Build digit templates from labelled crops ('<value>_*.png')"""
+    print(f"\n🔤 Building digit templates from {crop_dir}...")
+    used, skipped, missing = build_templates(crop_dir)
+    print(f"  ✓ Used {used} crops, skipped {skipped}")
+    if missing:
+        print(f"  ⚠ No samples for digits: {', '.join(missing)}")
+    print("\n✓ Templates saved! The fast digit reader is used on the next run.\n")
+
+
+def startup_benchmark_mode():
+    """Measure EasyOCR import, model load and first-inference time separately"""
+    print("\n⏱️  STARTUP BENCHMARK")
+    print("=" * 40)
+    loader = ReaderLoader(['en'], gpu=False)
+    wall_start = time.perf_counter()
+    loader.get()
+    wall_time = time.perf_counter() - wall_start
+    
+    print(f"  Import easyocr/torch: {loader.timings['import']:.2f}s")
+    print(f"  Model load:           {loader.timings['load']:.2f}s")
+    print(f"  First inference:      {loader.timings['first_inference']:.2f}s")
+    print(f"  Total:                {wall_time:.2f}s\n")
+
+
+def capture_benchmark_mode(count=100):
+    """Full-screen capture latency and fps of the desktop backend next to the adb backend"""
+    print(f"\n📸 CAPTURE BENCHMARK ({count} full-screen frames per backend)")
+    print("=" * 60)
+    fake = None
+    if adb_serial:
+        port, label = adb_port, f"adb {adb_serial}"
+    else:
+        # No device given: a local fake adb server streaming 1920x1080 frames
+        fake = FakeAdbServer(synthetic_frames([DEFAULT_GOLD_COORD, DEFAULT_ELIXIR_COORD, DEFAULT_DARK_COORD]))
+        fake.start()
+        port, label = fake.port, "adb (fake server)"
+    backends = [('desktop', default_backend), (label, lambda: AdbBackend(adb_device, port=port))]
+    
+    try:
+        for name, make in backends:
+            try:
+                capture = FrameCapture(make(), history=count)
+            except Exception as e:
+                print(f"  ⚠ {name}: unavailable ({e})")
+                continue
+            try:
+                capture.grab()
+                start = time.perf_counter()
+                for _ in range(count):
+                    frame = capture.grab()
+                elapsed = time.perf_counter() - start
+            except Exception as e:
+                print(f"  ⚠ {name}: capture failed ({e})")
+                continue
+            finally:
+                capture.close()
+            stats = capture.stats()
+            h, w = frame.image.shape[:2]
+            print(f"  {name:<20} {w}x{h} {frame.order:<4} | mean {stats['mean_ms']:.1f} ms, "
+                  f"p95 {stats['p95_ms']:.1f} ms | {count / elapsed:.1f} fps")
+        
+        if fake is not None:
+            # Only against the fake server: these would be real taps on a device
+            inputs = AdbInput(port=port)
+            taps = [(100 + i, 500) for i in range(64)]
+            start = time.perf_counter()
+            for pos in taps:
+                inputs.click(pos)
+            single = time.perf_counter() - start
+            trips = inputs.shell.round_trips
+            start = time.perf_counter()
+            for pos in taps:
+                inputs.event('tap', pos)
+            inputs.flush()
+            batched = time.perf_counter() - start
+            inputs.close()
+            print(f"  adb input: {len(taps)} taps in {single * 1000:.1f} ms one per round trip, "
+                  f"{batched * 1000:.1f} ms batched ({inputs.shell.round_trips - trips} round trips)")
+    finally:
+        if fake is not None:
+            fake.stop()
+    print()
+
+
+def build_screens_mode(screen_dir):
+    """Build screen-state prototypes from labelled screenshots ('<state>_*.png')"""
+    print(f"\n🧭 Building screen states from {screen_dir}...")
+    try:
+        counts, skipped, missing = build_screen_states(screen_dir)
+    except ValueError as e:
+        print(f"  ❌ {e}\n")
+        return
+    for state, n in counts.items():
+        print(f"  {state}: {n} screenshots")
+    if skipped:
+        print(f"  ⚠ Skipped {skipped} unreadable files")
+    if missing:
+        print(f"  ⚠ No screenshots for: {', '.join(missing)}")
+    print("\n✓ Screen states saved! Stall recovery is enabled on the next run.\n")
+
+
+def backtest_mode(paths, top=20):
+    """Rank attack rules by simulated loot/hour over recorded base logs; False on failure"""
+    print("\n📉 BACKTEST")
+    print("=" * 60)
+    start = time.perf_counter()
+    try:
+        rows = load_logs(paths)
+    except sqlite3.Error as e:
+        print(f"❌ Could not read base log(s) {', '.join(paths)}: {e}")
+        return False
+    load_time = time.perf_counter() - start
+    print(f"  Loaded {len(rows):,} bases from {len(paths)} log(s) in {load_time:.2f}s")
+    
+    start = time.perf_counter()
+    try:
+        model, ranked = backtest(rows, weights=LOOT_WEIGHTS, reference=INITIAL_THRESHOLDS)
+    except ValueError as e:
+        print(f"❌ {e}")
+        return False
+    eval_time = time.perf_counter() - start
+    print(f"  Scored {len(ranked):,} rules over {len(model['values']):,} fully read bases "
+          f"in {eval_time:.2f}s")
+    yields = ', '.join(f"{name} {y:.0%}" for name, y in zip(('Gold', 'Elixir', 'Dark'), model['yields']))
+    print(f"  Search {model['search_s']:.1f}s/base | Attack {model['attack_s']:.0f}s "
+          f"| Yield {yields} ({model['attacks']} scored attacks)\n")
+    
+    print(f"  {'#':>4}  {'loot/h':>12} {'gold/h':>11} {'elixir/h':>11} {'dark/h':>9} "
+          f"{'atk/h':>6} {'bases/atk':>9}  rule")
+    for i, row in enumerate(ranked):
+        if i < top or row['rule'].startswith('live'):
+            print(f"  {i + 1:>4}  {row['loot_per_hour']:>12,.0f} {row['gold_per_hour']:>11,.0f} "
+                  f"{row['elixir_per_hour']:>11,.0f} {row['dark_per_hour']:>9,.0f} "
+                  f"{row['attacks_per_hour']:>6.1f} {row['bases_per_attack']:>9.1f}  {row['rule']}")
+    print()
+    return True
+
+
+# Seconds a worker gets to exit after terminate() before it is killed
+WORKER_STOP_TIMEOUT = 10
+
+
+def instance_target(args):
+    """What an instance's worker drives: ('adb', serial), ('offline', None) or ('desktop', None)"""
+    if '--adb' in args:
+        index = args.index('--adb')
+        return 'adb', args[index + 1] if index + 1 < len(args) else 'any'
+    if '--replay' in args or '--soak' in args:
+        return 'offline', None
+    return 'desktop', None
+
+
+def check_instance_targets(instances):
+    """Why these instances cannot run side by side, or None if they can
+
+    Desktop workers would share one OS cursor (and calibration would match templates
+    anywhere on the desktop), so at most one instance may use it; the others need their
+    own adb device.
+    """
+    targets = [instance_target(instance.get('args', [])) for instance in instances]
+    desktop = [i['name'] for i, (kind, _) in zip(instances, targets) if kind == 'desktop']
+    if len(desktop) > 1:
+        return (f"{', '.join(desktop)} would all drive the desktop mouse; give all but one "
+                f"an adb device (\"args\": [\"--adb\", \"emulator-5554\"])")
+    serials = [serial for kind, serial in targets if kind == 'adb']
+    if len(serials) > 1 and 'any' in serials:
+        return "'--adb any' is ambiguous with several adb instances; name each device's serial"
+    if len(set(serials)) < len(serials):
+        return "two instances use the same adb device"
+    return None
+
+
+def stop_workers(workers, timeout=WORKER_STOP_TIMEOUT):
+    """Terminate every worker still running, killing any that outlast the timeout"""
+    for worker in workers:
+        if worker.poll() is None:
+            worker.terminate()
+    for worker in workers:
+        try:
+            worker.wait(timeout)
+        except subprocess.TimeoutExpired:
+            worker.kill()
+            worker.wait()
+
+
+def instances_mode(spec_path):
+    """Run one bot worker per instance profile, all sharing one OCR server process"""
+    with open(spec_path) as f:
+        spec = json.load(f)
+    problem = check_instance_targets(spec['instances'])
+    if problem:
+        print(f"❌ Cannot run these instances together: {problem}")
+        return False
+    socket_path = spec.get('socket', DEFAULT_SOCKET)
+    threads = spec.get('ocr_threads', 2)
+    backend = spec.get('ocr_backend', 'torch')
+    script = os.path.abspath(__file__)
+    
+    print("\n🖥️  MULTI-INSTANCE MODE")
+    print("=" * 60)
+    server = subprocess.Popen([sys.executable, script, '--ocr-serve', socket_path,
+                               '--ocr-threads', str(threads), '--ocr-backend', backend])
+    
+    workers = []
+    # Worker logs are closed, and the workers and server stopped, however this ends
+    with contextlib.ExitStack() as logs:
+        try:
+            os.makedirs('logs', exist_ok=True)
+            for instance in spec['instances']:
+                name = instance['name']
+                args = instance.get('args', [])
+                command = [sys.executable, script, '--config', instance.get('config', 'cache.json'),
+                           '--ocr-server', socket_path, '--no-prompt'] + args
+                # Each worker keeps its own base log, flight recorder dumps and metrics
+                if '--base-log' not in args:
+                    command += ['--base-log', f'bases_{name}.db']
+                if '--flight-dir' not in args:
+                    command += ['--flight-dir', os.path.join(FLIGHT_DIR, name)]
+                if spec.get('metrics') and '--metrics' not in args:
+                    command += ['--metrics', os.path.join('logs', f'{name}.metrics.jsonl')]
+                log = logs.enter_context(open(os.path.join('logs', f'{name}.log'), 'w'))
+                workers.append((name, subprocess.Popen(command, stdout=log, stderr=subprocess.STDOUT)))
+                print(f"  ✓ Started {name} (log: logs/{name}.log)")
+            
+            for name, worker in workers:
+                code = worker.wait()
+                print(f"  {'✓' if code == 0 else '❌'} {name} exited with code {code}")
+        except KeyboardInterrupt:
+            print("\n🛑 Stopping all instances...")
+        finally:
+            stop_workers([worker for _, worker in workers])
+            # SIGINT lets the server print its batching stats and remove the socket
+            server.send_signal(signal.SIGINT)
+            server.wait()
+    return True
+
+
 # ========== CHECK FOR SETUP FLAG ==========
 
 if "--setup" in sys.argv:
     setup_mode()
     sys.exit(0)
 
+if "--build-templates" in sys.argv:
+    build_templates_mode(get_flag_value("--build-templates", "crops"))
+    sys.exit(0)
+
+if "--benchmark-startup" in sys.argv:
+    startup_benchmark_mode()
+    sys.exit(0)
+
+if "--benchmark-capture" in sys.argv:
+    capture_benchmark_mode(int(get_flag_value("--frames", 100)))
+    sys.exit(0)
+
+if "--ocr-serve" in sys.argv:
+    serve(get_flag_value("--ocr-serve", DEFAULT_SOCKET), int(get_flag_value("--ocr-threads", 2)),
+          get_flag_value("--ocr-backend", "torch"))
+    sys.exit(0)
+
+if "--build-screens" in sys.argv:
+    build_screens_mode(get_flag_value("--build-screens", "screens"))
+    sys.exit(0)
+
+if "--backtest" in sys.argv:
+    sys.exit(0 if backtest_mode(get_flag_value("--backtest", "bases.db").split(','),
+                                int(get_flag_value("--top", 20))) else 1)
+
+if "--instances" in sys.argv:
+    sys.exit(0 if instances_mode(get_flag_value("--instances", "instances.json")) else 1)
+
 
 # ========== LOAD COORDINATES ==========
 
 clear_console()
 print("Loading coordinates...")
 
-cached = load_config()
+cached = load_config(config_path)
 
 if cached:
     # Use cached coordinates
@@ -321,13 +655,15 @@ if cached:
     attack_btn = cached.get('attack_btn', DEFAULT_ATTACK_BTN)
     find_match_btn = cached.get('find_match_btn', DEFAULT_FIND_MATCH)
     next_btn = cached.get('next_btn', DEFAULT_NEXT_BTN)
+    # Optional spot that closes popups; unknown screens are only waited out without it
+    dismiss_btn = cached.get('dismiss_btn')
     
     deploy_line1 = cached.get('deploy_line1', DEFAULT_DEPLOY_LINE1)
     deploy_line2 = cached.get('deploy_line2', DEFAULT_DEPLOY_LINE2)
     deploy_line3 = cached.get('deploy_line3', DEFAULT_DEPLOY_LINE3)
     deploy_line4 = cached.get('deploy_line4', DEFAULT_DEPLOY_LINE4)
     
-    print("✓ Using cached coordinates from cache.json\n")
+    print(f"✓ Using cached coordinates from {config_path}\n")
 else:
     # Use hardcoded defaults
     gold_coord = DEFAULT_GOLD_COORD
@@ -345,6 +681,7 @@ else:
     attack_btn = DEFAULT_ATTACK_BTN
     find_match_btn = DEFAULT_FIND_MATCH
     next_btn = DEFAULT_NEXT_BTN
+    dismiss_btn = None
     
     deploy_line1 = DEFAULT_DEPLOY_LINE1
     deploy_line2 = DEFAULT_DEPLOY_LINE2
@@ -357,26 +694,224 @@ else:
 
 # ========== LOAD EASYOCR ==========
 
-print("Loading EasyOCR reader...")
-start_time = time.time()
-reader = easyocr.Reader(['en'], gpu=False)
-end_time = time.time()
-execution_time = end_time - start_time
-clear_console()
-print(f"✓ Reader loaded in {execution_time:.2f} seconds\n")
+ocr_socket = get_flag_value("--ocr-server")
+
+if ocr_socket:
+    # Worker mode: the shared OCR server does inference, keep this process lean
+    cv2.setNumThreads(1)
+    reader_loader = RemoteReaderLoader(ocr_socket).start()
+else:
+    # Loaded in the background while the user gets the game ready
+    reader_loader = ReaderLoader(['en'], gpu=False).start()
+
+
+# Search and the background results worker share one reader
+ocr_lock = threading.Lock()
+
+
+def get_reader():
+    """EasyOCR reader, waiting for the background load if needed"""
+    return reader_loader.get()
+
+
+# 'onnx'/'int8' run batched recognition on ONNX Runtime; readtext fallbacks stay on EasyOCR
+ocr_backend = get_flag_value("--ocr-backend", "torch")
+if ocr_backend not in BACKENDS:
+    print(f"⚠ Unknown --ocr-backend '{ocr_backend}', using torch")
+    ocr_backend = 'torch'
+ONNX_THREADS = int(get_flag_value("--onnx-threads", 2))
+onnx_recognizer = None
+
+
+def recognize_lines(crops):
+    """Batched recognition of grey line crops on the selected backend"""
+    global onnx_recognizer
+    if ocr_backend == 'torch' or ocr_socket:
+        return recognize_batch(get_reader(), crops)
+    if onnx_recognizer is None:
+        onnx_recognizer = ensure_model(ocr_backend, get_reader, ONNX_THREADS)
+    return onnx_recognizer.recognize(crops)
+
+
+def print_reader_timings():
+    """Show how long each startup stage of the reader took"""
+    timings = reader_loader.timings
+    total = sum(timings.values())
+    print(f"✓ Reader loaded in {total:.2f} seconds")
+    print(f"   Import: {timings['import']:.2f}s | Model load: {timings['load']:.2f}s "
+          f"| First inference: {timings['first_inference']:.2f}s\n")
+
+
+# ========== SCREEN CAPTURE AND INPUT ==========
+
+record_path = get_flag_value("--record")
+replay_path = get_flag_value("--replay")
+# Soak runs loop a recorded session (or synthetic bases without one) for this many bases
+SOAK_BASES = int(get_flag_value("--soak", 2000)) if "--soak" in sys.argv else 0
+# Set by soak_mode; counts bases and samples memory from inside the search loop
+soak_tracker = None
+
+if replay_path or SOAK_BASES:
+    # Offline: frames and clicks come from a recorded session, sleeps are virtual
+    if replay_path:
+        replay_session = ReplaySession(replay_path, loop=bool(SOAK_BASES))
+    else:
+        loot_regions = [gold_coord, elixir_coord, dark_elixir_coord, ext_gold, ext_elixir, ext_delixir]
+        replay_session = SyntheticSession(synthetic_frames(loot_regions))
+    screen = FrameCapture(replay_session.screen_backend())
+    inputs = replay_session.input_backend()
+elif adb_serial:
+    replay_session = None
+    # Device screen and taps over two persistent adb shells
+    screen = FrameCapture(AdbBackend(adb_device, port=adb_port))
+    inputs = AdbInput(adb_device, port=adb_port)
+else:
+    replay_session = None
+    # One persistent capture handle, reused for every frame
+    screen = FrameCapture()
+    inputs = PyAutoGUIInput()
+
+if replay_session is not None:
+    # Waits, deployment and battle sampling run on the replay's virtual clock
+    timing = {'clock': replay_session.clock.now, 'sleep': replay_session.clock.sleep}
+else:
+    timing = {}
+
+if record_path:
+    recorder = SessionRecorder(record_path)
+    screen = FrameCapture(RecordingBackend(screen.backend, recorder))
+    inputs = RecordingInput(inputs, recorder)
+else:
+    recorder = None
+
+
+# ========== FLIGHT RECORDER ==========
+
+# Last frames, reads and clicks kept in memory; written to disk only when a trigger fires
+FLIGHT_FRAMES = int(get_flag_value("--flight-frames", 64))
+FLIGHT_TRIGGERS = get_flag_value("--flight-triggers", ','.join(DEFAULT_TRIGGERS)).split(',')
+
+if "--no-flight" in sys.argv:
+    flight = None
+else:
+    for trigger in FLIGHT_TRIGGERS:
+        if trigger not in TRIGGERS:
+            print(f"⚠ Unknown flight recorder trigger '{trigger}' (choose from {', '.join(TRIGGERS)})")
+    flight = FlightRecorder(FLIGHT_FRAMES, triggers=FLIGHT_TRIGGERS,
+                            path=get_flag_value("--flight-dir", FLIGHT_DIR))
+    inputs = FlightInput(inputs, flight)
+
+
+def flight_frame(frame, tag):
+    if flight is not None:
+        flight.frame(frame, tag)
+
+
+def flight_read(resource_name, text, value, confidence):
+    if flight is not None:
+        flight.read(resource_name, text, value, confidence)
+
+
+def anomaly(kind, detail=''):
+    """Report an anomaly; dumps the flight recorder when that trigger is enabled"""
+    if flight is not None:
+        flight.trigger(kind, detail)
+
+
+# ========== METRICS ==========
+
+# Samples kept per stage for quantiles
+METRICS_WINDOW = 5000
+
+metrics = Metrics(window=METRICS_WINDOW)
+inputs = TimedInput(inputs, metrics)
+
+metrics_path = get_flag_value("--metrics")
+metrics_port = get_flag_value("--metrics-port")
+
+if metrics_path:
+    # Appended by a runtime timer while farming
+    print(f"📈 Streaming metrics to {metrics_path}")
+if metrics_port:
+    serve_prometheus(metrics, int(metrics_port))
+    print(f"📈 Metrics at http://127.0.0.1:{metrics_port}/metrics")
+
+# Covers the runtime's worker threads and the results worker, not just the event loop
+profiles = ThreadProfiles()
+profile_signal = install_profile_signal(profiles)
+if profile_signal:
+    print(f"🔬 Send {profile_signal} to start/stop a cProfile snapshot (pid {os.getpid()})\n")
+
+
+# ========== BASE LOG AND THRESHOLDS ==========
+
+ADAPTIVE_THRESHOLDS = "--fixed-thresholds" not in sys.argv
+
+# Replays default to an in-memory log so benchmarks do not pollute the real one;
+# soak runs use a throwaway file, as an in-memory log would itself grow without bound
+soak_dir = tempfile.mkdtemp(prefix='soak_') if SOAK_BASES else None
+base_log_path = get_flag_value("--base-log", os.path.join(soak_dir, 'bases.db') if soak_dir
+                               else ":memory:" if replay_session else "bases.db")
+base_store = BaseStore(base_log_path)
+threshold_controller = ThresholdController(base_store, INITIAL_THRESHOLDS, weights=LOOT_WEIGHTS)
+
+# Search and attack durations follow the replay's virtual clock when there is one
+clock = timing.get('clock', time.monotonic)
 
 
 # ========== HELPER FUNCTIONS ==========
 
+# A batched read with any digit below this confidence is doubtful and re-read with full
+# readtext, as are reads that are not grouped in threes or fall outside VALUE_RANGES
+OCR_MIN_CONFIDENCE = 0.5
+
+# Plausible loot per counter; a read outside its range is a misread
+VALUE_RANGES = {
+    'Gold': (0, 5000000),
+    'Elixir': (0, 5000000),
+    'Dark Elixir': (0, 100000),
+}
+
+# Template digit reads below this confidence go to EasyOCR
+DIGIT_MIN_CONFIDENCE = 0.85
+
+# EasyOCR reads saved with --save-crops must be at least this confident
+CROP_SAVE_CONFIDENCE = 0.9
+
+# Repeated pixel-identical crops skip OCR entirely
+OCR_CACHE_SIZE = 256
+
+# Crops go straight from the captured frame to grey at the recognizer's input height.
+# Per-region tuning, e.g. {'Dark Elixir': {'binarize': True}}
+PREPROCESS_DEFAULTS = {'height': 64, 'binarize': False}
+PREPROCESS_OVERRIDES = {}
+
+preprocess = PreprocessorBank(PREPROCESS_DEFAULTS, PREPROCESS_OVERRIDES)
+digit_reader = DigitRecognizer.load()
+ocr_cache = OCRCache(OCR_CACHE_SIZE)
+crop_dir = get_flag_value("--save-crops")
+
+# Doubtful batched reads, how many readtext re-reads turned trustworthy, and reads with no usable value
+read_stats = {'doubtful': 0, 'fixed': 0, 'unusable': 0}
+
+
 def capture_region(coord):
-    """Capture screenshot of specified region"""
+    """Capture one screen frame covering the specified region"""
     if coord is None:
         raise ValueError("Coordinates not set!")
-    return ImageGrab.grab(bbox=coord)
-
-
-def image_to_cv2(im):
-    """Convert PIL Image to OpenCV format (BGR)"""
+    return screen.grab([coord])
+
+
+def image_to_cv2(im, order='RGB'):
+    """Convert PIL Image or NumPy crop to OpenCV format (BGR)"""
+    if isinstance(im, np.ndarray):
+        if order == 'BGR':
+            return im
+        if order == 'BGRA':
+            return cv2.cvtColor(im, cv2.COLOR_BGRA2BGR)
+        if order == 'RGBA':
+            return cv2.cvtColor(im, cv2.COLOR_RGBA2BGR)
+        return cv2.cvtColor(im, cv2.COLOR_RGB2BGR)
     if im.mode != 'RGB':
         im = im.convert('RGB')
     numpy_image = np.array(im)
@@ -384,14 +919,16 @@ def image_to_cv2(im):
     return cv2_image
 
 
-def extract_text_from_region(coord, resource_name="Unknown"):
+def extract_text_from_region(coord, resource_name="Unknown", frame=None):
     """Extract text from a screen region using OCR"""
-    screenshot = capture_region(coord)
-    cv2_image = image_to_cv2(screenshot)
-    results = reader.readtext(cv2_image, allowlist='0123456789,. ')
+    if frame is None:
+        frame = capture_region(coord)
+    cv2_image = image_to_cv2(frame.crop(coord), frame.order)
+    with ocr_lock:
+        results = get_reader().readtext(cv2_image, allowlist='0123456789,. ')
     
     extracted = []
-    for detection in results:
+    for detection in left_to_right(results):
         text = detection[1]
         confidence = detection[2]
         extracted.append((text, confidence))
@@ -399,6 +936,78 @@ def extract_text_from_region(coord, resource_name="Unknown"):
     return extracted
 
 
+def save_crop(crop, reading):
+    """Keep a confidently read crop as '<value>_<time>.png' for --build-templates"""
+    if reading.problem is None and reading.confidence >= CROP_SAVE_CONFIDENCE:
+        os.makedirs(crop_dir, exist_ok=True)
+        cv2.imwrite(os.path.join(crop_dir, f"{reading.value}_{time.time_ns()}.png"), crop)
+
+
+def parse_region(resource_name, results):
+    """Reading of one region's OCR fragments, checked against its plausible range"""
+    return parse_reading(results, VALUE_RANGES.get(resource_name), OCR_MIN_CONFIDENCE)
+
+
+def read_regions(resource_list, frame):
+    """Read all regions of a frame into Readings
+
+    Digit templates first, then batched OCR; only regions whose batched read is doubtful
+    pay for a full readtext.
+    """
+    with metrics.timer('convert'):
+        crops = [preprocess(resource_name, coord, frame) for resource_name, coord in resource_list]
+    readings = {}
+    
+    pending = []
+    for (resource_name, coord), grey in zip(resource_list, crops):
+        key = OCRCache.key(grey, resource_name)
+        
+        # Pixel-identical crop seen before: reuse its result
+        cached = ocr_cache.get(key)
+        if cached is not None:
+            readings[resource_name] = cached
+            continue
+        
+        # Fast path: template-matched digits
+        if digit_reader is not None:
+            value, confidence = digit_reader.read(grey)
+            reading = parse_reading([] if value is None else [(str(value), confidence)],
+                                    VALUE_RANGES.get(resource_name), DIGIT_MIN_CONFIDENCE)
+            fell_back = reading.problem is not None
+            digit_reader.record(fell_back)
+            if not fell_back:
+                readings[resource_name] = reading
+                ocr_cache.put(key, reading)
+                continue
+        pending.append((resource_name, coord, grey, key))
+    
+    if not pending:
+        return readings
+    
+    try:
+        with ocr_lock:
+            batch = recognize_lines([crop for _, _, crop, _ in pending])
+    except Exception as e:
+        print(f"  ⚠ Batched OCR failed ({e}), using full OCR")
+        batch = [[] for _ in pending]
+    
+    for (resource_name, coord, crop, key), results in zip(pending, batch):
+        reading = parse_region(resource_name, results)
+        if reading.problem is not None:
+            read_stats['doubtful'] += 1
+            reread = parse_region(resource_name, extract_text_from_region(coord, resource_name, frame))
+            if reread.problem is None:
+                read_stats['fixed'] += 1
+            reading = best_reading([reading, reread])
+        if not reading.usable:
+            read_stats['unusable'] += 1
+        if crop_dir:
+            save_crop(crop, reading)
+        ocr_cache.put(key, reading)
+        readings[resource_name] = reading
+    return readings
+
+
 # Resource coordinate mappings
 resources_coord = [
     ("Gold", gold_coord),
@@ -412,45 +1021,281 @@ extracted_res_coord = [
     ("Dark Elixir", ext_delixir)
 ]
 
+# In-battle "available loot" counters; the search-screen spots unless set in cache.json
+battle_coord = [
+    ("Gold", (cached or {}).get('battle_gold', gold_coord)),
+    ("Elixir", (cached or {}).get('battle_elixir', elixir_coord)),
+    ("Dark Elixir", (cached or {}).get('battle_dark_elixir', dark_elixir_coord))
+]
+
+# Whole loot panels, watched for screen transitions
+search_region = union_bbox(coord for _, coord in resources_coord)
+results_region = union_bbox(coord for _, coord in extracted_res_coord)
+
 # Global dictionaries
 found_resources = {}
 extracted_res = {}
 
 
-def get_resource_value(resource_list, res_dict):
-    """Read resource values from screen"""
-    for resource_name, coord in resource_list:
+
+# ========== SCREEN WAITS ==========
+
+# Upper bounds (seconds) for each transition; waits return as soon as the screen settles
+NEXT_BASE_TIMEOUT = 8
+SELECT_TROOP_TIMEOUT = 0.5
+CONFIRM_DIALOG_TIMEOUT = 2
+RESULTS_TIMEOUT = 8
+LOBBY_TIMEOUT = 10
+ATTACK_MENU_TIMEOUT = 3
+MATCH_TIMEOUT = 10
+
+# How long to wait for in-flight results-screen reads when the bot stops
+RESULTS_DRAIN_TIMEOUT = 60
+
+waiter = ScreenWaiter(screen, **timing)
+
+
+def click_and_wait(pos, region, timeout, stage, settle=0.3, warn=True):
+    """Click, then wait until region changes and settles (timeout as a safe upper bound)
+
+    Returns False when the screen never settled, a hint that the click went astray.
+    """
+    try:
+        before = waiter.signature(region)
+    except Exception:
+        before = None
+    
+    inputs.click(pos)
+    
+    with metrics.timer(f'wait.{stage}'):
+        try:
+            settled = waiter.wait(region, before, timeout, settle)
+        except Exception as e:
+            print(f"  ⚠ Screen wait failed ({e}), sleeping {timeout}s")
+            waiter.sleep(timeout)
+            return False
+    if not settled and warn:
+        print(f"  ⚠ Screen did not settle within {timeout}s, continuing")
+    return settled
+
+
+async def click_and_wait_async(rt, pos, region, frame, timeout, stage, settle=0.3, on_still=None):
+    """click_and_wait on the runtime, for a region the capture task is watching
+
+    The baseline comes from an already captured frame and the wait uses the capture
+    task's frames, so nothing extra is grabbed. Returns (settled, last frame seen).
+    """
+    try:
+        before = waiter.frame_signature(frame, region) if frame is not None else None
+    except Exception:
+        before = None
+    
+    await rt.click(pos)
+    
+    with metrics.timer(f'wait.{stage}'):
         try:
-            results = extract_text_from_region(coord, resource_name)
+            settled, frame = await rt.wait(waiter, region, before, rt.now(), timeout, settle, on_still)
+        except Exception as e:
+            print(f"  ⚠ Screen wait failed ({e}), sleeping {timeout}s")
+            await rt.sleep(timeout)
+            return False, None
+    if not settled:
+        print(f"  ⚠ Screen did not settle within {timeout}s, continuing")
+    return settled, frame
+
+
+async def latest_frame(rt, after=None):
+    """Newest frame from the capture task (grabbed after `after`), or None if capture failed"""
+    try:
+        frame, _ = await rt.next_frame(after)
+    except Exception as e:
+        capture_failed(e)
+        return None
+    return frame
+
+
+# ========== SCREEN STATES ==========
+
+# Search reads in a row with nothing readable before the bot gives up
+STALL_LIMIT = 10
+
+# Built with --build-screens; without it stalls are only detected, not recovered
+screen_classifier = ScreenClassifier.load()
+screens_dir = get_flag_value("--save-screens")
+if screens_dir:
+    os.makedirs(screens_dir, exist_ok=True)
+
+
+def screen_state():
+    """Classify the whole screen (no OCR); None without a screen classifier"""
+    if screen_classifier is None:
+        return None
+    with metrics.timer('classify'):
+        frame = screen.grab()
+        state, _ = screen_classifier.classify(frame)
+    flight_frame(frame, f'screen:{state}')
+    return state
+
+
+def save_screen(state):
+    """Keep a full screenshot labelled with the state the bot believes it is in"""
+    if not screens_dir:
+        return
+    try:
+        frame = screen.grab()
+        name = f"{state}_{time.time_ns()}.png"
+        cv2.imwrite(os.path.join(screens_dir, name), image_to_cv2(frame.image, frame.order))
+    except Exception as e:
+        print(f"  ⚠ Could not save screen: {e}")
+
+
+def dismiss_popup():
+    if dismiss_btn is not None:
+        inputs.click(dismiss_btn)
+    waiter.sleep(1.0)
+
+
+def surrender():
+    click_and_wait(end_battle_btn, button_box(confirm_end_btn), CONFIRM_DIALOG_TIMEOUT, 'confirm_dialog')
+    click_and_wait(confirm_end_btn, results_region, RESULTS_TIMEOUT, 'results', settle=0.5)
+
+
+# One step from each screen towards scouting (the search screen)
+recovery_actions = {
+    'lobby': lambda: click_and_wait(attack_btn, button_box(find_match_btn), ATTACK_MENU_TIMEOUT,
+                                    'attack_menu'),
+    'matchmaking': lambda: click_and_wait(find_match_btn, search_region, MATCH_TIMEOUT, 'match',
+                                          settle=0.5),
+    'battle': surrender,
+    'results': lambda: click_and_wait(return_lobby_btn, button_box(attack_btn), LOBBY_TIMEOUT,
+                                      'lobby', settle=0.5),
+    UNKNOWN: dismiss_popup,
+}
+
+recovery = RecoveryMachine(lambda: screen_state(), recovery_actions, target='scouting', **timing)
+
+
+def recover_screen(target='scouting'):
+    """Walk back to target if the screen shows something else; True if the bot had to move"""
+    if screen_classifier is None:
+        return False
+    start = time.perf_counter()
+    path = recovery.recover(target)
+    if len(path) == 1:
+        return False
+    metrics.observe('recovery', time.perf_counter() - start)
+    print(f"  🧭 Recovered: {' > '.join(path)}")
+    anomaly('recovery', ' > '.join(path))
+    return True
+
+
+def grab_frame(resource_list):
+    """Capture one frame covering all regions, or None if capture failed"""
+    try:
+        frame = screen.grab([coord for _, coord in resource_list])
+    except Exception as e:
+        capture_failed(e)
+        return None
+    return note_frame(frame)
+
+
+def note_frame(frame):
+    """Time and flight-record a frame that is about to be read"""
+    metrics.observe('capture', frame.latency)
+    print(f"  📸 Frame captured in {frame.latency * 1000:.1f} ms")
+    flight_frame(frame, 'read')
+    return frame
+
+
+def capture_failed(error):
+    print(f"  ❌ Capture Error: {error}")
+    anomaly('exception', f"capture: {error}")
+
+
+def get_resource_value(resource_list, res_dict, frame=None):
+    """Read resource values from screen (one capture for all regions)
+
+    A region with no usable value is stored as None, never as 0 loot.
+    """
+    if frame is None:
+        frame = grab_frame(resource_list)
+        if frame is None:
+            for resource_name, _ in resource_list:
+                res_dict[resource_name] = None
+            return
+    
+    readings, error = try_read_regions(resource_list, frame)
+    report_readings(resource_list, readings, res_dict, error)
+
+
+def try_read_regions(resource_list, frame):
+    """read_regions() timed as OCR: (readings, None), or ({}, the error) if it failed"""
+    try:
+        with metrics.timer('ocr'):
+            return read_regions(resource_list, frame), None
+    except Exception as e:
+        return {}, e
+
+
+def report_readings(resource_list, readings, res_dict, error=None):
+    """Print and flight-record readings, storing each value in res_dict (None if unusable)
+
+    A failed read (`error`) and every unusable reading are reported as anomalies.
+    """
+    if error is not None:
+        print(f"  ❌ OCR Error: {error}")
+        anomaly('exception', f"OCR: {error}")
+    
+    with metrics.timer('parse'):
+        for resource_name, coord in resource_list:
+            reading = readings.get(resource_name)
+            if reading is None:
+                print(f"  ❌ {resource_name} Error: region was not read")
+                res_dict[resource_name] = None
+                anomaly('exception', f"{resource_name}: region was not read")
+                continue
             
-            if results:
-                for text, confidence in results:
-                    cleaned_text = text.replace(',', '').replace(' ', '').replace('.', '')
-                    
-                    if cleaned_text.isdigit():
-                        number = int(cleaned_text)
-                        res_dict[resource_name] = number
-                        print(f"  {resource_name}: {number:,}")
-                    else:
-                        print(f"  ⚠ {resource_name}: Could not parse '{text}'")
-                        res_dict[resource_name] = 0
-            else:
+            flight_read(resource_name, reading.text, reading.value if reading.usable else None,
+                        reading.confidence)
+            if reading.usable:
+                res_dict[resource_name] = reading.value
+                doubt = f" (doubtful, confidence {reading.confidence:.2f})" if reading.problem else ""
+                print(f"  {resource_name}: {reading.value:,}{doubt}")
+            elif not reading.text:
                 print(f"  ⚠ {resource_name}: No text detected!")
-                res_dict[resource_name] = 0
-                
-        except Exception as e:
-            print(f"  ❌ {resource_name} Error: {e}")
-            res_dict[resource_name] = 0
+                res_dict[resource_name] = None
+                anomaly('zero_read', f"{resource_name}: no text")
+            else:
+                print(f"  ⚠ {resource_name}: Could not parse '{reading.text}' ({reading.problem})")
+                res_dict[resource_name] = None
+                anomaly('zero_read', f"{resource_name}: could not parse '{reading.text}' ({reading.problem})")
+
+
+def read_values(resource_list, frame):
+    """Quiet version of get_resource_value: {name: value}, None where no usable value was read"""
+    readings = read_regions(resource_list, frame)
+    values = {}
+    for resource_name, _ in resource_list:
+        reading = readings[resource_name]
+        values[resource_name] = reading.value if reading.usable else None
+        flight_read(resource_name, reading.text, reading.value if reading.usable else None,
+                    reading.confidence)
+    return values
+
+
+def format_loot(value):
+    """A loot value for printing; 'unread' for None"""
+    return "unread" if value is None else f"{value:,}"
 
 
 def checkif(gold_threshold, elixir_threshold, dark_threshold, req_resource):
-    """Check if any resource meets threshold"""
+    """Check if any resource meets threshold (an unread resource never does)"""
     try:
-        if req_resource.get('Gold', 0) >= gold_threshold:
+        if (req_resource.get('Gold') or 0) >= gold_threshold:
             return True
-        elif req_resource.get('Elixir', 0) >= elixir_threshold:
+        elif (req_resource.get('Elixir') or 0) >= elixir_threshold:
             return True
-        elif req_resource.get('Dark Elixir', 0) >= dark_threshold:
+        elif (req_resource.get('Dark Elixir') or 0) >= dark_threshold:
             return True
         else:
             return False
@@ -459,150 +1304,931 @@ def checkif(gold_threshold, elixir_threshold, dark_threshold, req_resource):
         return False
 
 
-def find_base(gold_threshold, elixir_threshold, dark_threshold):
-    """Search for a base that meets loot requirements"""
+# Learns which resource to read first during search
+evaluator = AdaptiveEvaluator([name for name, _ in resources_coord])
+
+
+def read_base(thresholds, frame=None):
+    """Read search-screen resources in the evaluator's order, reporting and counting nothing
+
+    Reads the given frame, or captures one. Returns (frame, readings, error, trace) for
+    commit_base(); frame is None and error the capture error if capture failed.
+    """
+    if frame is None:
+        try:
+            frame = screen.grab([coord for _, coord in resources_coord])
+        except Exception as e:
+            return None, {}, e, None
+    readings = {}
+    errors = []
+    
+    def read(resource_list):
+        found, error = try_read_regions(resource_list, frame)
+        readings.update(found)
+        if error is not None:
+            errors.append(error)
+        return {name: found[name].value if name in found and found[name].usable else 0
+                for name, _ in resource_list}
+    
+    _, trace = evaluator.trial(resources_coord, thresholds, read)
+    return frame, readings, (errors[0] if errors else None), trace
+
+
+def commit_base(result):
+    """Report a read_base() result as the base being evaluated and count it; returns its frame"""
+    frame, readings, error, trace = result
+    found_resources.clear()
+    if frame is None:
+        capture_failed(error)
+        return None
+    note_frame(frame)
+    evaluator.commit(trace)
+    read = {name for name, _, _ in trace[1]}
+    report_readings([(name, coord) for name, coord in resources_coord if name in read],
+                    readings, found_resources, error)
+    return frame
+
+
+def evaluate_base(thresholds, frame=None):
+    """Read search-screen resources, stopping at the first read that passes
+
+    Reads the given frame, or captures one. Returns the frame (None if capture failed).
+    """
+    return commit_base(read_base(thresholds, frame))
+
+
+def same_regions(a, b, resource_list):
+    """Whether two frames hold identical pixels in every region"""
+    return all(np.array_equal(a.crop(coord), b.crop(coord)) for _, coord in resource_list)
+
+
+def log_base(search_s, resources):
+    """Append an evaluated base to the base log and let the controller refit; returns its id"""
+    base_id = base_store.log_base(resources.get('Gold'), resources.get('Elixir'),
+                                  resources.get('Dark Elixir'), search_s)
+    if ADAPTIVE_THRESHOLDS and threshold_controller.maybe_update():
+        thresholds = threshold_controller.thresholds
+        rate = threshold_controller.model['rate']
+        print(f"  🎚️  New thresholds: Gold {thresholds['Gold']:,} | Elixir {thresholds['Elixir']:,} "
+              f"| Dark {thresholds['Dark Elixir']:,} (est. {rate:,.0f} loot/hour)")
+    return base_id
+
+
+async def find_base(rt):
+    """Search for a base that meets the controller's current loot thresholds
+
+    After Next, the next base is read as soon as the screen holds still, while the
+    settle time runs out. Such a read is reported and counted only once the screen
+    has settled with exactly the pixels it read; otherwise it is dropped unseen.
+    Each skipped base is logged in the background. Returns the base log id of the
+    base found.
+    """
     print("\n=== SEARCHING FOR GOOD BASE ===")
     search_count = 0
+    empty_reads = 0
+    rt.watch([search_region])
+    frame = await latest_frame(rt, rt.now())
+    # (thresholds, frame) of a base already read while its screen settled
+    early = None
     
     while True:
         search_count += 1
         print(f"\n--- Checking Base #{search_count} ---")
         
-        get_resource_value(resources_coord, found_resources)
+        if search_count % CALIBRATION_CHECK_EVERY == 1:
+            await rt.act(check_calibration)
+            if rt.watch([search_region]):
+                frame = await latest_frame(rt)
+                early = None
         
-        if checkif(gold_threshold, elixir_threshold, dark_threshold, found_resources):
+        base_start = clock()
+        if early is not None:
+            thresholds, result = early
+            frame = commit_base(result)
+            early = None
+        else:
+            thresholds = threshold_controller.thresholds
+            frame = await rt.ocr(evaluate_base, thresholds, frame)
+        metrics.count_base()
+        if soak_tracker is not None:
+            soak_tracker.tick()
+        
+        empty = not any(found_resources.values())
+        if empty:
+            # Nothing readable: more likely a popup, disconnect or slow load than a base
+            empty_reads += 1
+            anomaly('empty_read', f"base #{search_count}, {empty_reads} in a row")
+            if await rt.act(recover_screen):
+                rt.watch([search_region])
+                frame = await latest_frame(rt, rt.now())
+                continue
+            await rt.act(check_calibration)
+            rt.watch([search_region])
+            if empty_reads >= STALL_LIMIT:
+                raise StuckError(f"{empty_reads} bases in a row had no readable loot")
+        else:
+            empty_reads = 0
+        
+        if checkif(thresholds['Gold'], thresholds['Elixir'], thresholds['Dark Elixir'], found_resources):
+            # Short-circuiting skipped these; read them so the log sees the full base
+            unread = [(name, coord) for name, coord in resources_coord if name not in found_resources]
+            if unread and frame is not None:
+                await rt.ocr(get_resource_value, unread, found_resources, frame)
+                evaluator.read_later(len(unread))
             print(f"\n✓✓✓ GOOD BASE FOUND! ✓✓✓")
-            print(f"  Gold: {found_resources.get('Gold', 0):,}")
-            print(f"  Elixir: {found_resources.get('Elixir', 0):,}")
-            print(f"  Dark Elixir: {found_resources.get('Dark Elixir', 0):,}")
-            return True
+            for resource_name, _ in resources_coord:
+                print(f"  {resource_name}: {format_loot(found_resources.get(resource_name))}")
+            # Background jobs run in order, so this also waits for earlier bases' logs
+            return await rt.background(log_base, clock() - base_start, dict(found_resources))
         else:
             print("  ✗ Not enough loot, clicking Next...")
-            pyautogui.click(next_btn)
-            time.sleep(4)
-
-
-def check_loot_earned():
-    """Read loot from results screen"""
+            resources = dict(found_resources)
+            reads = []
+            
+            def read_early(still):
+                limits = threshold_controller.thresholds
+                reads.append((limits, asyncio.ensure_future(rt.ocr(read_base, limits, still))))
+            
+            settled, frame = await click_and_wait_async(rt, next_btn, search_region, frame,
+                                                        NEXT_BASE_TIMEOUT, 'next_base', on_still=read_early)
+            # An empty read is a popup or load screen, not a base worth learning from
+            if not empty:
+                rt.background(log_base, clock() - base_start, resources)
+            # Reads run one after another; only the last can be of the settled screen, and
+            # it is kept only if the settled frame shows exactly what it read
+            speculative = await asyncio.gather(*(task for _, task in reads))
+            if settled and reads and frame is not None and speculative[-1][0] is not None \
+                    and same_regions(speculative[-1][0], frame, resources_coord):
+                early = (reads[-1][0], speculative[-1])
+            if not settled:
+                await rt.act(recover_screen)
+                rt.watch([search_region])
+                frame = await latest_frame(rt, rt.now())
+
+
+def check_loot_earned(frame=None):
+    """Read loot from results screen (optionally from an already captured frame)
+
+    Returns (gold, elixir, dark), None for a counter that could not be read.
+    """
     print("\n=== CHECKING LOOT EARNED ===")
-    get_resource_value(extracted_res_coord, extracted_res)
+    get_resource_value(extracted_res_coord, extracted_res, frame)
     
-    gold = extracted_res.get('Gold', 0)
-    elixir = extracted_res.get('Elixir', 0)
-    dark = extracted_res.get('Dark Elixir', 0)
+    gold = extracted_res.get('Gold')
+    elixir = extracted_res.get('Elixir')
+    dark = extracted_res.get('Dark Elixir')
     
     print(f"💰 Earned:")
-    print(f"   Gold: {gold:,}")
-    print(f"   Elixir: {elixir:,}")
-    print(f"   Dark: {dark:,}")
+    print(f"   Gold: {format_loot(gold)}")
+    print(f"   Elixir: {format_loot(elixir)}")
+    print(f"   Dark: {format_loot(dark)}")
     
     return gold, elixir, dark
 
 
+# ========== TROOP DEPLOYMENT ==========
+
+# 'drag' sweeps each line like the old click+dragTo, 'taps' drops troops at points
+DEPLOY_PATTERN = 'drag'
+DEPLOY_DENSITY = 12          # Points per line
+DEPLOY_ROUNDS = 15           # Passes over all 4 lines
+DEPLOY_EVENT_INTERVAL = 0.004  # Seconds between input events
+
+deploy_schedule = build_schedule(
+    [deploy_line1, deploy_line2, deploy_line3, deploy_line4],
+    rounds=DEPLOY_ROUNDS,
+    pattern=DEPLOY_PATTERN,
+    density=DEPLOY_DENSITY,
+    interval=DEPLOY_EVENT_INTERVAL,
+)
+
+deploy_engine = DeployEngine(inputs, **timing)
+
+
+# ========== BATTLE MONITOR ==========
+
+BATTLE_SAMPLE_INTERVAL = 1.0   # Seconds between loot samples
+BATTLE_IDLE_WINDOW = 5.0       # End once loot has not dropped for this long
+BATTLE_MIN_TIME = 5.0          # Never end before troops reach the base
+BATTLE_MAX_TIME = 60.0         # Hard upper bound per attack
+
+
+def read_battle_loot():
+    """Remaining loot during a battle, read through the same fast capture/OCR path"""
+    with metrics.timer('battle_sample'):
+        frame = screen.grab([coord for _, coord in battle_coord])
+        flight_frame(frame, 'battle')
+        return read_values(battle_coord, frame)
+
+
+battle_monitor = BattleMonitor(
+    read_battle_loot,
+    interval=BATTLE_SAMPLE_INTERVAL,
+    idle_window=BATTLE_IDLE_WINDOW,
+    min_time=BATTLE_MIN_TIME,
+    max_time=BATTLE_MAX_TIME,
+    **timing,
+)
+
+
 def deploy_troops():
-    """Deploy troops using configured deployment zones"""
-    pyautogui.click(deploy_line1[0])
-    pyautogui.dragTo(deploy_line1[1], button='left')
+    """Deploy troops along the configured zones using the precomputed schedule"""
+    with metrics.timer('deploy'):
+        rate = deploy_engine.run(deploy_schedule)
+    print(f"  ✓ {len(deploy_schedule)} input events at {rate:.0f} events/sec")
+
+
+# ========== CALIBRATION ==========
+
+# Bases between cheap anchor alignment checks during search
+CALIBRATION_CHECK_EVERY = 25
+# Frames (different bases) used to tell digits from static icons when building anchors
+ANCHOR_BUILD_BASES = 5
+
+LAYOUT_BOXES = ('gold', 'elixir', 'dark_elixir', 'ext_gold', 'ext_elixir', 'ext_delixir',
+                'battle_gold', 'battle_elixir', 'battle_dark_elixir')
+LAYOUT_LINES = ('deploy_line1', 'deploy_line2', 'deploy_line3', 'deploy_line4')
+
+
+def current_layout():
+    """Every coordinate in use, keyed like cache.json"""
+    layout = {
+        'gold': gold_coord, 'elixir': elixir_coord, 'dark_elixir': dark_elixir_coord,
+        'ext_gold': ext_gold, 'ext_elixir': ext_elixir, 'ext_delixir': ext_delixir,
+        'select_troop_btn': select_troop_btn, 'end_battle_btn': end_battle_btn,
+        'confirm_end_btn': confirm_end_btn, 'return_lobby_btn': return_lobby_btn,
+        'attack_btn': attack_btn, 'find_match_btn': find_match_btn, 'next_btn': next_btn,
+        'deploy_line1': deploy_line1, 'deploy_line2': deploy_line2,
+        'deploy_line3': deploy_line3, 'deploy_line4': deploy_line4,
+    }
+    for (name, coord), key in zip(battle_coord, LAYOUT_BOXES[6:]):
+        layout[key] = coord
+    if dismiss_btn is not None:
+        layout['dismiss_btn'] = dismiss_btn
+    return layout
+
+
+def apply_layout(layout):
+    """Switch every coordinate (and what is derived from them) to a new layout"""
+    global gold_coord, elixir_coord, dark_elixir_coord, ext_gold, ext_elixir, ext_delixir
+    global select_troop_btn, end_battle_btn, confirm_end_btn, return_lobby_btn
+    global attack_btn, find_match_btn, next_btn, dismiss_btn
+    global deploy_line1, deploy_line2, deploy_line3, deploy_line4
+    global search_region, results_region, deploy_schedule
     
-    pyautogui.click(deploy_line2[0])
-    pyautogui.dragTo(deploy_line2[1], button='left')
+    gold_coord, elixir_coord, dark_elixir_coord = layout['gold'], layout['elixir'], layout['dark_elixir']
+    ext_gold, ext_elixir, ext_delixir = layout['ext_gold'], layout['ext_elixir'], layout['ext_delixir']
+    select_troop_btn = layout['select_troop_btn']
+    end_battle_btn = layout['end_battle_btn']
+    confirm_end_btn = layout['confirm_end_btn']
+    return_lobby_btn = layout['return_lobby_btn']
+    attack_btn = layout['attack_btn']
+    find_match_btn = layout['find_match_btn']
+    next_btn = layout['next_btn']
+    dismiss_btn = layout.get('dismiss_btn')
+    deploy_line1, deploy_line2, deploy_line3, deploy_line4 = (layout[k] for k in LAYOUT_LINES)
     
-    pyautogui.click(deploy_line3[0])
-    pyautogui.dragTo(deploy_line3[1], button='left')
+    resources_coord[:] = [("Gold", gold_coord), ("Elixir", elixir_coord), ("Dark Elixir", dark_elixir_coord)]
+    extracted_res_coord[:] = [("Gold", ext_gold), ("Elixir", ext_elixir), ("Dark Elixir", ext_delixir)]
+    battle_coord[:] = [(name, layout[key]) for (name, _), key in zip(battle_coord, LAYOUT_BOXES[6:])]
+    search_region = union_bbox(coord for _, coord in resources_coord)
+    results_region = union_bbox(coord for _, coord in extracted_res_coord)
+    deploy_schedule = build_schedule(
+        [deploy_line1, deploy_line2, deploy_line3, deploy_line4],
+        rounds=DEPLOY_ROUNDS,
+        pattern=DEPLOY_PATTERN,
+        density=DEPLOY_DENSITY,
+        interval=DEPLOY_EVENT_INTERVAL,
+    )
+
+
+def same_coord(a, b):
+    """Coordinates equal whether they came from JSON (lists) or code (tuples)"""
+    return json.dumps(a) == json.dumps(b)
+
+
+def stale_anchor_keys(layout, reference):
+    """Coordinates changed (e.g. by --setup) since the anchors were built"""
+    return [key for key, value in layout.items() if key in reference and not same_coord(value, reference[key])]
+
+
+def map_layout(layout, reference, calibration):
+    """The profile's coordinates moved onto the calibrated screen, with tight digit boxes
+
+    Tight boxes were learned around the reference coordinates of --build-anchors, so a
+    region changed since then keeps its own (mapped) box instead.
+    """
+    mapped = {}
+    for key, value in layout.items():
+        if key in LAYOUT_BOXES:
+            mapped[key] = map_box(value, calibration)
+        elif key in LAYOUT_LINES:
+            mapped[key] = [map_point(point, calibration) for point in value]
+        else:
+            mapped[key] = map_point(value, calibration)
+    for key, box in calibration['regions'].items():
+        if not same_coord(layout.get(key), reference.get(key)):
+            continue
+        mapped[key] = tuple(box)
+        # Battle counters default to the search-screen spots; keep them in step
+        battle_key = f'battle_{key}'
+        if same_coord(layout.get(battle_key), layout.get(key)):
+            mapped[battle_key] = tuple(box)
+    return mapped
+
+
+def save_calibration(resolution, found):
+    """Cache a calibration for this resolution in the coordinate profile"""
+    config = load_config(config_path) or {}
+    config.setdefault('calibration', {})[resolution] = found
+    save_config(config, config_path)
+
+
+# Built with --build-anchors and kept next to the profile; without them coordinates
+# stay exactly as configured
+anchor_path = f"{os.path.splitext(config_path)[0]}.anchors.npz"
+calibrator = Calibrator.load(anchor_path)
+calibration = None
+# The configured (loose) layout, which anchors are built from and calibrations map
+configured_layout = current_layout()
+
+if calibrator is not None:
+    stale = stale_anchor_keys(configured_layout, calibrator.meta['reference'])
+    if stale:
+        print(f"  ⚠ {', '.join(stale)} changed since --build-anchors; those keep their configured "
+              f"boxes until the anchors are rebuilt")
+
+if calibrator is not None and replay_session is None:
+    try:
+        screen_resolution = resolution_key(screen.grab().image.shape)
+    except Exception:
+        screen_resolution = None
+    calibration = ((cached or {}).get('calibration') or {}).get(screen_resolution)
+    if calibration:
+        apply_layout(map_layout(configured_layout, calibrator.meta['reference'], calibration))
+        print(f"📐 Using calibrated layout for {screen_resolution}")
+    else:
+        print(f"📐 No calibration for {screen_resolution} yet; localising on the first search screen")
+
+
+def check_calibration():
+    """Localise anchors on first use, and again only when the cheap alignment check drifts"""
+    global calibration, screen_resolution
+    if calibrator is None or replay_session is not None:
+        return
+    
+    if calibration is not None:
+        with metrics.timer('align_check'):
+            frame = screen.grab(calibrator.check_boxes(calibration))
+            aligned, shift, drop = calibrator.check(frame.image, calibration, frame.order, frame.origin)
+        if aligned:
+            return
+        print(f"  📐 Layout drifted ({shift}px, match -{drop:.2f}), re-localising...")
     
-    pyautogui.click(deploy_line4[0])
-    pyautogui.dragTo(deploy_line4[1], button='left')
+    frame = screen.grab()
+    with metrics.timer('calibrate'):
+        found = calibrator.calibrate(frame.image, frame.order)
+    if found is None:
+        print("  ⚠ Calibration anchors not found on screen, keeping the current layout")
+        return
+    calibration = found
+    screen_resolution = resolution_key(frame.image.shape)
+    apply_layout(map_layout(configured_layout, calibrator.meta['reference'], found))
+    save_calibration(screen_resolution, found)
+    print(f"  📐 Calibrated {screen_resolution}: scale {found['scale']:.3f}, "
+          f"offset ({found['offset'][0]:.0f}, {found['offset'][1]:.0f}), {len(found['anchors'])} anchors")
+
+
+def build_anchors_mode():
+    """Learn icon/button templates and tight digit boxes from a few search-screen bases"""
+    print("\n📐 BUILDING CALIBRATION ANCHORS")
+    print("=" * 60)
+    print("Open the search screen (viewing a base) with the configured coordinates.")
+    if "--no-prompt" not in sys.argv:
+        input("Press Enter when ready...")
+    
+    layout = configured_layout
+    frames = []
+    for i in range(ANCHOR_BUILD_BASES):
+        frame = screen.grab()
+        frames.append(to_grey_image(frame.image, frame.order))
+        if i < ANCHOR_BUILD_BASES - 1:
+            click_and_wait(layout['next_btn'], union_bbox([layout['gold'], layout['elixir'],
+                                                           layout['dark_elixir']]),
+                           NEXT_BASE_TIMEOUT, 'next_base')
+    
+    regions = {key: layout[key] for key in ('gold', 'elixir', 'dark_elixir')}
+    meta = build_anchors(frames, regions, {'next_btn': layout['next_btn']}, dict(layout), anchor_path)
+    for key, box in meta['tight'].items():
+        print(f"  {key}: {tuple(regions[key])} → {tuple(box)}")
+    print(f"  Anchors: {', '.join(meta['anchors'])}")
+    
+    # This screen is the reference, so its calibration is the identity
+    found = Calibrator.load(anchor_path).calibrate(frames[0], 'GREY') if meta['anchors'] else None
+    if found is not None:
+        save_calibration(resolution_key(frames[0].shape), found)
+    print("\n✓ Anchors saved! Tight regions are used on the next run.\n")
+
+
+def attack_base(attack_count, base_id, results, attack_bases):
+    """Attack the base on screen, queue its results screen and head to the next match
+
+    A blocking sequence of clicks and waits, run as one action on the runtime's actuator.
+    """
+    attack_start = clock()
+    print(f"\n⚔️  ATTACK #{attack_count} ⚔️")
+    
+    print("🎯 Selecting troop...")
+    click_and_wait(select_troop_btn, button_box(select_troop_btn),
+                   SELECT_TROOP_TIMEOUT, 'select_troop', settle=0.1, warn=False)
+    
+    print("🚀 Deploying troops...")
+    deploy_troops()
+    save_screen('battle')
+    
+    print("⏳ Attacking...")
+    with metrics.timer('wait.battle'):
+        reason, elapsed, _ = battle_monitor.run()
+    if reason == 'loot_stopped':
+        print(f"  ✓ Loot stopped dropping, ending after {elapsed:.1f}s")
+    else:
+        print(f"  ⏱️  Hard limit reached after {elapsed:.1f}s")
+    
+    print("🛑 Ending battle...")
+    click_and_wait(end_battle_btn, button_box(confirm_end_btn), CONFIRM_DIALOG_TIMEOUT,
+                   'confirm_dialog')
+    
+    print("🛑 Confirming...")
+    click_and_wait(confirm_end_btn, results_region, RESULTS_TIMEOUT, 'results', settle=0.5)
+    
+    # Reading anything but the results screen would add garbage to the totals
+    state = screen_state()
+    if state in (None, 'results'):
+        save_screen('results')
+        frame = grab_frame(extracted_res_coord)
+        if frame is not None:
+            # Stored before submitting, as the worker may finish first
+            attack_bases[results.submitted] = base_id
+            results.submit(frame)
+    else:
+        print(f"  ⚠ Expected the results screen but found {state}; loot not counted")
+    
+    print("\n🏠 Returning to lobby...")
+    click_and_wait(return_lobby_btn, button_box(attack_btn), LOBBY_TIMEOUT, 'lobby',
+                   settle=0.5)
+    save_screen('lobby')
+    
+    print("🔍 Opening attack menu...")
+    click_and_wait(attack_btn, button_box(find_match_btn), ATTACK_MENU_TIMEOUT, 'attack_menu')
+    save_screen('matchmaking')
+    
+    print("🔍 Finding next match...")
+    if click_and_wait(find_match_btn, search_region, MATCH_TIMEOUT, 'match', settle=0.5):
+        save_screen('scouting')
+    else:
+        recover_screen()
+    base_store.log_attack(base_id, clock() - attack_start)
+
+
+# ========== RUNTIME ==========
+
+# Seconds between background base log flushes and metrics snapshots
+BASE_FLUSH_INTERVAL = 5.0
+METRICS_INTERVAL = 10.0
+
+# Set by farm_loop, for the run stats
+runtime = None
 
 
 def farm_loop(target_gold=5000000, target_elixir=5000000, target_dark=50000):
-    """Main farming loop"""
+    """Main farming loop, run on the asyncio runtime
+
+    Replays and soak runs use the runtime inline on their virtual clock, so they stay
+    deterministic; live runs capture, read and click on separate threads.
+    """
+    global runtime
+    runtime = Runtime(screen, inputs, interval=waiter.poll, threaded=replay_session is None,
+                      profiles=profiles, **timing)
+    runtime.every(BASE_FLUSH_INTERVAL, base_store.flush)
+    if metrics_path:
+        runtime.every(METRICS_INTERVAL, append_snapshot, metrics, metrics_path)
+    try:
+        asyncio.run(runtime.run(farm(runtime, target_gold, target_elixir, target_dark)))
+    finally:
+        runtime.close()
+
+
+async def farm(rt, target_gold, target_elixir, target_dark):
+    """The search/attack cycle until every target is reached"""
     print("\n" + "=" * 60)
     print("🤖 FARMING BOT STARTED 🤖")
     print("=" * 60)
     
-    gold_threshold = 500000
-    elixir_threshold = 500000
-    dark_threshold = 50000
-    
-    total_gold = 0
-    total_elixir = 0
-    total_dark = 0
     attack_count = 0
+    # Base log id of each attack whose results are still being read, by sequence number
+    attack_bases = {}
     
-    while True:
-        if (total_gold >= target_gold and 
-            total_elixir >= target_elixir and 
-            total_dark >= target_dark):
-            print("\n✓ ALL GOALS REACHED!")
-            break
-        
-        found = find_base(gold_threshold, elixir_threshold, dark_threshold)
-        
-        if found:
-            attack_count += 1
-            print(f"\n⚔️  ATTACK #{attack_count} ⚔️")
-            
-            print("🎯 Selecting troop...")
-            pyautogui.click(select_troop_btn)
-            time.sleep(0.5)
-            
-            print("🚀 Deploying troops...")
-            for i in range(15):
-                deploy_troops()
-            
-            print("⏳ Attacking...")
-            time.sleep(15)
-            
-            print("🛑 Ending battle...")
-            pyautogui.click(end_battle_btn)
-            time.sleep(0.25)
-            
-            print("🛑 Confirming...")
-            pyautogui.click(confirm_end_btn)
-            time.sleep(4)
-            
-            earned_gold, earned_elixir, earned_dark = check_loot_earned()
-            total_gold += earned_gold
-            total_elixir += earned_elixir
-            total_dark += earned_dark
+    def print_progress(totals, heading):
+        total_gold, total_elixir, total_dark = totals
+        print(f"\n📊 {heading}:")
+        print(f"   Gold: {total_gold:,} / {target_gold:,}")
+        print(f"   Elixir: {total_elixir:,} / {target_elixir:,}")
+        print(f"   Dark: {total_dark:,} / {target_dark:,}")
+    
+    def on_result(seq, earned, totals):
+        metrics.count_attack(*(value or 0 for value in earned))
+        # Unread counters are logged as NULL so the yield fit skips this attack
+        base_store.log_result(attack_bases.pop(seq), *earned)
+        print_progress(totals, f"Total Progress (after attack #{seq + 1})")
+    
+    # Results screens are OCR'd in the background while we navigate to the next match
+    # (inline with the rest of the run on a virtual clock)
+    results = ResultsPipeline(check_loot_earned, on_result, threaded=rt.threaded, profiles=profiles)
+    
+    def goals_reached():
+        (total_gold, total_elixir, total_dark), _ = results.snapshot()
+        return (total_gold >= target_gold and 
+                total_elixir >= target_elixir and 
+                total_dark >= target_dark)
+    
+    try:
+        while True:
+            if goals_reached():
+                print("\n✓ ALL GOALS REACHED!")
+                break
             
-            print(f"\n📊 Total Progress:")
-            print(f"   Gold: {total_gold:,} / {target_gold:,}")
-            print(f"   Elixir: {total_elixir:,} / {target_elixir:,}")
-            print(f"   Dark: {total_dark:,} / {target_dark:,}")
+            base_id = await find_base(rt)
             
-            print("\n🏠 Returning to lobby...")
-            pyautogui.click(return_lobby_btn)
-            time.sleep(5)
+            # Results that landed during the search may already complete the goal
+            if goals_reached():
+                print("\n✓ ALL GOALS REACHED! (not attacking this base)")
+                break
             
-            print("🔍 Opening attack menu...")
-            pyautogui.click(attack_btn)
-            time.sleep(1)
+            attack_count += 1
+            rt.watch(None)
+            await rt.act(attack_base, attack_count, base_id, results, attack_bases)
+    except StuckError as e:
+        print(f"\n🛑 Stuck, stopping: {e}")
+        anomaly('stuck', str(e))
+    finally:
+        if not await rt.background(results.drain, RESULTS_DRAIN_TIMEOUT):
+            print("  ⚠ Some results were still being read when the bot stopped")
+        await rt.drain()
+        base_store.flush()
+        totals, _ = results.snapshot()
+        print_progress(totals, "Final Totals")
+
+
+# ========== BENCHMARKS ==========
+
+def print_run_stats():
+    """Summarise OCR cache, search and digit-reader counters for this run"""
+    cache_stats = ocr_cache.stats()
+    print(f"🗃️  OCR cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses, "
+          f"{cache_stats['evictions']} evictions ({cache_stats['hit_rate']:.0%} hit rate)")
+    print(f"🔢 Parsing: {read_stats['doubtful']} doubtful reads re-read, {read_stats['fixed']} fixed, "
+          f"{read_stats['unusable']} unusable")
+    
+    eval_stats = evaluator.summary()
+    print(f"⚡ Search: {eval_stats['reads']} resource reads, "
+          f"{eval_stats['saved']} region reads saved by short-circuiting")
+    
+    control = threshold_controller.summary()
+    thresholds = control['thresholds']
+    print(f"🎚️  Thresholds: Gold {thresholds['Gold']:,} | Elixir {thresholds['Elixir']:,} "
+          f"| Dark {thresholds['Dark Elixir']:,} ({control['updates']} updates, "
+          f"{base_store.logged} bases logged to {base_store.path})")
+    if 'loot_per_hour' in control:
+        print(f"   Search {control['search_s']:.1f}s/base | Attack {control['attack_s']:.0f}s "
+              f"| Est. {control['loot_per_hour']:,.0f} loot/hour")
+    
+    if screen_classifier is not None:
+        screen_stats = screen_classifier.stats()
+        recovery_stats = recovery.stats()
+        print(f"🧭 Screens: {screen_stats['calls']} classified ({screen_stats['mean_ms']:.2f} ms each), "
+              f"{recovery_stats['recoveries']} recoveries, "
+              f"{recovery_stats['time_lost_s']:.1f}s spent recovering")
+    
+    if runtime is not None:
+        run_stats = runtime.stats()
+        busy = ', '.join(f"{pool} {share:.0%}" for pool, share in run_stats['busy'].items())
+        print(f"⚙️  Runtime: {run_stats['frames']} frames grabbed ({run_stats['fps']:.1f}/s), "
+              f"{run_stats['used']} used, {run_stats['actions']} input actions | busy: {busy} "
+              f"| {run_stats['concurrency']:.2f}x concurrency")
+    
+    if flight is not None:
+        flight_stats = flight.stats()
+        bases = max(metrics.bases, 1)
+        per_base = flight_stats['time_s'] / bases
+        cycle = (time.monotonic() - metrics.started) / bases
+        fired = ', '.join(f"{kind} ×{n}" for kind, n in flight_stats['fired'].items()) or 'no anomalies'
+        print(f"🛩️  Flight recorder: {flight_stats['frames']} frames ({flight_stats['mean_ms']:.2f} ms each), "
+              f"{per_base * 1000:.2f} ms per base = {per_base / cycle if cycle else 0.0:.2%} of the "
+              f"{cycle * 1000:.0f} ms base cycle; {fired}, {flight_stats['dumps']} dumps")
+    
+    if digit_reader is not None:
+        digit_stats = digit_reader.stats()
+        print(f"🔤 Digit reader: {digit_stats['fast']} fast reads, "
+              f"{digit_stats['fallbacks']} EasyOCR fallbacks "
+              f"({digit_stats['fallback_rate']:.0%})")
+
+
+def read_crop_value(crop):
+    """Value the bot would act on from a standalone BGR crop (0 when unreadable)"""
+    h, w = crop.shape[:2]
+    value = read_values([("Sample", (0, 0, w, h))], Frame(crop, order='BGR'))["Sample"]
+    return 0 if value is None else value
+
+
+def last_fragment_value(crop):
+    """Value the bot read before confidence-aware parsing: the last fragment, or 0"""
+    h, w = crop.shape[:2]
+    coord = (0, 0, w, h)
+    frame = Frame(crop, order='BGR')
+    grey = preprocess("Sample", coord, frame)
+    if digit_reader is not None:
+        value, confidence = digit_reader.read(grey)
+        if value is not None and confidence >= DIGIT_MIN_CONFIDENCE:
+            return value
+    with ocr_lock:
+        results = recognize_lines([grey])[0]
+    if not results or min(r[1] for r in results) < OCR_MIN_CONFIDENCE:
+        results = extract_text_from_region(coord, "Sample", frame)
+    return (parse_number(results[-1][0]) or 0) if results else 0
+
+
+def misread_ratios(misreads):
+    """Read/true ratio of each misread (0 for an unreadable counter)"""
+    return [value / label for label, value in misreads if label]
+
+
+def accuracy_benchmark(label_dir):
+    """Misread rate of last-fragment vs. confidence-aware parsing over labelled crops
+    ('<value>_*.png'), and the loot/hour the difference is worth on the base log
+    """
+    print(f"\n🎯 Parse accuracy on {label_dir}")
+    # Crops carry no resource name; any loot counter's range applies
+    VALUE_RANGES.setdefault("Sample", (0, max(high for _, high in VALUE_RANGES.values())))
+    legacy = accuracy_report(last_fragment_value, label_dir)
+    doubtful = read_stats['doubtful']
+    report = accuracy_report(read_crop_value, label_dir)
+    samples = report['samples']
+    
+    for name, result in (('last fragment', legacy), ('confidence-aware', report)):
+        latency = result['latency_ms']
+        unreadable = sum(value == 0 for label, value in result['misreads'] if label)
+        print(f"  {name:<16} misread {1 - result['accuracy']:.1%} "
+              f"({len(result['misreads']) - unreadable} wrong, {unreadable} unreadable of {samples}) "
+              f"| p50 {latency[50]:.1f} ms, p90 {latency[90]:.1f} ms, p99 {latency[99]:.1f} ms")
+    print(f"  Re-read {read_stats['doubtful'] - doubtful} doubtful crops "
+          f"({(read_stats['doubtful'] - doubtful) / samples if samples else 0.0:.0%})")
+    for label, value in report['misreads'][:10]:
+        print(f"  ✗ expected {label:,}, read {value:,}")
+    
+    model = threshold_controller.fit(base_store.recent(threshold_controller.window))
+    if not len(model['values']) or np.isnan(model['search_s']):
+        print(f"  Loot/hour: no searched bases in {base_store.path} to estimate from")
+        return
+    thresholds = threshold_controller.thresholds
+    before = threshold_controller.misread_rate(model, thresholds, 1 - legacy['accuracy'],
+                                               misread_ratios(legacy['misreads']))
+    after = threshold_controller.misread_rate(model, thresholds, 1 - report['accuracy'],
+                                              misread_ratios(report['misreads']))
+    print(f"  Est. loot/hour over {len(model['values']):,} logged bases: {before:,.0f} -> {after:,.0f} "
+          f"({after - before:+,.0f} recovered)")
+
+
+def preprocess_benchmark(label_dir):
+    """Accuracy and latency of the old convert path vs. single-pass preprocessing"""
+    samples = load_labelled_crops(label_dir)
+    reader = get_reader()
+    single_pass = RegionPreprocessor(**PREPROCESS_DEFAULTS)
+    paths = {
+        # What the bot used to do: RGB capture -> BGR copy -> grey, resized inside EasyOCR
+        'current': lambda crop: to_grey(image_to_cv2(crop[:, :, ::-1], 'RGB')),
+        'single-pass': lambda crop: single_pass(crop, 'BGR'),
+    }
+    
+    print(f"\n🧪 Preprocessing benchmark on {len(samples)} crops from {label_dir}")
+    for name, prepare in paths.items():
+        prep_times = []
+        total_times = []
+        correct = 0
+        for label, crop in samples:
+            start = time.perf_counter()
+            grey = prepare(crop)
+            prepared = time.perf_counter()
+            results = recognize_batch(reader, [grey])[0]
+            done = time.perf_counter()
             
-            print("🔍 Finding next match...")
-            pyautogui.click(find_match_btn)
-            time.sleep(5)
+            prep_times.append(prepared - start)
+            total_times.append(done - start)
+            if results and parse_number(results[-1][0]) == label:
+                correct += 1
+        
+        prep = percentiles(prep_times)
+        total = percentiles(total_times)
+        accuracy = correct / len(samples) if samples else 0.0
+        print(f"  {name:<12} accuracy {accuracy:.1%} | preprocess p50 {prep[50] * 1000:.3f} ms "
+              f"| total p50 {total[50] * 1000:.1f} ms, p90 {total[90] * 1000:.1f} ms")
+
+
+def backend_benchmark(label_dir, batch_size=3):
+    """Latency, accuracy and parity with stock EasyOCR for each recognition backend"""
+    samples = load_labelled_crops(label_dir)
+    reader = get_reader()
+    single_pass = RegionPreprocessor(**PREPROCESS_DEFAULTS)
+    greys = [single_pass(crop, 'BGR').copy() for _, crop in samples]
+    backends = {'torch': lambda crops: recognize_batch(reader, crops)}
+    for name in BACKENDS[1:]:
+        try:
+            backends[name] = ensure_model(name, get_reader, ONNX_THREADS).recognize
+        except Exception as e:
+            print(f"  ⚠ {name} backend unavailable: {e}")
+    
+    print(f"\n🧪 OCR backend benchmark on {len(samples)} crops from {label_dir} "
+          f"({ONNX_THREADS} ONNX threads)")
+    stock = None
+    for name, recognize in backends.items():
+        recognize(greys[:1])
+        times = []
+        results = []
+        for grey in greys:
+            start = time.perf_counter()
+            results.append(recognize([grey])[0])
+            times.append(time.perf_counter() - start)
+        
+        # A search read recognises a few regions at once
+        batch_times = []
+        for i in range(0, len(greys), batch_size):
+            start = time.perf_counter()
+            recognize(greys[i:i + batch_size])
+            batch_times.append(time.perf_counter() - start)
+        
+        texts = [r[-1][0] if r else '' for r in results]
+        confs = [r[-1][1] if r else 0.0 for r in results]
+        correct = sum(parse_number(text) == label for text, (label, _) in zip(texts, samples))
+        single = percentiles(times)
+        batched = percentiles(batch_times)
+        line = (f"  {name:<6} accuracy {correct / len(samples) if samples else 0.0:.1%} "
+                f"| single p50 {single[50] * 1000:.1f} ms, p90 {single[90] * 1000:.1f} ms "
+                f"| batch of {batch_size} p50 {batched[50] * 1000:.1f} ms")
+        if stock is None:
+            stock = (texts, confs)
+        else:
+            same = sum(a == b for a, b in zip(texts, stock[0]))
+            drift = max((abs(a - b) for a, b in zip(confs, stock[1])), default=0.0)
+            line += f"\n         parity with torch: {same}/{len(texts)} same text, max confidence diff {drift:.3f}"
+        print(line)
+
+
+def replay_benchmark():
+    """Run the bot against a recorded session and report throughput"""
+    print(f"\n🎞️  REPLAYING {replay_path}")
+    get_reader()
+    
+    start = time.perf_counter()
+    try:
+        farm_loop(
+            target_gold=14000000,
+            target_elixir=14000000,
+            target_dark=500
+        )
+    except ReplayFinished:
+        pass
+    elapsed = time.perf_counter() - start
+    
+    bases = metrics.bases
+    ocr_stage = metrics.stages.get('ocr')
+    ocr_samples = list(ocr_stage.samples) if ocr_stage else []
+    latency = {p: v * 1000 for p, v in percentiles(ocr_samples).items()}
+    print("\n" + "=" * 60)
+    print("📈 REPLAY BENCHMARK")
+    print("=" * 60)
+    print(f"  Bases evaluated: {bases} in {elapsed:.2f}s "
+          f"({bases / elapsed if elapsed else 0:.1f} bases/sec)")
+    print(f"  OCR latency: p50 {latency[50]:.1f} ms | p90 {latency[90]:.1f} ms "
+          f"| p99 {latency[99]:.1f} ms")
+    print(f"  Capture: {screen.stats()['mean_ms']:.2f} ms mean per frame")
+    print(f"  Input events replayed: {replay_session.events_done}/{len(replay_session.events)} "
+          f"({replay_session.mismatches} differed from the recording)")
+    print(f"  Game time skipped by virtual waits: {replay_session.clock.now():.1f}s")
+    print_run_stats()
+
+
+def soak_mode():
+    """Run the bot for SOAK_BASES bases under memory tracking; True if growth stayed in budget"""
+    global soak_tracker
+    source = replay_path or "synthetic bases"
+    traced_budget = float(get_flag_value("--soak-traced-mb", TRACED_BUDGET_MB))
+    rss_budget = float(get_flag_value("--soak-rss-mb", RSS_BUDGET_MB))
+    print(f"\n🧪 SOAK TEST: {SOAK_BASES:,} bases on {source} "
+          f"(budget {traced_budget:g} MB traced, {rss_budget:g} MB RSS)")
+    get_reader()
+    
+    soak_tracker = MemoryTracker(SOAK_BASES, interval=int(get_flag_value("--soak-interval", 100)),
+                                 traced_budget_mb=traced_budget, rss_budget_mb=rss_budget)
+    soak_tracker.start()
+    start = time.perf_counter()
+    try:
+        farm_loop(
+            target_gold=float('inf'),
+            target_elixir=float('inf'),
+            target_dark=float('inf')
+        )
+    except SoakFinished:
+        pass
+    finally:
+        base_store.close()
+        shutil.rmtree(soak_dir, ignore_errors=True)
+    elapsed = time.perf_counter() - start
+    
+    try:
+        report = soak_tracker.report()
+    except ValueError as e:
+        print(f"\n❌ {e}")
+        return False
+    mb = 1e6
+    print("\n" + "=" * 60)
+    print("🧪 SOAK REPORT")
+    print("=" * 60)
+    print(f"  Bases: {report['iterations']:,} in {elapsed:.1f}s "
+          f"(first {report['warmup']:,} were warm-up)")
+    print(f"  Traced: {report['traced_now'] / mb:.1f} MB, {report['traced_growth'] / mb:+.2f} MB since warm-up "
+          f"({report['traced_per_1000'] / mb:+.3f} MB per 1000 bases)")
+    print(f"  RSS:    {report['rss_now'] / mb:.1f} MB, {report['rss_growth'] / mb:+.2f} MB since warm-up "
+          f"({report['rss_per_1000'] / mb:+.3f} MB per 1000 bases)")
+    print(f"  Peak transient allocation per base: {report['transient_p50'] / 1e3:.0f} KB median, "
+          f"{report['transient_max'] / 1e3:.0f} KB worst")
+    if report['sites']:
+        print("  Largest growth since warm-up:")
+        for site in report['sites']:
+            print(f"    {site['growth'] / 1e3:+9.1f} KB {site['blocks']:+6d} blocks  {site['site']}")
+    print_run_stats()
+    print(f"\n{'✅ Within' if report['ok'] else '❌ Over'} the memory budget")
+    return report['ok']
 
 
 # ========== MAIN EXECUTION ==========
 
 if __name__ == "__main__":
+    label_dir = get_flag_value("--labels")
+    
+    if SOAK_BASES:
+        sys.exit(0 if soak_mode() else 1)
+    
+    if replay_path:
+        replay_benchmark()
+        if label_dir:
+            accuracy_benchmark(label_dir)
+        sys.exit(0)
+    
+    if label_dir:
+        get_reader()
+        accuracy_benchmark(label_dir)
+        sys.exit(0)
+    
+    if "--benchmark-preprocess" in sys.argv:
+        preprocess_benchmark(get_flag_value("--benchmark-preprocess", "crops"))
+        sys.exit(0)
+    
+    if "--build-anchors" in sys.argv:
+        build_anchors_mode()
+        sys.exit(0)
+    
+    if "--benchmark-ocr-backend" in sys.argv:
+        backend_benchmark(get_flag_value("--benchmark-ocr-backend", "crops"))
+        sys.exit(0)
+    
     clear_console()
     print("\n🎮 CLASH OF CLANS BOT 🎮")
     print("=" * 60)
     print("💡 Tip: Run 'python main.py --setup' to configure coordinates\n")
     
-    input('Press Enter to start farming...')
+    if "--no-prompt" not in sys.argv:
+        input('Press Enter to start farming...')
+    
+    if not reader_loader.is_ready():
+        print("⏳ Waiting for EasyOCR reader to finish loading...")
+    get_reader()
     clear_console()
+    print_reader_timings()
     
     starting_time = time.time()
 
-    farm_loop(
-        target_gold=14000000,
-        target_elixir=14000000,
-        target_dark=500
-    )
+    try:
+        farm_loop(
+            target_gold=14000000,
+            target_elixir=14000000,
+            target_dark=500
+        )
+    finally:
+        if recorder is not None:
+            recorder.close()
+            print(f"\n🎞️  Session recorded to {record_path}")
     ending_time = time.time()
     time_taken = ending_time-starting_time
     print(time_taken/60,'Minutes')
     
+    print_run_stats()
+    
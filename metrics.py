@@ -0,0 +1,265 @@
+import cProfile
+import json
+import pstats
+import signal
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+
+QUANTILES = (0.5, 0.9, 0.99)
+RESOURCES = ('gold', 'elixir', 'dark')
+
+
+# ========== HISTOGRAMS ==========
+
+class RollingHistogram:
+    """Last N samples of a stage (for quantiles) plus lifetime count and sum
+
+    Samples go into a preallocated ring, so observing never allocates.
+    """
+
+    def __init__(self, window=1000):
+        self.ring = np.zeros(window)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value):
+        self.ring[self.count % len(self.ring)] = value
+        self.count += 1
+        self.total += value
+
+    @property
+    def samples(self):
+        """The samples in the window (unordered once the ring has wrapped)"""
+        return self.ring[:min(self.count, len(self.ring))]
+
+    def quantiles(self, points=QUANTILES):
+        if not self.count:
+            return {q: 0.0 for q in points}
+        ordered = np.sort(self.samples)
+        return {q: float(ordered[min(len(ordered) - 1, int(q * len(ordered)))]) for q in points}
+
+
+class Metrics:
+    """Per-stage timings and farming counters for the whole run"""
+
+    def __init__(self, window=1000, clock=time.monotonic):
+        self.window = window
+        self.clock = clock
+        self.started = clock()
+        self.stages = {}
+        self.bases = 0
+        self.attacks = 0
+        self.loot = {r: 0 for r in RESOURCES}
+        self.lock = threading.Lock()
+
+    def observe(self, stage, seconds):
+        with self.lock:
+            histogram = self.stages.get(stage)
+            if histogram is None:
+                histogram = self.stages[stage] = RollingHistogram(self.window)
+            histogram.observe(seconds)
+
+    @contextmanager
+    def timer(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def count_base(self):
+        with self.lock:
+            self.bases += 1
+
+    def count_attack(self, gold, elixir, dark):
+        with self.lock:
+            self.attacks += 1
+            self.loot['gold'] += gold
+            self.loot['elixir'] += elixir
+            self.loot['dark'] += dark
+
+    def rates(self):
+        """Bases/min, attacks/hour and loot/hour since the run started"""
+        elapsed = max(self.clock() - self.started, 1e-9)
+        return {
+            'bases_per_minute': self.bases / elapsed * 60,
+            'attacks_per_hour': self.attacks / elapsed * 3600,
+            'loot_per_hour': {r: v / elapsed * 3600 for r, v in self.loot.items()},
+        }
+
+    def snapshot(self):
+        """Plain-dict view of everything, for the JSONL stream"""
+        with self.lock:
+            stages = {
+                name: {
+                    'count': h.count,
+                    'sum': h.total,
+                    'quantiles': {str(q): v for q, v in h.quantiles().items()},
+                }
+                for name, h in self.stages.items()
+            }
+            counters = {'bases': self.bases, 'attacks': self.attacks, 'loot': dict(self.loot)}
+        return {'time': time.time(), 'stages': stages, 'counters': counters, 'rates': self.rates()}
+
+    def prometheus(self):
+        """Prometheus text exposition format"""
+        data = self.snapshot()
+        lines = ['# TYPE coc_stage_seconds summary']
+        for name, stage in sorted(data['stages'].items()):
+            for q, v in stage['quantiles'].items():
+                lines.append(f'coc_stage_seconds{{stage="{name}",quantile="{q}"}} {v:.6f}')
+            lines.append(f'coc_stage_seconds_sum{{stage="{name}"}} {stage["sum"]:.6f}')
+            lines.append(f'coc_stage_seconds_count{{stage="{name}"}} {stage["count"]}')
+
+        counters = data['counters']
+        rates = data['rates']
+        lines += [
+            '# TYPE coc_bases_total counter',
+            f'coc_bases_total {counters["bases"]}',
+            '# TYPE coc_attacks_total counter',
+            f'coc_attacks_total {counters["attacks"]}',
+            '# TYPE coc_loot_total counter',
+        ]
+        lines += [f'coc_loot_total{{resource="{r}"}} {v}' for r, v in counters['loot'].items()]
+        lines += [
+            '# TYPE coc_bases_per_minute gauge',
+            f'coc_bases_per_minute {rates["bases_per_minute"]:.3f}',
+            '# TYPE coc_attacks_per_hour gauge',
+            f'coc_attacks_per_hour {rates["attacks_per_hour"]:.3f}',
+            '# TYPE coc_loot_per_hour gauge',
+        ]
+        lines += [f'coc_loot_per_hour{{resource="{r}"}} {v:.1f}' for r, v in rates['loot_per_hour'].items()]
+        return '\n'.join(lines) + '\n'
+
+
+# ========== EXPORTERS ==========
+
+def append_snapshot(metrics, path):
+    """Append one metrics snapshot line to a JSONL file"""
+    with open(path, 'a') as f:
+        f.write(json.dumps(metrics.snapshot()) + '\n')
+
+
+def serve_prometheus(metrics, port=9100, host='127.0.0.1'):
+    """Serve metrics.prometheus() on http://host:port/metrics (daemon thread)"""
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path not in ('/', '/metrics'):
+                self.send_error(404)
+                return
+            body = metrics.prometheus().encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True).start()
+    return server
+
+
+# ========== ON-DEMAND PROFILING ==========
+
+class ThreadProfiles:
+    """cProfile snapshots of the main thread plus the worker threads that run jobs through job()
+
+    Before Python 3.12 a profiler only sees the thread that enabled it, so while a
+    snapshot is on each worker runs its jobs under a profiler of its own, and stop()
+    merges them. From 3.12 one profiler sees every thread and job() just runs the job.
+    """
+
+    per_thread = sys.version_info < (3, 12)
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.main = None
+        self.workers = []
+        self.generation = 0
+
+    @property
+    def active(self):
+        return self.main is not None
+
+    def start(self):
+        with self.lock:
+            self.generation += 1
+            self.workers = []
+            self.main = cProfile.Profile()
+            self.main.enable()
+
+    def job(self, fn):
+        """Run fn(), profiled on this thread while a snapshot is on"""
+        if not (self.per_thread and self.active):
+            return fn()
+        local = self.local
+        if getattr(local, 'generation', None) != self.generation:
+            with self.lock:
+                local.generation = self.generation
+                # Shared with stop(), which runs on another thread
+                local.entry = {'profiler': cProfile.Profile(), 'busy': False}
+                self.workers.append(local.entry)
+        entry = local.entry
+        entry['busy'] = True
+        entry['profiler'].enable()
+        try:
+            return fn()
+        finally:
+            entry['profiler'].disable()
+            entry['busy'] = False
+
+    def stop(self, path):
+        """End the snapshot and write every thread's profile, merged, to path
+
+        A job still running on a worker is left out rather than stopped mid-way.
+        """
+        with self.lock:
+            main, self.main = self.main, None
+            workers, self.workers = self.workers, []
+            self.generation += 1
+        main.disable()
+        stats = pstats.Stats(main)
+        threads = 1
+        for entry in workers:
+            if entry['busy']:
+                continue
+            try:
+                stats.add(entry['profiler'])
+                threads += 1
+            except TypeError:
+                # pstats refuses a profiler that recorded nothing
+                pass
+        stats.dump_stats(path)
+        return threads
+
+
+def install_profile_signal(profiles, prefix='profile'):
+    """First signal starts a ThreadProfiles snapshot, the next dumps it to <prefix>-<time>.prof
+
+    Uses SIGUSR1 (SIGBREAK on Windows). Returns the signal name, or None if unsupported.
+    """
+    signum = getattr(signal, 'SIGUSR1', None) or getattr(signal, 'SIGBREAK', None)
+    if signum is None:
+        return None
+
+    def handler(signum, frame):
+        if not profiles.active:
+            profiles.start()
+            print("\n🔬 Profiling started (send the signal again to dump)")
+        else:
+            path = f"{prefix}-{time.strftime('%Y%m%d-%H%M%S')}.prof"
+            threads = profiles.stop(path)
+            print(f"\n🔬 Profile of {threads} threads written to {path}")
+
+    signal.signal(signum, handler)
+    return signal.Signals(signum).name
@@ -0,0 +1,273 @@
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+import cv2
+import numpy as np
+
+
+OCR_ALLOWLIST = '0123456789,. '
+
+# Blank rows between stacked crops so boxes never touch
+CANVAS_GAP = 4
+
+# Loot counters group digits in threes: "1,234,567", "1 234 567" or just "1234567"
+GROUPED = re.compile(r'\d{1,3}(?:[,. ]\d{3})*|\d+')
+
+
+# ========== BATCHED RECOGNITION ==========
+
+def to_grey(crop):
+    """BGR (or already grey) crop to single-channel uint8"""
+    if crop.ndim == 2:
+        return crop
+    return cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY)
+
+
+def stack_crops(crops):
+    """Stack grey crops onto one canvas, returning it and a box per crop"""
+    width = max(c.shape[1] for c in crops)
+    height = sum(c.shape[0] for c in crops) + CANVAS_GAP * (len(crops) - 1)
+    canvas = np.zeros((height, width), dtype=np.uint8)
+
+    boxes = []
+    y = 0
+    for crop in crops:
+        h, w = crop.shape[:2]
+        canvas[y:y + h, :w] = crop
+        # EasyOCR horizontal_list format: [x_min, x_max, y_min, y_max]
+        boxes.append([0, w, y, y + h])
+        y += h + CANVAS_GAP
+    return canvas, boxes
+
+
+def recognize_batch(reader, crops, allowlist=OCR_ALLOWLIST):
+    """Run recognition only (no CRAFT detection) on all crops in one call
+
+    Each crop must hold a single line of text. Returns one
+    [(text, confidence)] list per crop, in the same order.
+
+    The saving is skipping detection. On CPU, EasyOCR's recognize still runs the boxes
+    one at a time and ignores batch_size; only a GPU reader batches them. The ONNX
+    backends (onnx_ocr) batch on CPU as well.
+    """
+    results = [[] for _ in crops]
+    index = [i for i, c in enumerate(crops) if c is not None and c.size]
+    if not index:
+        return results
+
+    canvas, boxes = stack_crops([to_grey(crops[i]) for i in index])
+    detections = reader.recognize(
+        canvas,
+        horizontal_list=boxes,
+        free_list=[],
+        allowlist=allowlist,
+        batch_size=len(boxes),
+        reformat=False,
+    )
+
+    # Map each detection back to its crop by vertical position; a recognizer that
+    # reports per-character confidences passes them on as a third element
+    tops = [box[2] for box in boxes]
+    for box, text, confidence, *chars in left_to_right(detections):
+        y_min = min(point[1] for point in box)
+        slot = max(k for k, top in enumerate(tops) if top <= y_min)
+        if text.strip():
+            results[index[slot]].append((text, confidence, *chars))
+    return results
+
+
+def left_to_right(detections):
+    """(box, text, confidence, ...) detections ordered by their left edge
+
+    Detections without a box keep their order.
+    """
+    if any(detection[0] is None for detection in detections):
+        return list(detections)
+    return sorted(detections, key=lambda detection: min(point[0] for point in detection[0]))
+
+
+# ========== NUMBER PARSING ==========
+
+def parse_number(text):
+    """Digits of an OCR fragment as an int, or None if it is not a number"""
+    cleaned = text.replace(',', '').replace(' ', '').replace('.', '')
+    return int(cleaned) if cleaned.isdigit() else None
+
+
+class Reading(namedtuple('Reading', 'value confidence text problem')):
+    """One region's parsed value
+
+    `confidence` is that of the least certain digit. `problem` is None for a trustworthy
+    read, otherwise why it is not: 'empty', 'format' (digits not grouped in threes),
+    'range' (implausible value) or 'confidence' (a doubtful digit).
+    """
+
+    __slots__ = ()
+
+    # Worst first; best_reading prefers the reading with the mildest problem
+    PROBLEMS = ('empty', 'range', 'format', 'confidence', None)
+
+    @property
+    def usable(self):
+        """A value to act on: trustworthy, or well-formed but read with low confidence"""
+        return self.problem in (None, 'confidence')
+
+
+def char_confidences(fragment):
+    """Per-character confidences of a (text, confidence[, per-character]) fragment
+
+    Recognizers that only score whole lines give every character the line's confidence.
+    """
+    text, confidence = fragment[0], fragment[1]
+    if len(fragment) > 2 and len(fragment[2]) == len(text):
+        return list(fragment[2])
+    return [confidence] * len(text)
+
+
+def parse_reading(fragments, value_range=None, min_confidence=0.0):
+    """Merge one region's fragments (ordered left to right) into a Reading
+
+    Fragments are joined, so a counter detected as "1,2" and "34,567" reads 1,234,567.
+    The joined text must group its digits in threes. Spaces are separators ("12 345")
+    or, in text already grouped with commas or dots, stray gaps ("1,2 34,567"); plain
+    digits split by a space ("12 34") are rejected. The value must lie within
+    value_range (low, high) when given.
+    """
+    raw = ''.join(fragment[0] for fragment in fragments)
+    confidences = [c for fragment in fragments for c in char_confidences(fragment)]
+    digits = [c for char, c in zip(raw, confidences) if char.isdigit()]
+    text = raw.strip()
+    if not digits:
+        return Reading(None, 0.0, text, 'empty')
+
+    value = int(''.join(char for char in text if char.isdigit()))
+    confidence = float(min(digits))
+    spaced = ' '.join(text.split())
+    separated = any(char in ',.' for char in spaced)
+    if not (GROUPED.fullmatch(spaced) or (separated and GROUPED.fullmatch(spaced.replace(' ', '')))):
+        problem = 'format'
+    elif value_range is not None and not value_range[0] <= value <= value_range[1]:
+        problem = 'range'
+    elif confidence < min_confidence:
+        problem = 'confidence'
+    else:
+        problem = None
+    return Reading(value, confidence, text, problem)
+
+
+def best_reading(readings):
+    """The reading with the mildest problem, most confident first among equals"""
+    return max(readings, key=lambda r: (Reading.PROBLEMS.index(r.problem), r.confidence))
+
+
+class OCRCache:
+    """Bounded LRU of Readings keyed by a hash of the crop pixels and the resource
+
+    The resource is part of the key because a Reading's range check depends on it.
+    """
+
+    def __init__(self, max_size=256):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def key(crop, resource_name=''):
+        digest = hashlib.blake2b(np.ascontiguousarray(crop).data, digest_size=16)
+        digest.update(str(crop.shape).encode())
+        digest.update(resource_name.encode())
+        return digest.digest()
+
+    def get(self, key):
+        """Cached Reading for key, or None on a miss"""
+        with self.lock:
+            reading = self.entries.get(key)
+            if reading is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+        return reading
+
+    def put(self, key, reading):
+        """Store the Reading a crop parsed to"""
+        with self.lock:
+            self.entries[key] = reading
+            self.entries.move_to_end(key)
+            if len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self.entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
+
+
+# ========== LAZY READER LOADING ==========
+
+class ReaderLoader:
+    """Imports EasyOCR and builds a warmed-up reader on a background thread"""
+
+    def __init__(self, languages=('en',), gpu=False):
+        self.languages = list(languages)
+        self.gpu = gpu
+        self.reader = None
+        self.error = None
+        self.timings = {}
+        self.ready = threading.Event()
+        self.thread = None
+
+    def start(self):
+        """Begin loading (no-op if already started)"""
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._load, name='easyocr-loader', daemon=True)
+            self.thread.start()
+        return self
+
+    def _load(self):
+        try:
+            start = time.perf_counter()
+            import easyocr
+            imported = time.perf_counter()
+
+            reader = easyocr.Reader(self.languages, gpu=self.gpu, verbose=False)
+            loaded = time.perf_counter()
+
+            # Warm-up: the first inference pays for lazy allocations
+            recognize_batch(reader, [np.zeros((32, 120), dtype=np.uint8)])
+            warmed = time.perf_counter()
+
+            self.timings = {
+                'import': imported - start,
+                'load': loaded - imported,
+                'first_inference': warmed - loaded,
+            }
+            self.reader = reader
+        except Exception as e:
+            self.error = e
+        finally:
+            self.ready.set()
+
+    def is_ready(self):
+        return self.ready.is_set()
+
+    def get(self, timeout=None):
+        """Block until the reader is loaded and return it"""
+        self.start()
+        if not self.ready.wait(timeout):
+            raise TimeoutError("EasyOCR reader is still loading")
+        if self.error is not None:
+            raise RuntimeError(f"EasyOCR failed to load: {self.error}")
+        return self.reader
@@ -0,0 +1,288 @@
+import json
+import os
+import queue
+import socket
+import socketserver
+import struct
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from ocr import OCR_ALLOWLIST, ReaderLoader, left_to_right, recognize_batch
+from onnx_ocr import ensure_model
+
+
+DEFAULT_SOCKET = '/tmp/coc-ocr.sock'
+
+
+# ========== WIRE PROTOCOL ==========
+# Each message: !II (header length, payload length), JSON header, raw payload.
+# Crops travel as grey uint8 bytes back to back; the header lists their shapes.
+
+def recv_exact(sock, size):
+    chunks = []
+    while size:
+        chunk = sock.recv(size)
+        if not chunk:
+            raise ConnectionError("OCR socket closed")
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b''.join(chunks)
+
+
+def send_message(sock, header, payload=b''):
+    data = json.dumps(header).encode()
+    sock.sendall(struct.pack('!II', len(data), len(payload)) + data + payload)
+
+
+def recv_message(sock):
+    header_size, payload_size = struct.unpack('!II', recv_exact(sock, 8))
+    header = json.loads(recv_exact(sock, header_size))
+    payload = recv_exact(sock, payload_size) if payload_size else b''
+    return header, payload
+
+
+def pack_crops(crops):
+    crops = [np.ascontiguousarray(c, dtype=np.uint8) for c in crops]
+    return [list(c.shape) for c in crops], b''.join(c.tobytes() for c in crops)
+
+
+def unpack_crops(shapes, payload):
+    crops = []
+    offset = 0
+    for h, w in shapes:
+        size = h * w
+        crops.append(np.frombuffer(payload, dtype=np.uint8, count=size, offset=offset).reshape(h, w))
+        offset += size
+    return crops
+
+
+# ========== SERVER ==========
+
+class Job:
+    def __init__(self, op, crops, allowlist):
+        self.op = op
+        self.crops = crops
+        self.allowlist = allowlist
+        self.results = None
+        self.error = None
+        self.done = threading.Event()
+
+
+class BatchingOCRServer:
+    """One OCR model shared by every bot instance; recognition requests are grouped together
+
+    A group is one recognize call. Only the ONNX backends and a GPU reader run it as
+    one batch; on CPU, EasyOCR recognises the crops one after another. Sharing the model
+    and pinning its threads is what the server saves there.
+    """
+
+    def __init__(self, reader, max_wait=0.005, max_batch=64, recognize=None):
+        self.reader = reader
+        # recognize(crops, allowlist); an ONNX recognizer can stand in for EasyOCR's
+        self.recognize = recognize or (lambda crops, allowlist: recognize_batch(reader, crops, allowlist))
+        self.max_wait = max_wait
+        self.max_batch = max_batch
+        self.jobs = queue.Queue()
+        self.requests = 0
+        self.batches = 0
+        self.batched_crops = 0
+        threading.Thread(target=self._run, name='ocr-inference', daemon=True).start()
+
+    def submit(self, op, crops, allowlist):
+        job = Job(op, crops, allowlist)
+        self.jobs.put(job)
+        job.done.wait()
+        if job.error is not None:
+            raise job.error
+        return job.results
+
+    def _collect(self):
+        """First waiting job plus whatever else arrives within max_wait"""
+        jobs = [self.jobs.get()]
+        crops = len(jobs[0].crops)
+        deadline = time.perf_counter() + self.max_wait
+        while crops < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                job = self.jobs.get(timeout=remaining)
+            except queue.Empty:
+                break
+            jobs.append(job)
+            crops += len(job.crops)
+        return jobs
+
+    def _run(self):
+        while True:
+            jobs = self._collect()
+            self.requests += len(jobs)
+
+            # readtext (full detection) is the rare fallback; run it on its own
+            for job in [j for j in jobs if j.op == 'readtext']:
+                self._finish([job], lambda: [[
+                    (text, float(conf))
+                    for _, text, conf in left_to_right(
+                        self.reader.readtext(job.crops[0], allowlist=job.allowlist))
+                ]])
+
+            groups = {}
+            for job in jobs:
+                if job.op == 'recognize':
+                    groups.setdefault(job.allowlist, []).append(job)
+            for allowlist, group in groups.items():
+                crops = [c for job in group for c in job.crops]
+                self.batches += 1
+                self.batched_crops += len(crops)
+                self._finish(group, lambda: self.recognize(crops, allowlist))
+
+    def _finish(self, jobs, work):
+        try:
+            results = work()
+            for job in jobs:
+                job.results, results = results[:len(job.crops)], results[len(job.crops):]
+        except Exception as e:
+            for job in jobs:
+                job.error = e
+        for job in jobs:
+            job.done.set()
+
+    def stats(self):
+        return {
+            'requests': self.requests,
+            'batches': self.batches,
+            'mean_batch': self.batched_crops / self.batches if self.batches else 0.0,
+        }
+
+
+def serve(socket_path=DEFAULT_SOCKET, threads=2, backend='torch'):
+    """Load EasyOCR once with pinned thread counts and serve it over a Unix socket"""
+    # Must be set before torch is imported by the loader
+    for var in ('OMP_NUM_THREADS', 'MKL_NUM_THREADS'):
+        os.environ[var] = str(threads)
+
+    print(f"🧠 Loading shared EasyOCR model ({threads} threads)...")
+    loader = ReaderLoader(['en'], gpu=False)
+    reader = loader.get()
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except Exception:
+        pass
+    print(f"✓ Model ready in {sum(loader.timings.values()):.2f}s")
+
+    recognize = None
+    if backend != 'torch':
+        recognize = ensure_model(backend, lambda: reader, threads).recognize
+        print(f"✓ Recognition runs on ONNX Runtime ({backend})")
+    ocr = BatchingOCRServer(reader, recognize=recognize)
+
+    class Handler(socketserver.BaseRequestHandler):
+        def handle(self):
+            while True:
+                try:
+                    header, payload = recv_message(self.request)
+                except ConnectionError:
+                    return
+                try:
+                    if header['op'] == 'stats':
+                        send_message(self.request, {'stats': ocr.stats()})
+                        continue
+                    crops = unpack_crops(header['shapes'], payload)
+                    results = ocr.submit(header['op'], crops, header.get('allowlist'))
+                    send_message(self.request, {'results': results})
+                except Exception as e:
+                    send_message(self.request, {'error': str(e)})
+
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    server = socketserver.ThreadingUnixStreamServer(socket_path, Handler)
+    server.daemon_threads = True
+    print(f"✓ OCR server listening on {socket_path}\n")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        os.unlink(socket_path)
+        stats = ocr.stats()
+        print(f"\n🧠 Served {stats['requests']} requests in {stats['batches']} batches "
+              f"(mean {stats['mean_batch']:.1f} crops/batch)")
+
+
+# ========== CLIENT ==========
+
+class RemoteReader:
+    """Drop-in for the parts of easyocr.Reader the bot uses, backed by the OCR server"""
+
+    def __init__(self, socket_path=DEFAULT_SOCKET):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(socket_path)
+        self.lock = threading.Lock()
+
+    def _call(self, header, crops):
+        shapes, payload = pack_crops(crops)
+        header = dict(header, shapes=shapes)
+        with self.lock:
+            send_message(self.sock, header, payload)
+            reply, _ = recv_message(self.sock)
+        if 'error' in reply:
+            raise RuntimeError(f"OCR server: {reply['error']}")
+        return reply['results']
+
+    def recognize(self, img, horizontal_list=None, free_list=None, allowlist=None, **kwargs):
+        """Recognition only, one result per [x_min, x_max, y_min, y_max] box"""
+        boxes = horizontal_list or [[0, img.shape[1], 0, img.shape[0]]]
+        crops = [img[y1:y2, x1:x2] for x1, x2, y1, y2 in boxes]
+        results = self._call({'op': 'recognize', 'allowlist': allowlist}, crops)
+
+        detections = []
+        for (x1, x2, y1, y2), crop_results in zip(boxes, results):
+            for text, confidence, *chars in crop_results:
+                detections.append(([[x1, y1], [x2, y1], [x2, y2], [x1, y2]], text, confidence, *chars))
+        return detections
+
+    def readtext(self, img, allowlist=None, **kwargs):
+        """Full detection + recognition on one image"""
+        grey = img if img.ndim == 2 else cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        results = self._call({'op': 'readtext', 'allowlist': allowlist}, [grey])[0]
+        return [(None, text, confidence) for text, confidence in results]
+
+    def close(self):
+        self.sock.close()
+
+
+class RemoteReaderLoader(ReaderLoader):
+    """ReaderLoader that connects to a running OCR server instead of loading a model"""
+
+    def __init__(self, socket_path=DEFAULT_SOCKET, timeout=120.0):
+        super().__init__()
+        self.socket_path = socket_path
+        self.timeout = timeout
+
+    def _load(self):
+        try:
+            start = time.perf_counter()
+            while True:
+                try:
+                    reader = RemoteReader(self.socket_path)
+                    break
+                except (FileNotFoundError, ConnectionRefusedError):
+                    if time.perf_counter() - start > self.timeout:
+                        raise
+                    time.sleep(0.5)
+            connected = time.perf_counter()
+
+            recognize_batch(reader, [np.zeros((32, 120), dtype=np.uint8)], OCR_ALLOWLIST)
+            warmed = time.perf_counter()
+
+            self.timings = {'import': 0.0, 'load': connected - start, 'first_inference': warmed - connected}
+            self.reader = reader
+        except Exception as e:
+            self.error = e
+        finally:
+            self.ready.set()
@@ -0,0 +1,181 @@
+import json
+import os
+
+import cv2
+import numpy as np
+
+from ocr import OCR_ALLOWLIST, to_grey
+from preprocess import RECOGNIZER_HEIGHT
+
+
+# Exported once from the EasyOCR reader, then loaded without torch on later runs
+ONNX_FILE = 'ocr_recognizer.onnx'
+INT8_FILE = 'ocr_recognizer.int8.onnx'
+META_FILE = 'ocr_recognizer.json'
+
+BACKENDS = ('torch', 'onnx', 'int8')
+
+# Widths are padded up to a multiple of this so batches reuse a few input shapes
+WIDTH_STEP = 32
+
+
+# ========== EXPORT ==========
+
+def export_recognizer(reader, path=ONNX_FILE, meta_path=META_FILE, height=RECOGNIZER_HEIGHT):
+    """Write EasyOCR's recognition network to ONNX (dynamic batch and width) plus its charset"""
+    import torch
+
+    model = reader.recognizer
+    model = getattr(model, 'module', model)
+    model.eval()
+
+    class Recognizer(torch.nn.Module):
+        # The CTC model ignores its `text` argument; drop it from the exported graph
+        def __init__(self, inner):
+            super().__init__()
+            self.inner = inner
+
+        def forward(self, image):
+            return self.inner(image, None)
+
+    dummy = torch.zeros(1, 1, height, 256)
+    with torch.no_grad():
+        torch.onnx.export(
+            Recognizer(model), (dummy,), path,
+            input_names=['image'],
+            output_names=['logits'],
+            dynamic_axes={'image': {0: 'batch', 3: 'width'}, 'logits': {0: 'batch', 1: 'steps'}},
+            opset_version=17,
+        )
+
+    with open(meta_path, 'w') as f:
+        json.dump({'characters': list(reader.converter.character), 'height': height}, f)
+
+
+def quantize_recognizer(path=ONNX_FILE, int8_path=INT8_FILE):
+    """Dynamic int8 quantisation of the exported weights (activations stay float)"""
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    quantize_dynamic(path, int8_path, weight_type=QuantType.QInt8)
+
+
+def ensure_model(backend, get_reader, threads=2):
+    """Export/quantise on first use, then return an OnnxRecognizer for 'onnx' or 'int8'"""
+    if not os.path.exists(ONNX_FILE) or not os.path.exists(META_FILE):
+        print("🧪 Exporting the EasyOCR recognizer to ONNX (first run only)...")
+        export_recognizer(get_reader())
+    path = ONNX_FILE
+    if backend == 'int8':
+        if not os.path.exists(INT8_FILE):
+            print("🧪 Quantising the recognizer to int8 (first run only)...")
+            quantize_recognizer()
+        path = INT8_FILE
+    return OnnxRecognizer.load(path, threads=threads)
+
+
+# ========== INFERENCE ==========
+
+def custom_mean(probs):
+    """EasyOCR's line confidence: product of per-character maxima, softened by length"""
+    return float(np.prod(probs) ** (2.0 / np.sqrt(len(probs))))
+
+
+class OnnxRecognizer:
+    """EasyOCR's recognizer on ONNX Runtime, reading single-line grey crops directly
+
+    No canvas and no detection: crops are batched as one padded tensor. Preprocessing
+    and CTC decoding mirror EasyOCR's, so results have the same (text, confidence) form,
+    plus the per-character probabilities EasyOCR folds into that confidence.
+    """
+
+    def __init__(self, session, characters, height=RECOGNIZER_HEIGHT):
+        self.session = session
+        self.input = session.get_inputs()[0].name
+        self.characters = characters
+        self.height = height
+        self.ignore = {}
+        # Input tensors by (batch, width); WIDTH_STEP keeps these few
+        self.batches = {}
+
+    @classmethod
+    def load(cls, path=ONNX_FILE, meta_path=META_FILE, threads=2):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = threads
+        options.inter_op_num_threads = 1
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        session = ort.InferenceSession(path, options, providers=['CPUExecutionProvider'])
+        with open(meta_path) as f:
+            meta = json.load(f)
+        return cls(session, meta['characters'], meta['height'])
+
+    def ignored(self, allowlist):
+        """Character indices outside the allowlist (blank at 0 is always kept)"""
+        if allowlist not in self.ignore:
+            allowed = set(allowlist or ''.join(self.characters[1:]))
+            self.ignore[allowlist] = np.array(
+                [i for i, c in enumerate(self.characters) if i and c not in allowed], dtype=np.intp)
+        return self.ignore[allowlist]
+
+    def prepare(self, crops):
+        """Grey crops to one (n, 1, height, width) tensor in [-1, 1], right-padded by edge repeat
+
+        The tensor is reused by the next call with the same shape.
+        """
+        lines = []
+        for crop in crops:
+            h, w = crop.shape[:2]
+            if h != self.height:
+                w = max(1, round(w * self.height / h))
+                crop = cv2.resize(crop, (w, self.height), interpolation=cv2.INTER_CUBIC)
+            lines.append(crop)
+        width = -(-max(line.shape[1] for line in lines) // WIDTH_STEP) * WIDTH_STEP
+
+        shape = (len(lines), 1, self.height, width)
+        batch = self.batches.get(shape)
+        if batch is None:
+            batch = self.batches[shape] = np.empty(shape, dtype=np.float32)
+        for i, line in enumerate(lines):
+            w = line.shape[1]
+            batch[i, 0, :, :w] = line
+            batch[i, 0, :, w:] = line[:, -1:]
+        batch *= 2.0 / 255.0
+        batch -= 1.0
+        return batch
+
+    def decode(self, logits, allowlist):
+        """Greedy CTC decode with EasyOCR's allowlist masking and confidence
+
+        Unlike EasyOCR, each result also carries its per-character probabilities.
+        """
+        logits = logits - logits.max(axis=2, keepdims=True)
+        probs = np.exp(logits)
+        probs[:, :, self.ignored(allowlist)] = 0.0
+        probs /= probs.sum(axis=2, keepdims=True)
+
+        best = probs.argmax(axis=2)
+        best_prob = probs.max(axis=2)
+        results = []
+        for index, prob in zip(best, best_prob):
+            keep = index != 0
+            keep[1:] &= index[1:] != index[:-1]
+            text = ''.join(self.characters[i] for i in index[keep])
+            char_probs = prob[index != 0]
+            confidence = custom_mean(char_probs) if len(char_probs) else 0.0
+            # One probability per decoded character, for ocr.parse_reading
+            chars = [float(p) for p in prob[keep]]
+            results.append([(text, confidence, chars)] if text.strip() else [])
+        return results
+
+    def recognize(self, crops, allowlist=OCR_ALLOWLIST):
+        """Same contract as ocr.recognize_batch: one [(text, confidence, chars)] list per crop"""
+        results = [[] for _ in crops]
+        index = [i for i, c in enumerate(crops) if c is not None and c.size]
+        if not index:
+            return results
+        batch = self.prepare([to_grey(crops[i]) for i in index])
+        logits = self.session.run(None, {self.input: batch})[0]
+        for i, result in zip(index, self.decode(logits, allowlist)):
+            results[i] = result
+        return results
@@ -0,0 +1,72 @@
+import queue
+import threading
+
+
+class ResultsPipeline:
+    """Reads results-screen frames on a worker thread while the bot navigates on
+
+    Frames are processed strictly in submission order by one worker, so the running
+    totals are exact and always reflect a prefix of the attacks. A result value of
+    None (unread) adds nothing to the totals but reaches on_result as None. With threaded=False
+    each frame is processed inside submit() instead, so replays on a virtual clock see
+    every result at the same point on each run. Jobs run through `profiles`
+    (metrics.ThreadProfiles) when given.
+    """
+
+    def __init__(self, process, on_result=None, resources=3, threaded=True, profiles=None):
+        self.process = process
+        self.on_result = on_result
+        self.profiles = profiles
+        self.jobs = queue.Queue()
+        self.cond = threading.Condition()
+        self.totals = [0] * resources
+        self.submitted = 0
+        self.completed = 0
+        self.thread = None
+        if threaded:
+            self.thread = threading.Thread(target=self._run, name='results-worker', daemon=True)
+            self.thread.start()
+
+    def submit(self, frame):
+        """Queue a results frame (or process it, when not threaded); returns its sequence number"""
+        with self.cond:
+            seq = self.submitted
+            self.submitted += 1
+        if self.thread is None:
+            self._process(seq, frame)
+        else:
+            self.jobs.put((seq, frame))
+        return seq
+
+    def _run(self):
+        while True:
+            seq, frame = self.jobs.get()
+            if self.profiles is None:
+                self._process(seq, frame)
+            else:
+                self.profiles.job(lambda: self._process(seq, frame))
+
+    def _process(self, seq, frame):
+        try:
+            result = self.process(frame)
+        except Exception as e:
+            print(f"  ❌ Results processing error (attack #{seq + 1}): {e}")
+            result = (None,) * len(self.totals)
+
+        with self.cond:
+            self.totals = [t + (r or 0) for t, r in zip(self.totals, result)]
+            self.completed += 1
+            totals = list(self.totals)
+            self.cond.notify_all()
+        if self.on_result is not None:
+            self.on_result(seq, result, totals)
+
+    def snapshot(self):
+        """(totals so far, results still in flight)"""
+        with self.cond:
+            return list(self.totals), self.submitted - self.completed
+
+    def drain(self, timeout=None):
+        """Wait for every submitted frame to be processed; returns False on timeout"""
+        with self.cond:
+            return self.cond.wait_for(lambda: self.completed == self.submitted, timeout)
@@ -0,0 +1,86 @@
+import cv2
+import numpy as np
+
+
+# EasyOCR's recognizer works on 64 px tall lines
+RECOGNIZER_HEIGHT = 64
+
+GREY_CODES = {
+    'RGB': cv2.COLOR_RGB2GRAY,
+    'BGR': cv2.COLOR_BGR2GRAY,
+    'BGRA': cv2.COLOR_BGRA2GRAY,
+    'RGBA': cv2.COLOR_RGBA2GRAY,
+}
+
+BGR_CODES = {
+    'RGB': cv2.COLOR_RGB2BGR,
+    'BGRA': cv2.COLOR_BGRA2BGR,
+    'RGBA': cv2.COLOR_RGBA2BGR,
+}
+
+
+class RegionPreprocessor:
+    """Captured crop (any channel order) to grey at recognizer height, into reused buffers
+
+    The returned array is overwritten by the next call; hash, read or copy it before then.
+    """
+
+    def __init__(self, height=RECOGNIZER_HEIGHT, binarize=False, invert=False,
+                 interpolation=cv2.INTER_LINEAR):
+        self.height = height
+        self.binarize = binarize
+        self.invert = invert
+        self.interpolation = interpolation
+        self.grey = None
+        self.out = None
+
+    def __call__(self, crop, order='BGR'):
+        h, w = crop.shape[:2]
+        if crop.ndim == 2:
+            grey = crop
+        else:
+            if self.grey is None or self.grey.shape != (h, w):
+                self.grey = np.empty((h, w), dtype=np.uint8)
+            # Reads the frame view in place; no contiguous copy of the crop is made
+            cv2.cvtColor(crop, GREY_CODES[order], dst=self.grey)
+            grey = self.grey
+
+        if not self.height or h == self.height:
+            out_shape = (h, w)
+        else:
+            out_shape = (self.height, max(1, round(w * self.height / h)))
+        if self.out is None or self.out.shape != out_shape:
+            self.out = np.empty(out_shape, dtype=np.uint8)
+
+        if out_shape == (h, w):
+            np.copyto(self.out, grey)
+        else:
+            cv2.resize(grey, (out_shape[1], out_shape[0]), dst=self.out,
+                       interpolation=self.interpolation)
+
+        if self.binarize:
+            mode = cv2.THRESH_BINARY_INV if self.invert else cv2.THRESH_BINARY
+            cv2.threshold(self.out, 0, 255, mode + cv2.THRESH_OTSU, dst=self.out)
+        elif self.invert:
+            cv2.bitwise_not(self.out, dst=self.out)
+        return self.out
+
+
+class PreprocessorBank:
+    """One RegionPreprocessor (and its buffers) per screen region, with per-name tuning"""
+
+    def __init__(self, defaults=None, overrides=None):
+        self.defaults = defaults or {}
+        self.overrides = overrides or {}
+        self.regions = {}
+
+    def get(self, resource_name, coord):
+        key = (resource_name, tuple(coord))
+        preprocessor = self.regions.get(key)
+        if preprocessor is None:
+            settings = dict(self.defaults, **self.overrides.get(resource_name, {}))
+            preprocessor = self.regions[key] = RegionPreprocessor(**settings)
+        return preprocessor
+
+    def __call__(self, resource_name, coord, frame):
+        return self.get(resource_name, coord)(frame.crop(coord), frame.order)
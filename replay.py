@@ -0,0 +1,226 @@
+import json
+import threading
+import time
+import zipfile
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+from preprocess import BGR_CODES
+
+
+# Session files are zips: frames/NNNNNN.png plus meta.json (frame times and input events)
+SESSION_VERSION = 1
+
+
+class ReplayFinished(Exception):
+    """The bot has used up every recorded input event"""
+
+
+def point(pos):
+    return [int(pos[0]), int(pos[1])]
+
+
+# ========== RECORDING ==========
+
+class SessionRecorder:
+    """Streams full-screen frames and the input events between them to a session file"""
+
+    def __init__(self, path):
+        self.path = path
+        self.zip = zipfile.ZipFile(path, 'w', zipfile.ZIP_STORED)
+        self.frames = []
+        self.events = []
+        self.start = time.monotonic()
+        self.lock = threading.Lock()
+
+    def frame(self, image_bgr):
+        ok, png = cv2.imencode('.png', image_bgr)
+        if not ok:
+            return
+        with self.lock:
+            index = len(self.frames)
+            self.zip.writestr(f'frames/{index:06d}.png', png.tobytes())
+            self.frames.append({'t': time.monotonic() - self.start, 'events': len(self.events)})
+
+    def event(self, kind, pos):
+        with self.lock:
+            self.events.append({'t': time.monotonic() - self.start, 'kind': kind, 'pos': point(pos)})
+
+    def close(self):
+        with self.lock:
+            meta = {'version': SESSION_VERSION, 'frames': self.frames, 'events': self.events}
+            self.zip.writestr('meta.json', json.dumps(meta))
+            self.zip.close()
+
+
+class RecordingBackend:
+    """Grabs the full screen, saves it when it changed, and returns the requested box
+
+    Waits poll the screen every 50 ms, so an animated corner would otherwise add a
+    full-screen PNG per poll. A frame is kept when some tile of a coarse sample has
+    moved by more than `threshold` on average since the last kept frame (a counter
+    ticking over is kept, a sparkle is not), and always as the first frame after an
+    input event.
+    """
+
+    def __init__(self, inner, recorder, threshold=4.0, grid=(16, 9)):
+        self.inner = inner
+        self.recorder = recorder
+        self.threshold = threshold
+        self.grid = grid
+        self.name = f'recording({inner.name})'
+        self.order = inner.order
+        self.last_sample = None
+        self.last_events = 0
+
+    def changed(self, sample):
+        """Whether any tile's mean difference from the last kept sample passes the threshold"""
+        if self.last_sample is None or sample.shape != self.last_sample.shape:
+            return True
+        tiles = cv2.resize(cv2.absdiff(sample, self.last_sample), self.grid, interpolation=cv2.INTER_AREA)
+        return tiles.max() > self.threshold
+
+    def grab(self, bbox=None):
+        image = self.inner.grab(None)
+
+        sample = np.ascontiguousarray(image[::8, ::8])
+        events = len(self.recorder.events)
+        if events != self.last_events or self.changed(sample):
+            self.last_sample = sample
+            self.last_events = events
+            bgr = image if self.order == 'BGR' else cv2.cvtColor(image, BGR_CODES[self.order])
+            self.recorder.frame(bgr)
+
+        if bbox is None:
+            return image
+        x1, y1, x2, y2 = bbox
+        return image[y1:y2, x1:x2]
+
+    def close(self):
+        self.inner.close()
+
+
+# ========== REPLAY ==========
+
+class VirtualClock:
+    """Clock whose sleeps return instantly and only move virtual time forward"""
+
+    def __init__(self):
+        self.t = 0.0
+
+    def now(self):
+        return self.t
+
+    def sleep(self, seconds):
+        self.t += max(seconds, 0.0)
+
+
+class ReplaySession:
+    """Serves recorded frames according to how many recorded clicks the bot has replayed
+
+    With loop=True the session starts over instead of finishing, for soak runs.
+    """
+
+    def __init__(self, path, cache_size=8, loop=False):
+        self.zip = zipfile.ZipFile(path)
+        meta = json.loads(self.zip.read('meta.json'))
+        self.frames = meta['frames']
+        self.events = meta['events']
+
+        # Frames recorded after each number of input events
+        self.segments = [[] for _ in range(len(self.events) + 1)]
+        for index, frame in enumerate(self.frames):
+            self.segments[frame['events']].append(index)
+
+        self.loop = loop
+        self.laps = 0
+        self.events_done = 0
+        self.segment_pos = 0
+        self.current = None
+        self.mismatches = 0
+        self.clock = VirtualClock()
+        self.cache = OrderedDict()
+        self.cache_size = cache_size
+
+    def next_frame(self):
+        """Step through the current segment, then hold its last frame"""
+        segment = self.segments[self.events_done]
+        if self.segment_pos < len(segment):
+            self.current = segment[self.segment_pos]
+            self.segment_pos += 1
+        if self.current is None:
+            raise ReplayFinished("Session has no frames")
+        return self.load(self.current)
+
+    def load(self, index):
+        image = self.cache.get(index)
+        if image is None:
+            data = np.frombuffer(self.zip.read(f'frames/{index:06d}.png'), dtype=np.uint8)
+            image = cv2.imdecode(data, cv2.IMREAD_COLOR)
+            self.cache[index] = image
+            if len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        return image
+
+    def input_event(self, kind, pos):
+        """Advance to the next recorded event, counting any divergence from the recording"""
+        if self.events_done >= len(self.events):
+            if not self.loop or not self.events:
+                raise ReplayFinished("All recorded input events replayed")
+            self.events_done = 0
+            self.laps += 1
+        expected = self.events[self.events_done]
+        if expected['kind'] != kind or expected['pos'] != point(pos):
+            self.mismatches += 1
+        self.events_done += 1
+        self.segment_pos = 0
+
+    def screen_backend(self):
+        return ReplayBackend(self)
+
+    def input_backend(self):
+        return ReplayInput(self)
+
+    def close(self):
+        self.zip.close()
+
+
+class ReplayBackend:
+    """Capture backend fed from a ReplaySession"""
+    name = 'replay'
+    order = 'BGR'
+
+    def __init__(self, session):
+        self.session = session
+
+    def grab(self, bbox=None):
+        image = self.session.next_frame()
+        if bbox is None:
+            return image
+        x1, y1, x2, y2 = bbox
+        return image[y1:y2, x1:x2]
+
+    def close(self):
+        pass
+
+
+class ReplayInput:
+    """Input backend that steps a ReplaySession instead of touching the mouse"""
+    name = 'replay'
+
+    def __init__(self, session):
+        self.session = session
+
+    def click(self, pos):
+        self.session.input_event('click', pos)
+
+    def drag_to(self, pos):
+        self.session.input_event('drag_to', pos)
+
+    def event(self, kind, pos):
+        self.session.input_event(kind, pos)
+
+    def flush(self):
+        pass
@@ -0,0 +1,311 @@
+import asyncio
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from waits import Settle
+
+
+POOLS = ('capture', 'ocr', 'input', 'background')
+
+
+class Workers:
+    """Daemon threads running jobs from one queue
+
+    Like a ThreadPoolExecutor, but a blocking action still running when the bot is
+    interrupted (a battle, a long wait) does not hold up interpreter exit. Jobs run
+    through `profiles` (metrics.ThreadProfiles) when given, so profiling snapshots see them.
+    """
+
+    def __init__(self, threads, name, profiles=None):
+        self.profiles = profiles
+        self.jobs = queue.SimpleQueue()
+        self.threads = [threading.Thread(target=self._run, name=f'{name}-{i}', daemon=True)
+                        for i in range(threads)]
+        for thread in self.threads:
+            thread.start()
+
+    def submit(self, fn):
+        future = Future()
+        self.jobs.put((fn, future))
+        return future
+
+    def _run(self):
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                return
+            fn, future = job
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(fn() if self.profiles is None else self.profiles.job(fn))
+            except BaseException as e:
+                future.set_exception(e)
+
+    def shutdown(self):
+        for _ in self.threads:
+            self.jobs.put(None)
+
+
+class Runtime:
+    """asyncio runtime the search/attack flow runs on
+
+    * A capture task keeps a latest-frame slot fresh, grabbing the watched regions
+      every `interval` seconds, so the screen is still watched while OCR runs.
+    * OCR and other blocking work run in executors (ocr(), background()).
+    * One actuator task performs every input action in submission order (act()).
+    * Timers run housekeeping in the background (every()).
+
+    Given a virtual `sleep` (e.g. a replay's VirtualClock), frames are grabbed only when
+    someone waits for one, one interval of virtual time later, and timers follow virtual
+    time. With `threaded=False` as well, everything runs inline on the event loop, so a
+    run on fake backends is deterministic.
+    """
+
+    def __init__(self, capture, inputs, interval=0.05, ocr_threads=1, threaded=True,
+                 clock=time.monotonic, sleep=None, profiles=None):
+        self.capture = capture
+        self.inputs = inputs
+        self.interval = interval
+        self.threaded = threaded
+        self.clock = clock
+        self.virtual_sleep = sleep
+
+        self.pools = {}
+        if threaded:
+            self.pools = {
+                'capture': Workers(1, 'capture', profiles),
+                'ocr': Workers(ocr_threads, 'ocr', profiles),
+                'input': Workers(1, 'actuator', profiles),
+                # One thread, so background jobs finish in the order they were started
+                'background': Workers(1, 'background', profiles),
+            }
+
+        # What the capture task grabs (None pauses it); bumping generation drops old frames
+        self.coords = None
+        self.generation = 0
+        self.latest = None
+        self.error = None
+        self.wanted = False
+        self.timers = []
+        self.pending = set()
+
+        self.frames = 0
+        self.used = 0
+        self.actions = 0
+        self.busy = dict.fromkeys(POOLS, 0.0)
+        self.wall = 0.0
+
+    def now(self):
+        return self.clock()
+
+    async def sleep(self, seconds):
+        if self.virtual_sleep is None:
+            await asyncio.sleep(seconds)
+            return
+        self.virtual_sleep(seconds)
+        self.run_due()
+        await asyncio.sleep(0)
+
+    async def call(self, pool, fn, *args):
+        """fn(*args) on the named executor (inline when not threaded), timed as busy time"""
+        def timed():
+            start = time.perf_counter()
+            try:
+                return fn(*args)
+            finally:
+                self.busy[pool] += time.perf_counter() - start
+
+        if not self.threaded:
+            return timed()
+        return await asyncio.wrap_future(self.pools[pool].submit(timed))
+
+    # ========== CAPTURE ==========
+
+    def watch(self, coords):
+        """Set the regions the capture task keeps grabbing (None pauses it); True if they changed"""
+        coords = None if coords is None else [tuple(c) for c in coords]
+        if coords == self.coords:
+            return False
+        self.coords = coords
+        self.generation += 1
+        self.latest = None
+        self.wake.set()
+        return True
+
+    async def next_frame(self, after=None):
+        """(frame, grab start) of the newest watched frame, grabbed after `after` if given
+
+        Raises the capture error instead if the grab failed.
+        """
+        if self.coords is None:
+            raise RuntimeError("Nothing is being watched")
+        async with self.changed:
+            while True:
+                if self.error is not None:
+                    error, self.error = self.error, None
+                    raise error
+                if self.latest is not None and (after is None or self.latest[1] > after):
+                    self.used += 1
+                    return self.latest[0], self.latest[1]
+                self.wanted = True
+                self.wake.set()
+                await self.changed.wait()
+
+    async def capture_loop(self):
+        while True:
+            virtual = self.virtual_sleep is not None
+            if self.coords is None or (virtual and not self.wanted):
+                self.wake.clear()
+                await self.wake.wait()
+                continue
+            self.wanted = False
+            if virtual:
+                # The frame a poll would have seen one interval later
+                await self.sleep(self.interval)
+            coords, generation, started = self.coords, self.generation, self.now()
+            try:
+                frame, error = await self.call('capture', self.capture.grab, coords), None
+            except Exception as e:
+                frame, error = None, e
+            self.frames += 1
+
+            async with self.changed:
+                if generation == self.generation:
+                    if error is None:
+                        self.latest = (frame, started)
+                    else:
+                        self.error = error
+                self.changed.notify_all()
+
+            if not virtual:
+                delay = started + self.interval - self.now()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+
+    async def wait(self, waiter, region, baseline=None, after=None, timeout=5.0, settle=0.3,
+                   on_still=None):
+        """ScreenWaiter.wait on the capture task's frames; returns (settled, last frame)
+
+        Nothing here blocks the event loop, so OCR and background work carry on meanwhile.
+        The last frame is the settled screen itself, ready to be read without another grab.
+        on_still(frame) is called whenever the region starts holding still; if it then
+        settles, the screen is the one on_still saw last.
+        """
+        start = self.now() if after is None else after
+        state = Settle(waiter, baseline, settle, start=start)
+        waiter.waits += 1
+        while True:
+            frame, after = await self.next_frame(after)
+            now = self.now()
+            still = state.stable_since is not None
+            if state.update(waiter.frame_signature(frame, region), now):
+                waiter.waited += now - start
+                return True, frame
+            if on_still is not None and not still and state.stable_since is not None:
+                on_still(frame)
+            if now - start >= timeout:
+                waiter.timeouts += 1
+                waiter.waited += now - start
+                return False, frame
+
+    # ========== WORK ==========
+
+    async def ocr(self, fn, *args):
+        """Run a read on the OCR executor"""
+        return await self.call('ocr', fn, *args)
+
+    def background(self, fn, *args):
+        """Start fn(*args) on the background executor; returns an awaitable for its result"""
+        future = asyncio.ensure_future(self.call('background', fn, *args))
+        self.pending.add(future)
+        future.add_done_callback(self.pending.discard)
+        return future
+
+    async def act(self, fn, *args):
+        """Run an input action (or a blocking sequence of them) once every earlier one is done"""
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((fn, args, future))
+        return await future
+
+    async def click(self, pos):
+        await self.act(self.inputs.click, pos)
+
+    async def actuator(self):
+        while True:
+            fn, args, future = await self.queue.get()
+            try:
+                result = await self.call('input', fn, *args)
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+            else:
+                if not future.done():
+                    future.set_result(result)
+            self.actions += 1
+
+    # ========== TIMERS ==========
+
+    def every(self, interval, fn, *args):
+        """Run fn(*args) on the background executor every interval seconds"""
+        self.timers.append([interval, self.now() + interval, fn, args])
+
+    def run_due(self):
+        now = self.now()
+        for timer in self.timers:
+            if now >= timer[1]:
+                timer[1] = now + timer[0]
+                self.background(timer[2], *timer[3])
+
+    async def timer_loop(self):
+        while True:
+            due = min((timer[1] for timer in self.timers), default=self.now() + 1.0)
+            await asyncio.sleep(max(0.0, due - self.now()))
+            self.run_due()
+
+    async def drain(self):
+        """Wait for every background job started so far"""
+        while self.pending:
+            await asyncio.gather(*list(self.pending), return_exceptions=True)
+
+    # ========== LIFECYCLE ==========
+
+    async def run(self, main):
+        """Await the coroutine main with the capture, actuator and timer tasks running"""
+        self.changed = asyncio.Condition()
+        self.wake = asyncio.Event()
+        self.queue = asyncio.Queue()
+        tasks = [asyncio.create_task(self.capture_loop(), name='capture'),
+                 asyncio.create_task(self.actuator(), name='actuator')]
+        if self.virtual_sleep is None:
+            tasks.append(asyncio.create_task(self.timer_loop(), name='timers'))
+        start = time.perf_counter()
+        try:
+            return await main
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            # Background jobs (base log writes) are allowed to finish
+            await self.drain()
+            self.wall += time.perf_counter() - start
+
+    def close(self):
+        for pool in self.pools.values():
+            pool.shutdown()
+
+    def stats(self):
+        """Frames grabbed and read, and how busy each executor was relative to wall time"""
+        wall = self.wall or 1e-9
+        return {
+            'frames': self.frames,
+            'used': self.used,
+            'fps': self.frames / wall,
+            'actions': self.actions,
+            'busy': {pool: seconds / wall for pool, seconds in self.busy.items()},
+            # Above 1 means work overlapped
+            'concurrency': sum(self.busy.values()) / wall,
+            'wall_s': self.wall,
+        }
@@ -0,0 +1,164 @@
+import os
+import time
+
+import cv2
+import numpy as np
+
+
+SCREEN_FILE = 'screen_states.npz'
+STATES = ('lobby', 'matchmaking', 'scouting', 'battle', 'results')
+UNKNOWN = 'unknown'
+
+# Fingerprint is a colour thumbnail of the whole screen
+FINGERPRINT_SIZE = (32, 18)
+# Subsample this many pixels per thumbnail pixel before the area resize
+SAMPLE_STEP = 4
+
+# Best-match correlation needed to trust a classification
+MIN_SCORE = 0.8
+
+# Prototypes kept per state when building from many screenshots
+MAX_PROTOTYPES = 40
+
+
+def fingerprint(image, order='BGR'):
+    """Mean-removed, unit-length colour thumbnail of a full-screen image"""
+    h, w = image.shape[:2]
+    step_y = max(1, h // (FINGERPRINT_SIZE[1] * SAMPLE_STEP))
+    step_x = max(1, w // (FINGERPRINT_SIZE[0] * SAMPLE_STEP))
+    # Strided view first, so only a few thousand pixels are touched
+    sample = image[::step_y, ::step_x, :3]
+    if order in ('RGB', 'RGBA'):
+        sample = sample[..., ::-1]
+    small = cv2.resize(np.ascontiguousarray(sample), FINGERPRINT_SIZE, interpolation=cv2.INTER_AREA)
+    vector = small.astype(np.float32).ravel()
+    vector -= vector.mean()
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class ScreenClassifier:
+    """Names the current screen by correlating its fingerprint with labelled prototypes"""
+
+    def __init__(self, prototypes, labels, min_score=MIN_SCORE):
+        self.prototypes = prototypes.astype(np.float32)
+        self.labels = list(labels)
+        self.min_score = min_score
+        self.counts = {}
+        self.time = 0.0
+
+    @classmethod
+    def load(cls, path=SCREEN_FILE):
+        """Load prototypes built by build_screen_states, or None if there are none"""
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as data:
+            return cls(data['prototypes'], data['labels'].tolist())
+
+    def classify(self, frame):
+        """Return (state, score); state is UNKNOWN when nothing matches well enough"""
+        start = time.perf_counter()
+        scores = self.prototypes @ fingerprint(frame.image, frame.order)
+        best = int(scores.argmax())
+        score = float(scores[best])
+        state = self.labels[best] if score >= self.min_score else UNKNOWN
+        self.time += time.perf_counter() - start
+        self.counts[state] = self.counts.get(state, 0) + 1
+        return state, score
+
+    def stats(self):
+        calls = sum(self.counts.values())
+        return {
+            'calls': calls,
+            'mean_ms': self.time / calls * 1000 if calls else 0.0,
+            'states': dict(self.counts),
+        }
+
+
+# ========== PROTOTYPE BUILDING ==========
+
+def build_screen_states(screen_dir, path=SCREEN_FILE):
+    """Fingerprint labelled screenshots ('<state>_anything.png') into prototypes"""
+    samples = {state: [] for state in STATES}
+    skipped = 0
+
+    for name in sorted(os.listdir(screen_dir)):
+        label = os.path.splitext(name)[0].split('_')[0]
+        if label not in samples:
+            continue
+        image = cv2.imread(os.path.join(screen_dir, name), cv2.IMREAD_COLOR)
+        if image is None:
+            skipped += 1
+            continue
+        samples[label].append(fingerprint(image, 'BGR'))
+
+    prototypes, labels = [], []
+    for state, vectors in samples.items():
+        # Evenly spaced subset keeps lookups fast while covering the variety seen
+        keep = np.linspace(0, len(vectors) - 1, min(len(vectors), MAX_PROTOTYPES)).astype(int)
+        for i in keep:
+            prototypes.append(vectors[i])
+            labels.append(state)
+
+    if not prototypes:
+        raise ValueError(f"No '<state>_*.png' screenshots in {screen_dir}")
+    np.savez_compressed(path, prototypes=np.array(prototypes, dtype=np.float32),
+                        labels=np.array(labels))
+    counts = {state: len(vectors) for state, vectors in samples.items()}
+    missing = [state for state, n in counts.items() if not n]
+    return counts, skipped, missing
+
+
+# ========== RECOVERY ==========
+
+class StuckError(Exception):
+    """Recovery could not get back to a known screen"""
+
+
+class RecoveryMachine:
+    """Acts on whatever screen is showing until the target screen is reached
+
+    `actions` maps a state to a callable that moves the game one step closer to the
+    target (e.g. results -> click Return Home). States without an action are waited
+    out, which is what a slow load or matchmaking needs.
+    """
+
+    def __init__(self, classify, actions, target='scouting', max_steps=15, wait=1.0,
+                 clock=time.monotonic, sleep=time.sleep):
+        self.classify = classify
+        self.actions = actions
+        self.target = target
+        self.max_steps = max_steps
+        self.wait = wait
+        self.clock = clock
+        self.sleep = sleep
+
+        self.recoveries = 0
+        self.steps = 0
+        self.time_lost = 0.0
+
+    def recover(self, target=None):
+        """Returns the list of states passed through; raises StuckError after max_steps"""
+        target = target or self.target
+        start = self.clock()
+        path = []
+        try:
+            for _ in range(self.max_steps):
+                state = self.classify()
+                path.append(state)
+                if state == target:
+                    return path
+                self.steps += 1
+                action = self.actions.get(state)
+                if action is None:
+                    self.sleep(self.wait)
+                else:
+                    action()
+            raise StuckError(f"No {target} screen after {self.max_steps} steps ({' > '.join(path)})")
+        finally:
+            if len(path) > 1:
+                self.recoveries += 1
+            self.time_lost += self.clock() - start
+
+    def stats(self):
+        return {'recoveries': self.recoveries, 'steps': self.steps, 'time_lost_s': self.time_lost}
@@ -0,0 +1,185 @@
+import gc
+import os
+import sys
+import tracemalloc
+
+import cv2
+import numpy as np
+
+from replay import VirtualClock, ReplayBackend, ReplayInput
+
+
+# Growth allowed between the end of warm-up and the end of the run
+TRACED_BUDGET_MB = 8.0
+RSS_BUDGET_MB = 64.0
+
+# Allocation sites listed in the report
+TOP_SITES = 10
+
+
+def rss_bytes():
+    """Resident set size of this process (peak RSS where /proc is unavailable)"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Kilobytes on Linux, bytes on macOS
+        return peak if sys.platform == 'darwin' else peak * 1024
+
+
+# ========== SYNTHETIC FRAMES ==========
+
+def synthetic_frames(regions, size=(1920, 1080), count=16, seed=0):
+    """Dark full-screen BGR frames with a random loot number drawn in every region
+
+    `regions` are (x1, y1, x2, y2) boxes; `size` is (width, height), grown if a
+    region would not fit.
+    """
+    rng = np.random.default_rng(seed)
+    size = (max([size[0]] + [r[2] for r in regions]), max([size[1]] + [r[3] for r in regions]))
+    frames = []
+    for _ in range(count):
+        frame = np.full((size[1], size[0], 3), 30, dtype=np.uint8)
+        # Some texture so waits and screen fingerprints see a changing screen
+        frame[::7, ::5] = rng.integers(0, 90, size=frame[::7, ::5].shape, dtype=np.uint8)
+        for x1, y1, x2, y2 in regions:
+            text = f'{int(rng.integers(0, 1_500_000)):,}'.replace(',', ' ')
+            scale = (y2 - y1) / 32
+            cv2.putText(frame, text, (x1 + 2, y2 - 4), cv2.FONT_HERSHEY_SIMPLEX, scale,
+                        (255, 255, 255), max(1, round(2 * scale)), cv2.LINE_AA)
+        frames.append(frame)
+    return frames
+
+
+class SyntheticSession:
+    """Stand-in for a recorded session: the next synthetic base after every input event
+
+    Serves the same backends as ReplaySession, so the bot runs unchanged against it.
+    """
+
+    def __init__(self, frames):
+        self.frames = frames
+        self.events_done = 0
+        self.mismatches = 0
+        self.clock = VirtualClock()
+
+    def next_frame(self):
+        return self.frames[self.events_done % len(self.frames)]
+
+    def input_event(self, kind, pos):
+        self.events_done += 1
+
+    def screen_backend(self):
+        return ReplayBackend(self)
+
+    def input_backend(self):
+        return ReplayInput(self)
+
+    def close(self):
+        pass
+
+
+# ========== MEMORY TRACKING ==========
+
+class SoakFinished(Exception):
+    """The soak run has done all of its iterations"""
+
+
+class MemoryTracker:
+    """tracemalloc and RSS samples taken every few iterations of a long run
+
+    The baseline is taken after `warmup` iterations, once caches, metric windows and
+    lazily built buffers have filled; anything that keeps growing after it is a leak.
+    tick() also records each iteration's transient peak: how far traced memory rose
+    above its starting level, i.e. what the iteration allocated and freed again.
+    """
+
+    def __init__(self, iterations, interval=100, warmup=None, traced_budget_mb=TRACED_BUDGET_MB,
+                 rss_budget_mb=RSS_BUDGET_MB, frames=1):
+        self.iterations = iterations
+        self.interval = interval
+        self.warmup = max(1, iterations // 10) if warmup is None else warmup
+        self.traced_budget = traced_budget_mb * 1e6
+        self.rss_budget = rss_budget_mb * 1e6
+        self.frames = frames
+
+        self.count = 0
+        self.samples = []
+        self.baseline = None
+        self.start_traced = 0
+        # Allocated up front so recording them adds nothing during the run
+        self.transients = np.zeros(iterations)
+
+    def start(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+        self.start_traced = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+
+    def sample(self):
+        # Cycles waiting for the collector would otherwise look like growth
+        gc.collect()
+        traced, _ = tracemalloc.get_traced_memory()
+        self.samples.append((self.count, traced, rss_bytes()))
+
+    def tick(self):
+        """Call once per iteration; raises SoakFinished after the last one"""
+        _, peak = tracemalloc.get_traced_memory()
+        if self.count < len(self.transients):
+            self.transients[self.count] = max(0, peak - self.start_traced)
+        self.count += 1
+
+        if self.count == self.warmup:
+            # The snapshot itself is traced, so sample only once it exists
+            gc.collect()
+            self.baseline = tracemalloc.take_snapshot()
+            self.sample()
+        elif self.count > self.warmup and self.count % self.interval == 0:
+            self.sample()
+
+        if self.count >= self.iterations:
+            if self.samples[-1][0] != self.count:
+                self.sample()
+            raise SoakFinished(f"{self.count} iterations done")
+
+        self.start_traced = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+
+    def report(self, top=TOP_SITES):
+        """Growth since warm-up, growth rate, worst sites and whether the budgets held"""
+        if self.baseline is None:
+            raise ValueError(f"Soak stopped after {self.count} iterations, before warm-up ended")
+        counts, traced, rss = (np.array(column, dtype=np.float64) for column in zip(*self.samples))
+        per_1000 = lambda values: float(np.polyfit(counts, values, 1)[0] * 1000) if len(counts) > 1 else 0.0
+
+        snapshot = tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap*>'),
+        ])
+        sites = [
+            {'site': str(stat.traceback[0]), 'growth': stat.size_diff, 'blocks': stat.count_diff}
+            for stat in snapshot.compare_to(self.baseline, 'lineno')[:top]
+            if stat.size_diff > 0
+        ]
+
+        transients = self.transients[self.warmup:self.count]
+        if not len(transients):
+            transients = np.zeros(1)
+        traced_growth = float(traced[-1] - traced[0])
+        rss_growth = float(rss[-1] - rss[0])
+        return {
+            'iterations': self.count,
+            'warmup': self.warmup,
+            'traced_growth': traced_growth,
+            'rss_growth': rss_growth,
+            'traced_per_1000': per_1000(traced),
+            'rss_per_1000': per_1000(rss),
+            'traced_now': float(traced[-1]),
+            'rss_now': float(rss[-1]),
+            'transient_p50': float(np.median(transients)),
+            'transient_max': float(transients.max()),
+            'sites': sites,
+            'ok': traced_growth <= self.traced_budget and rss_growth <= self.rss_budget,
+        }
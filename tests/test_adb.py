@@ -0,0 +1,91 @@
+import time
+
+import numpy as np
+import pytest
+
+from adb import AdbBackend, AdbError, AdbInput, FakeAdbServer
+
+
+def frames():
+    rng = np.random.default_rng(3)
+    return [rng.integers(0, 256, (40, 60, 3), dtype=np.uint8) for _ in range(3)]
+
+
+def test_capture_round_trip():
+    screens = frames()
+    with FakeAdbServer(screens) as server:
+        backend = AdbBackend(server.serial, port=server.port)
+        assert backend.header_size == 16
+        assert backend.order == 'RGBA'
+
+        image = backend.grab()
+        assert image.shape == (40, 60, 4)
+        assert np.array_equal(image[:, :, 2::-1], screens[0])
+        assert np.array_equal(backend.grab((10, 5, 30, 25))[:, :, 2::-1], screens[0][5:25, 10:30])
+        assert backend.frames == 2
+        # The frame still held is not overwritten; the released one is reused
+        backend.grab()
+        assert np.array_equal(image[:, :, 2::-1], screens[0])
+        assert backend.buffers.allocations == 2
+        backend.close()
+
+
+def test_input_round_trip():
+    screens = frames()
+    with FakeAdbServer(screens) as server:
+        backend = AdbBackend(server.serial, port=server.port)
+        inputs = AdbInput(server.serial, port=server.port, max_batch=100)
+
+        inputs.click((12, 34))
+        assert server.commands == ['input tap 12 34']
+        # The device moved on to the next screen after the tap
+        assert np.array_equal(backend.grab()[:, :, 2::-1], screens[1])
+
+        inputs.event('down', (1, 2))
+        inputs.event('move', (3, 4))
+        inputs.event('up', (5, 6))
+        inputs.event('tap', (7, 8))
+        assert len(server.commands) == 1
+        inputs.flush()
+
+        assert server.commands[1].startswith('input swipe 1 2 5 6 ')
+        assert server.commands[2] == 'input tap 7 8'
+        assert inputs.sent == 3
+        inputs.close()
+        backend.close()
+
+
+def test_unknown_serial_is_refused():
+    with FakeAdbServer(frames()) as server:
+        with pytest.raises(AdbError, match='other-5556'):
+            AdbBackend('other-5556', port=server.port)
+
+
+def test_closed_shell_is_reopened_before_sending():
+    with FakeAdbServer(frames()) as server:
+        inputs = AdbInput(server.serial, port=server.port)
+        inputs.click((1, 1))
+        server.drop_sessions()
+        time.sleep(0.1)
+
+        inputs.click((2, 2))
+        assert server.commands == ['input tap 1 1', 'input tap 2 2']
+        assert (inputs.sent, inputs.dropped) == (2, 0)
+        inputs.close()
+
+
+def test_batch_cut_off_midway_is_not_resent():
+    with FakeAdbServer(frames()) as server:
+        inputs = AdbInput(server.serial, port=server.port, max_batch=100)
+        server.crash_after = 2
+        for x in range(4):
+            inputs.event('tap', (x, 0))
+        inputs.flush()
+
+        # Two taps ran before the shell died; resending would repeat them
+        assert server.commands == ['input tap 0 0', 'input tap 1 0']
+        assert (inputs.sent, inputs.dropped) == (0, 4)
+
+        inputs.click((9, 9))
+        assert server.commands[-1] == 'input tap 9 9'
+        inputs.close()
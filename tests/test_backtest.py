@@ -0,0 +1,35 @@
+import numpy as np
+import pytest
+
+from backtest import backtest
+from basedb import BaseStore
+
+
+def rows(tmp_path, bases):
+    store = BaseStore(str(tmp_path / 'bases.db'))
+    for gold, elixir, dark in bases:
+        store.log_base(gold, elixir, dark, 8.0)
+    store.flush()
+    result = store.recent()
+    store.close()
+    return result
+
+
+def test_log_without_complete_bases(tmp_path):
+    unread = rows(tmp_path, [(None, 200000, 3000), (100000, None, None)])
+    with pytest.raises(ValueError, match='no complete bases'):
+        backtest(unread)
+    with pytest.raises(ValueError, match='no complete bases'):
+        backtest(np.empty((0, 9)))
+
+
+def test_ranks_rules(tmp_path):
+    rng = np.random.default_rng(1)
+    bases = [(int(g), int(e), int(d)) for g, e, d in
+             zip(rng.integers(0, 900000, 300), rng.integers(0, 900000, 300), rng.integers(0, 9000, 300))]
+    model, ranked = backtest(rows(tmp_path, bases), reference={'Gold': 500000, 'Elixir': 500000,
+                                                               'Dark Elixir': 5000})
+    assert len(model['values']) == 300
+    rates = [row['loot_per_hour'] for row in ranked]
+    assert rates == sorted(rates, reverse=True)
+    assert any(row['rule'].startswith('live') for row in ranked)
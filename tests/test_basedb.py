@@ -0,0 +1,41 @@
+import numpy as np
+
+from basedb import BaseStore
+
+
+def test_two_stores_share_one_log(tmp_path):
+    path = str(tmp_path / 'bases.db')
+    first = BaseStore(path, flush_every=1000)
+    second = BaseStore(path, flush_every=1000)
+
+    a = first.log_base(100, 200, 3, 5.0)
+    b = second.log_base(400, 500, 6, 7.0)
+    first.log_attack(a, 30.0)
+    assert first.flush()
+    assert second.flush()
+    second.log_result(b, 40, 50, 1)
+    second.log_attack(b, 25.0)
+    assert second.flush()
+
+    rows = first.recent()
+    assert len(rows) == 2
+    assert rows[:, :3].tolist() == [[100, 200, 3], [400, 500, 6]]
+    assert rows[0, 4:6].tolist() == [1, 30.0]
+    assert rows[1, 4:9].tolist() == [1, 25.0, 40, 50, 1]
+    first.close()
+    second.close()
+
+
+def test_failed_flush_keeps_the_batch(tmp_path):
+    store = BaseStore(str(tmp_path / 'bases.db'), flush_every=1000)
+    store.log_base(1, 2, 3, 4.0)
+    store.db.execute('DROP TABLE bases')
+    assert not store.flush()
+    assert len(store.inserts) == 1
+
+    store.db.executescript('CREATE TABLE bases (id INTEGER PRIMARY KEY, ts REAL, gold INTEGER, '
+                           'elixir INTEGER, dark INTEGER, search_s REAL, attacked INTEGER DEFAULT 0, '
+                           'attack_s REAL, earned_gold INTEGER, earned_elixir INTEGER, earned_dark INTEGER)')
+    assert store.flush()
+    assert np.array_equal(store.recent()[:, :4], [[1, 2, 3, 4.0]])
+    store.close()
@@ -0,0 +1,91 @@
+from battle import BattleMonitor
+from replay import VirtualClock
+
+
+def falling_loot(clock, until=40.0, misread_at=None):
+    """Loot counters that drop every second until `until`, with one Gold misread"""
+    def read():
+        t = clock.now()
+        left = max(0.0, until - t)
+        values = {'Gold': int(left * 10000), 'Elixir': int(left * 10000), 'Dark Elixir': int(left * 50)}
+        if misread_at is not None and t == misread_at:
+            values['Gold'] = None
+        return values
+    return read
+
+
+def monitor(read, clock):
+    return BattleMonitor(read, interval=1.0, idle_window=5.0, min_time=5.0, max_time=60.0,
+                         clock=clock.now, sleep=clock.sleep)
+
+
+def test_stops_once_loot_stops_dropping():
+    clock = VirtualClock()
+    reason, elapsed, samples = monitor(falling_loot(clock), clock).run()
+    assert reason == 'loot_stopped'
+    assert elapsed == 45.0
+    assert len(samples) == 46
+
+
+def test_unread_counter_does_not_end_battle_early():
+    clock = VirtualClock()
+    reason, elapsed, samples = monitor(falling_loot(clock, misread_at=6.0), clock).run()
+    assert reason == 'loot_stopped'
+    assert elapsed == 45.0
+    assert 6.0 not in [t for t, _ in samples]
+
+
+def test_high_misread_is_not_a_drop():
+    clock = VirtualClock()
+    read = falling_loot(clock)
+
+    def spiky():
+        values = read()
+        if clock.now() == 10.0:
+            values['Gold'] *= 100
+        return values
+
+    reason, elapsed, _ = monitor(spiky, clock).run()
+    assert (reason, elapsed) == ('loot_stopped', 45.0)
+
+
+def test_read_errors_and_max_time():
+    clock = VirtualClock()
+
+    def broken():
+        raise RuntimeError("capture failed")
+
+    reason, elapsed, samples = monitor(broken, clock).run()
+    # Nothing was ever read, so there is no evidence the loot stopped
+    assert (reason, elapsed, samples) == ('max_time', 60.0, [])
+
+    clock = VirtualClock()
+    endless = falling_loot(clock, until=1000.0)
+    reason, elapsed, _ = monitor(endless, clock).run()
+    assert (reason, elapsed) == ('max_time', 60.0)
+
+
+def test_idle_window_starts_after_min_time():
+    clock = VirtualClock()
+
+    def slow_start():
+        # Troops still walking in: no loot taken for the first 8 s, then it drops until 30 s
+        left = 22.0 - max(0.0, min(clock.now(), 30.0) - 8.0)
+        return {'Gold': int(left * 10000), 'Elixir': int(left * 10000), 'Dark Elixir': int(left * 50)}
+
+    reason, elapsed, _ = monitor(slow_start, clock).run()
+    assert (reason, elapsed) == ('loot_stopped', 35.0)
+
+
+def test_first_reading_starts_the_idle_window():
+    clock = VirtualClock()
+    read = falling_loot(clock, until=30.0)
+
+    def late():
+        if clock.now() < 20.0:
+            raise RuntimeError("counters hidden")
+        return read()
+
+    reason, elapsed, samples = monitor(late, clock).run()
+    assert (reason, elapsed) == ('loot_stopped', 35.0)
+    assert samples[0][0] == 20.0
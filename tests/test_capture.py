@@ -0,0 +1,35 @@
+import numpy as np
+
+from capture import BufferPool
+
+
+def test_array_is_reused_once_released():
+    pool = BufferPool()
+    first = pool.get((4, 6, 3))
+    first_id = id(first)
+    del first
+    assert id(pool.get((4, 6, 3))) == first_id
+    assert pool.allocations == 1
+
+
+def test_held_arrays_and_their_views_are_not_reused():
+    pool = BufferPool(per_shape=2)
+    held = pool.get((4, 6, 3))
+    crop = pool.get((4, 6, 3))[1:3, 2:4]
+    fresh = pool.get((4, 6, 3))
+    assert not np.shares_memory(fresh, held)
+    assert not np.shares_memory(fresh, crop)
+    assert pool.allocations == 3
+
+    # Releasing the frame frees its array; the crop still pins the other one
+    del held
+    again = pool.get((4, 6, 3))
+    assert not np.shares_memory(again, crop)
+    assert pool.allocations == 3
+
+
+def test_shapes_are_bounded():
+    pool = BufferPool(shapes=2)
+    for width in range(1, 5):
+        pool.get((2, width))
+    assert len(pool.arrays) == 2
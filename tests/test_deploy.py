@@ -0,0 +1,44 @@
+import pytest
+
+from deploy import DeployEngine, build_schedule
+from inputs import FakeInput
+from replay import VirtualClock
+
+
+LINES = [((0, 0), (110, 0)), ((50, 100), (50, 200))]
+
+
+def test_drag_presses_moves_and_releases_along_each_line():
+    schedule = build_schedule(LINES, rounds=2, pattern='drag', density=12, interval=0.01)
+    per_line = ['down'] + ['move'] * 11 + ['up']
+    assert [kind for kind, _ in schedule.events] == per_line * 4
+    assert len(schedule) == 52
+
+    first = [pos for _, pos in schedule.events[:13]]
+    assert first[0] == (0, 0)
+    assert first[1:12] == [(x, 0) for x in range(10, 111, 10)]
+    assert first[12] == (110, 0)
+    assert schedule.times[1] == pytest.approx(0.01)
+
+
+def test_taps_along_each_line():
+    schedule = build_schedule(LINES, rounds=1, pattern='taps', density=3)
+    assert schedule.events == [('tap', (0, 0)), ('tap', (55, 0)), ('tap', (110, 0)),
+                               ('tap', (50, 100)), ('tap', (50, 150)), ('tap', (50, 200))]
+
+
+def test_unknown_pattern():
+    with pytest.raises(ValueError):
+        build_schedule(LINES, pattern='spiral')
+
+
+def test_engine_sends_every_event_on_schedule():
+    clock = VirtualClock()
+    inputs = FakeInput(clock=clock.now)
+    schedule = build_schedule(LINES, rounds=3, density=5, interval=0.004)
+
+    rate = DeployEngine(inputs, clock=clock.now, sleep=clock.sleep).run(schedule)
+
+    assert [(kind, pos) for _, kind, pos in inputs.events] == schedule.events
+    assert [t for t, _, _ in inputs.events] == pytest.approx(schedule.times.tolist())
+    assert rate == pytest.approx(len(schedule) / schedule.times[-1])
@@ -0,0 +1,46 @@
+from evaluation import AdaptiveEvaluator
+
+
+RESOURCES = [('Gold', (0, 0, 1, 1)), ('Elixir', (0, 1, 1, 2)), ('Dark Elixir', (0, 2, 1, 3))]
+THRESHOLDS = {'Gold': 100, 'Elixir': 100, 'Dark Elixir': 10}
+
+
+def reader(values, calls):
+    def read(resource_list):
+        calls.append([name for name, _ in resource_list])
+        return {name: values[name] for name, _ in resource_list}
+    return read
+
+
+def test_first_read_alone_then_the_rest_batched():
+    evaluator = AdaptiveEvaluator([name for name, _ in RESOURCES])
+    calls = []
+    assert not evaluator.evaluate(RESOURCES, THRESHOLDS, reader({'Gold': 5, 'Elixir': 5, 'Dark Elixir': 5}, calls))
+    assert calls == [['Gold'], ['Elixir', 'Dark Elixir']]
+    assert (evaluator.evaluations, evaluator.reads, evaluator.saved) == (1, 3, 0)
+
+
+def test_a_first_hit_skips_the_rest():
+    evaluator = AdaptiveEvaluator([name for name, _ in RESOURCES])
+    calls = []
+    assert evaluator.evaluate(RESOURCES, THRESHOLDS, reader({'Gold': 500, 'Elixir': 5, 'Dark Elixir': 5}, calls))
+    assert calls == [['Gold']]
+    assert (evaluator.reads, evaluator.saved) == (1, 2)
+    assert evaluator.stats['Gold']['hits'] == 1
+
+    evaluator.read_later(2)
+    assert (evaluator.reads, evaluator.saved) == (3, 0)
+
+
+def test_trial_counts_nothing_until_committed():
+    evaluator = AdaptiveEvaluator([name for name, _ in RESOURCES])
+    calls = []
+    passed, trace = evaluator.trial(RESOURCES, THRESHOLDS, reader({'Gold': 5, 'Elixir': 500, 'Dark Elixir': 5}, calls))
+    assert passed
+    assert (evaluator.evaluations, evaluator.reads, evaluator.saved) == (0, 0, 0)
+    assert all(entry['reads'] == 0 for entry in evaluator.stats.values())
+
+    evaluator.commit(trace)
+    assert (evaluator.evaluations, evaluator.reads, evaluator.saved) == (1, 3, 0)
+    assert evaluator.stats['Elixir']['hits'] == 1
+    assert evaluator.stats['Gold']['hits'] == 0
@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+
+from ocr import OCRCache, Reading, best_reading, left_to_right, parse_reading
+
+
+@pytest.mark.parametrize('text, value', [
+    ('1234', 1234),
+    ('12 345', 12345),
+    ('1,234,567', 1234567),
+    ('1.234', 1234),
+    ('1,2 34,567', 1234567),
+    (' 987 ', 987),
+])
+def test_well_formed(text, value):
+    reading = parse_reading([(text, 0.9)])
+    assert reading.problem is None
+    assert reading.value == value
+
+
+@pytest.mark.parametrize('text', ['12 34', '123 4', '12,34', '1,2345'])
+def test_badly_grouped(text):
+    reading = parse_reading([(text, 0.9)])
+    assert reading.problem == 'format'
+    assert not reading.usable
+
+
+def test_empty():
+    assert parse_reading([]).problem == 'empty'
+    assert parse_reading([(' , ', 0.9)]).problem == 'empty'
+
+
+def test_split_fragments_are_joined():
+    reading = parse_reading([('1,2', 0.9), ('34,567', 0.8)])
+    assert reading.value == 1234567
+    assert reading.confidence == pytest.approx(0.8)
+
+
+def test_range_and_confidence():
+    assert parse_reading([('5,000,000', 0.9)], value_range=(0, 1000000)).problem == 'range'
+    doubtful = parse_reading([('120', 0.9, [0.9, 0.3, 0.9])], min_confidence=0.5)
+    assert doubtful.problem == 'confidence'
+    assert doubtful.confidence == pytest.approx(0.3)
+    assert doubtful.usable
+
+
+def test_best_reading_prefers_the_mildest_problem():
+    formatted = Reading(1234, 0.99, '12 34', 'format')
+    doubtful = Reading(120, 0.4, '120', 'confidence')
+    good = Reading(130, 0.6, '130', None)
+    assert best_reading([formatted, doubtful]) is doubtful
+    assert best_reading([doubtful, good, formatted]) is good
+    assert best_reading([Reading(1, 0.5, '1', None), good]) is good
+
+
+def test_left_to_right():
+    right = ([(50, 0), (60, 0), (60, 10), (50, 10)], '567', 0.9)
+    left = ([(0, 0), (40, 0), (40, 10), (0, 10)], '1,234,', 0.9)
+    assert left_to_right([right, left]) == [left, right]
+
+
+def test_cache_key_includes_the_resource():
+    crop = np.zeros((10, 30), dtype=np.uint8)
+    assert OCRCache.key(crop, 'Gold') == OCRCache.key(crop.copy(), 'Gold')
+    assert OCRCache.key(crop, 'Gold') != OCRCache.key(crop, 'Dark Elixir')
@@ -0,0 +1,66 @@
+import threading
+import time
+
+import pytest
+
+from pipeline import ResultsPipeline
+
+
+def slow_first(frame):
+    """Result of a frame, the first one taking longest"""
+    if frame == 0:
+        time.sleep(0.05)
+    return (frame, 2 * frame, 1)
+
+
+@pytest.mark.parametrize('threaded', [True, False])
+def test_results_arrive_in_submission_order(threaded):
+    seen = []
+    results = ResultsPipeline(slow_first, lambda seq, result, totals: seen.append((seq, result, totals)),
+                              threaded=threaded)
+    seqs = [results.submit(frame) for frame in range(5)]
+    assert results.drain(timeout=5)
+
+    assert seqs == [0, 1, 2, 3, 4]
+    assert [seq for seq, _, _ in seen] == seqs
+    assert seen[2] == (2, (2, 4, 1), [3, 6, 3])
+    assert results.snapshot() == ([10, 20, 5], 0)
+
+
+def test_inline_results_are_ready_on_submit():
+    results = ResultsPipeline(lambda frame: (frame, 0, 0), threaded=False)
+    results.submit(7)
+    assert results.thread is None
+    assert results.snapshot() == ([7, 0, 0], 0)
+
+
+def test_failed_frame_counts_as_nothing():
+    def process(frame):
+        if frame is None:
+            raise ValueError('unreadable')
+        return (frame, frame, frame)
+
+    seen = []
+    results = ResultsPipeline(process, lambda seq, result, totals: seen.append(result))
+    for frame in (1, None, 2):
+        results.submit(frame)
+    assert results.drain(timeout=5)
+    assert results.snapshot() == ([3, 3, 3], 0)
+    assert seen[1] == (None, None, None)
+
+
+def test_unread_values_add_nothing():
+    results = ResultsPipeline(lambda frame: frame, threaded=False)
+    results.submit((5, None, 1))
+    results.submit((None, 2, None))
+    assert results.snapshot() == ([5, 2, 1], 0)
+
+
+def test_drain_times_out_while_a_frame_is_in_flight():
+    release = threading.Event()
+    results = ResultsPipeline(lambda frame: (release.wait(5), 0, 0))
+    results.submit(0)
+    assert not results.drain(timeout=0.05)
+    assert results.snapshot()[1] == 1
+    release.set()
+    assert results.drain(timeout=5)
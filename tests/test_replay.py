@@ -0,0 +1,43 @@
+import numpy as np
+
+from capture import FakeBackend
+from replay import RecordingBackend, ReplaySession, SessionRecorder
+
+
+def screen(counter=0, sparkle=0):
+    """A 1280x720 screen with a loot counter and a small animated sparkle"""
+    image = np.full((720, 1280, 3), 40, dtype=np.uint8)
+    image[100:140, 200:260] = 40 + 50 * counter
+    image[600:608, 1000:1008] = 40 + 100 * sparkle
+    return image
+
+
+def record(path, grabs):
+    """Record the (event, screen) steps; event is None for a plain poll"""
+    frames = [image for _, image in grabs]
+    recorder = SessionRecorder(str(path))
+    backend = RecordingBackend(FakeBackend(frames, loop=False), recorder)
+    for event, _ in grabs:
+        if event is not None:
+            recorder.event('click', event)
+        backend.grab((0, 0, 10, 10))
+    recorder.close()
+    return recorder
+
+
+def test_animation_is_not_recorded_but_changes_are(tmp_path):
+    grabs = [(None, screen()), (None, screen(sparkle=1)), (None, screen(sparkle=2)),
+             (None, screen(counter=1, sparkle=1)), (None, screen(counter=1, sparkle=2))]
+    recorder = record(tmp_path / 'session.zip', grabs)
+    assert len(recorder.frames) == 2
+
+    session = ReplaySession(str(tmp_path / 'session.zip'))
+    assert session.next_frame()[120, 230, 0] == 40
+    assert session.next_frame()[120, 230, 0] == 90
+    session.close()
+
+
+def test_first_frame_after_an_input_is_kept(tmp_path):
+    grabs = [(None, screen()), (None, screen()), ((5, 5), screen()), (None, screen())]
+    recorder = record(tmp_path / 'session.zip', grabs)
+    assert [frame['events'] for frame in recorder.frames] == [0, 1]
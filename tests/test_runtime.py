@@ -0,0 +1,148 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from capture import FakeBackend, FrameCapture
+from inputs import FakeInput
+from replay import VirtualClock
+from runtime import Runtime
+from waits import ScreenWaiter
+
+
+REGION = (0, 0, 40, 40)
+
+
+def screens(*shades):
+    return [np.full((40, 40, 3), shade, dtype=np.uint8) for shade in shades]
+
+
+def runtime(frames, clock):
+    """Deterministic runtime: inline work, frames grabbed on the virtual clock
+
+    A power-of-two interval keeps the virtual times exact.
+    """
+    capture = FrameCapture(FakeBackend(frames))
+    inputs = FakeInput(clock=clock.now)
+    return Runtime(capture, inputs, interval=0.25, threaded=False, clock=clock.now, sleep=clock.sleep)
+
+
+def test_next_frame_is_grabbed_one_interval_later():
+    clock = VirtualClock()
+    rt = runtime(screens(10, 20, 30), clock)
+
+    async def main():
+        rt.watch([REGION])
+        first, first_at = await rt.next_frame()
+        again, again_at = await rt.next_frame()
+        newer, newer_at = await rt.next_frame(after=first_at)
+        return first, first_at, again_at, newer, newer_at
+
+    first, first_at, again_at, newer, newer_at = asyncio.run(rt.run(main()))
+    assert first.image[0, 0, 0] == 10
+    # Without `after` the latest frame is reused
+    assert again_at == first_at == 0.25
+    assert newer.image[0, 0, 0] == 20
+    assert newer_at == 0.5
+    assert (rt.frames, rt.used) == (2, 3)
+
+
+def test_next_frame_raises_capture_errors():
+    clock = VirtualClock()
+    rt = runtime([], clock)
+
+    async def main():
+        rt.watch([REGION])
+        await rt.next_frame()
+
+    with pytest.raises(ValueError):
+        asyncio.run(rt.run(main()))
+
+
+def test_wait_returns_the_settled_frame():
+    clock = VirtualClock()
+    frames = screens(0, 0, *[255] * 20)
+    rt = runtime(frames, clock)
+    waiter = ScreenWaiter(rt.capture, clock=clock.now, sleep=clock.sleep)
+    baseline = waiter.frame_signature(FrameCapture(FakeBackend(frames)).grab([REGION]), REGION).copy()
+    still = []
+
+    async def main():
+        rt.watch([REGION])
+        return await rt.wait(waiter, REGION, baseline, timeout=5.0, settle=0.5, on_still=still.append)
+
+    settled, frame = asyncio.run(rt.run(main()))
+    assert settled
+    assert frame.image[0, 0, 0] == 255
+    # White from 0.75 s, still from 1.0 s, settled 0.5 s later
+    assert clock.now() == 1.5
+    assert len(still) == 1 and still[0].image[0, 0, 0] == 255
+    assert (waiter.waits, waiter.timeouts) == (1, 0)
+
+
+def test_wait_times_out_on_a_flickering_screen():
+    clock = VirtualClock()
+    rt = runtime(screens(0, 255), clock)
+    waiter = ScreenWaiter(rt.capture, clock=clock.now, sleep=clock.sleep)
+
+    async def main():
+        rt.watch([REGION])
+        return await rt.wait(waiter, REGION, timeout=2.0)
+
+    settled, _ = asyncio.run(rt.run(main()))
+    assert not settled
+    assert clock.now() == 2.0
+    assert waiter.timeouts == 1
+
+
+def test_actions_run_in_submission_order():
+    clock = VirtualClock()
+    rt = runtime(screens(0), clock)
+
+    def fail():
+        raise RuntimeError("tap went nowhere")
+
+    async def main():
+        clicks = [rt.click((i, i)) for i in range(3)]
+        failed = rt.act(fail)
+        last = rt.act(lambda: 'done')
+        return await asyncio.gather(*clicks, failed, last, return_exceptions=True)
+
+    results = asyncio.run(rt.run(main()))
+    assert [pos for _, _, pos in rt.inputs.events] == [(0, 0), (1, 1), (2, 2)]
+    assert isinstance(results[3], RuntimeError)
+    assert results[4] == 'done'
+    assert rt.actions == 5
+
+
+def test_background_jobs_finish_in_start_order():
+    clock = VirtualClock()
+    rt = runtime(screens(0), clock)
+    done = []
+
+    def job(i):
+        done.append(i)
+        return i * 10
+
+    async def main():
+        futures = [rt.background(job, i) for i in range(4)]
+        return await futures[2]
+
+    assert asyncio.run(rt.run(main())) == 20
+    # run() lets every started job finish before returning
+    assert done == [0, 1, 2, 3]
+    assert not rt.pending
+
+
+def test_timers_follow_virtual_time():
+    clock = VirtualClock()
+    rt = runtime(screens(0), clock)
+    fired = []
+
+    async def main():
+        rt.every(1.0, lambda: fired.append(clock.now()))
+        for _ in range(5):
+            await rt.sleep(0.5)
+
+    asyncio.run(rt.run(main()))
+    assert fired == [1.0, 2.0]
@@ -0,0 +1,43 @@
+import itertools
+
+import numpy as np
+
+from thresholds import RESOURCES, ThresholdController
+
+
+class EmptyStore:
+    logged = 0
+
+
+def brute_force(model, weights, candidates):
+    """Loot/hour of every threshold combination, one combination at a time"""
+    values = model['values']
+    loot = values @ (model['yields'] * weights)
+    rates = np.empty(tuple(len(c) for c in candidates))
+    for index in itertools.product(*(range(len(c)) for c in candidates)):
+        limits = np.array([candidates[r][i] for r, i in enumerate(index)])
+        attacked = (values >= limits).any(axis=1)
+        cost = len(values) * model['search_s'] + attacked.sum() * model['attack_s']
+        rates[index] = 3600.0 * loot[attacked].sum() / cost
+    return rates
+
+
+def test_rates_match_brute_force():
+    rng = np.random.default_rng(7)
+    values = np.column_stack([rng.integers(0, 800000, 300), rng.integers(0, 800000, 300),
+                              rng.integers(0, 8000, 300)]).astype(np.float64)
+    # Some bases sit exactly on a candidate, which must count as accepted
+    values[:5, 0] = 400000
+    model = {'values': values, 'search_s': 6.5, 'attack_s': 95.0, 'yields': np.array([0.8, 0.7, 0.5])}
+    controller = ThresholdController(EmptyStore(), {}, weights={'Dark Elixir': 50.0})
+
+    candidates = [np.append(np.quantile(values[:, r], [0.2, 0.5, 0.9]).round(), np.inf)
+                  for r in range(len(RESOURCES))]
+    candidates[0][1] = 400000
+
+    expected = brute_force(model, controller.weights, candidates)
+    assert np.allclose(controller.rates(model, candidates), expected)
+
+    thresholds = {'Gold': 400000, 'Elixir': 250000, 'Dark Elixir': float('inf')}
+    single = [np.array([thresholds[name]]) for name in RESOURCES]
+    assert np.isclose(controller.rate(model, thresholds), brute_force(model, controller.weights, single)[0, 0, 0])
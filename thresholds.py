@@ -0,0 +1,171 @@
+import numpy as np
+
+
+# Column order of BaseStore.recent()
+RESOURCES = ('Gold', 'Elixir', 'Dark Elixir')
+VALUE_COLS = [0, 1, 2]
+SEARCH_COL = 3
+ATTACKED_COL = 4
+ATTACK_COL = 5
+EARNED_COLS = [6, 7, 8]
+
+# Candidate thresholds are these quantiles of each resource's observed values (plus "never")
+DEFAULT_QUANTILES = (0.5, 0.7, 0.8, 0.85, 0.9, 0.93, 0.96, 0.98, 0.99)
+
+
+def fit_model(rows, default_attack_s=90.0, default_yield=0.7, min_attacks=3):
+    """Search cost, attack cost, per-resource yield and the fully read bases of a base log"""
+    values = rows[:, VALUE_COLS]
+    complete = ~np.isnan(values).any(axis=1)
+
+    searched = ~np.isnan(rows[:, SEARCH_COL]) & (rows[:, ATTACKED_COL] == 0)
+    search_s = rows[searched, SEARCH_COL].mean() if searched.any() else np.nan
+
+    attacked = (rows[:, ATTACKED_COL] == 1) & ~np.isnan(rows[:, ATTACK_COL])
+    attack_s = rows[attacked, ATTACK_COL].mean() if attacked.any() else default_attack_s
+
+    # Earned vs. offered loot, only over attacks whose results and offer were both read
+    scored = attacked & complete & ~np.isnan(rows[:, EARNED_COLS]).any(axis=1)
+    yields = np.full(len(RESOURCES), default_yield)
+    if scored.sum() >= min_attacks:
+        offered = values[scored].sum(axis=0)
+        earned = rows[scored][:, EARNED_COLS].sum(axis=0)
+        has_offer = offered > 0
+        yields[has_offer] = np.clip(earned[has_offer] / offered[has_offer], 0.0, 1.0)
+
+    return {
+        'values': values[complete],
+        'search_s': search_s,
+        'attack_s': attack_s,
+        'yields': yields,
+        'attacks': int(scored.sum()),
+    }
+
+
+class ThresholdController:
+    """Picks the loot thresholds that maximise expected loot per hour over the base log
+
+    Looking at a base costs the mean search time s; attacking one costs a further
+    attack time A and brings home a fraction ("yield") of the loot on offer. For
+    a threshold set accepting `count` of the last n bases,
+
+        loot/hour = 3600 * sum(weighted yield of accepted bases) / (n * s + count * A)
+
+    Every combination of per-resource quantile thresholds is scored at once with
+    NumPy; the best replaces the current set only when it is clearly better.
+    """
+
+    def __init__(self, store, initial, weights=None, quantiles=DEFAULT_QUANTILES, window=5000,
+                 min_bases=200, update_every=25, min_gain=0.02, default_attack_s=90.0,
+                 default_yield=0.7, min_attacks=3):
+        self.store = store
+        self.thresholds = dict(initial)
+        self.weights = np.array([(weights or {}).get(name, 1.0) for name in RESOURCES])
+        self.quantiles = np.asarray(quantiles)
+        self.window = window
+        self.min_bases = min_bases
+        self.update_every = update_every
+        self.min_gain = min_gain
+        self.default_attack_s = default_attack_s
+        self.default_yield = default_yield
+        self.min_attacks = min_attacks
+        self.last_update = store.logged
+        self.model = None
+        self.updates = 0
+
+    def fit(self, rows):
+        return fit_model(rows, self.default_attack_s, self.default_yield, self.min_attacks)
+
+    def rates(self, model, candidates):
+        """Loot/hour for every combination of the ascending candidate thresholds, shape (k, k, k)
+
+        A base is skipped when every resource is under its threshold. Binning the bases
+        by candidate on each axis and taking cumulative sums gives the skipped count and
+        loot of every combination in one O(n) pass, with no (k, k, k, n) temporaries.
+        """
+        values = model['values']
+        n = len(values)
+        loot = values @ (model['yields'] * self.weights)
+
+        # bin = number of candidates <= value, so value < candidates[i] exactly when bin <= i
+        bins = [np.searchsorted(candidates[r], values[:, r], side='right') for r in range(len(RESOURCES))]
+        shape = tuple(len(c) + 1 for c in candidates)
+        flat = np.ravel_multi_index(bins, shape)
+        size = int(np.prod(shape))
+        skipped = np.bincount(flat, minlength=size).reshape(shape).astype(np.float64)
+        skipped_loot = np.bincount(flat, weights=loot, minlength=size).reshape(shape)
+        for axis in range(len(shape)):
+            np.cumsum(skipped, axis=axis, out=skipped)
+            np.cumsum(skipped_loot, axis=axis, out=skipped_loot)
+
+        inner = tuple(slice(0, len(c)) for c in candidates)
+        gain = loot.sum() - skipped_loot[inner]
+        count = n - skipped[inner]
+        return 3600.0 * gain / (n * model['search_s'] + count * model['attack_s'])
+
+    def rate(self, model, thresholds):
+        candidates = [np.array([thresholds[name]], dtype=np.float64) for name in RESOURCES]
+        return float(self.rates(model, candidates)[0, 0, 0])
+
+    def misread_rate(self, model, thresholds, misread, ratios):
+        """Expected loot/hour at these thresholds when each read is wrong with probability misread
+
+        A wrong read is the true value times one of `ratios`, all equally likely (0 for a
+        counter that could not be read), so it can skip a base worth attacking or spend
+        an attack on one that is not. Loot still counts what each base really offered.
+        """
+        values = model['values']
+        limits = np.array([thresholds[name] for name in RESOURCES], dtype=np.float64)
+        passes = (values >= limits).astype(np.float64)
+        if misread and len(ratios):
+            wrong = (values[:, :, None] * np.asarray(ratios) >= limits[:, None]).mean(axis=2)
+            passes = (1 - misread) * passes + misread * wrong
+        # A base is attacked when any resource passes
+        attacked = 1.0 - np.prod(1.0 - passes, axis=1)
+        loot = values @ (model['yields'] * self.weights)
+        n = len(values)
+        return 3600.0 * (attacked @ loot) / (n * model['search_s'] + attacked.sum() * model['attack_s'])
+
+    def maybe_update(self):
+        """Refit every `update_every` logged bases; returns True when the thresholds changed"""
+        if self.store.logged - self.last_update < self.update_every:
+            return False
+        self.last_update = self.store.logged
+
+        model = self.fit(self.store.recent(self.window))
+        if len(model['values']) < self.min_bases or np.isnan(model['search_s']):
+            return False
+
+        values = model['values']
+        candidates = [np.append(np.ceil(np.quantile(values[:, r], self.quantiles)), np.inf)
+                      for r in range(len(RESOURCES))]
+        rates = self.rates(model, candidates)
+        best = np.unravel_index(np.argmax(rates), rates.shape)
+        best_rate = float(rates[best])
+
+        current_rate = self.rate(model, self.thresholds)
+        model['rate'] = current_rate
+        self.model = model
+        if best_rate <= current_rate * (1 + self.min_gain):
+            return False
+
+        self.thresholds = {name: (int(candidates[r][best[r]]) if np.isfinite(candidates[r][best[r]])
+                                  else float('inf'))
+                           for r, name in enumerate(RESOURCES)}
+        model['rate'] = best_rate
+        self.updates += 1
+        return True
+
+    def summary(self):
+        """Current thresholds and, once fitted, the costs and rate they were chosen on"""
+        summary = {'thresholds': dict(self.thresholds), 'updates': self.updates}
+        if self.model is not None:
+            summary.update({
+                'bases': len(self.model['values']),
+                'attacks': self.model['attacks'],
+                'search_s': float(self.model['search_s']),
+                'attack_s': float(self.model['attack_s']),
+                'yields': dict(zip(RESOURCES, self.model['yields'].tolist())),
+                'loot_per_hour': self.model['rate'],
+            })
+        return summary
@@ -0,0 +1,138 @@
+import time
+
+import cv2
+import numpy as np
+
+from preprocess import GREY_CODES
+
+
+def button_box(pos, radius=40):
+    """Square region centred on a button position"""
+    x, y = pos
+    return (x - radius, y - radius, x + radius, y + radius)
+
+
+class ScreenWaiter:
+    """Waits for a screen region to change and then hold still, instead of fixed sleeps"""
+
+    def __init__(self, capture, poll=0.05, scale=0.25, change_threshold=8.0,
+                 stable_threshold=2.0, clock=time.monotonic, sleep=time.sleep):
+        self.capture = capture
+        self.poll = poll
+        self.scale = scale
+        self.change_threshold = change_threshold
+        self.stable_threshold = stable_threshold
+        self.clock = clock
+        self.sleep = sleep
+
+        self.waits = 0
+        self.timeouts = 0
+        self.waited = 0.0
+        # Downscaled colour and grey scratch images, and the two signatures a wait
+        # alternates between, per region; polling allocates nothing after the first wait
+        self.scratch = {}
+        self.slots = {}
+
+    def signature(self, region, out=None):
+        """Cheap downscaled greyscale sample of a region (written into out if given)"""
+        return self.frame_signature(self.capture.grab([region]), region, out)
+
+    def frame_signature(self, frame, region, out=None):
+        """signature() of a region in an already captured frame"""
+        crop = frame.crop(region)
+        h, w = crop.shape[:2]
+        size = (max(1, round(w * self.scale)), max(1, round(h * self.scale)))
+        key = (size, crop.shape[2:], frame.order)
+        buffers = self.scratch.get(key)
+        if buffers is None:
+            buffers = self.scratch[key] = (np.empty((size[1], size[0]) + crop.shape[2:], dtype=np.uint8),
+                                           np.empty((size[1], size[0]), dtype=np.uint8))
+        small, grey = buffers
+        # Area-average first, then convert: near-identical result, far fewer pixels to convert
+        cv2.resize(crop, size, dst=small, interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            cv2.cvtColor(small, GREY_CODES.get(frame.order, cv2.COLOR_RGB2GRAY), dst=grey)
+        else:
+            grey = small
+        if out is None or out.shape != grey.shape:
+            return grey.astype(np.int16)
+        np.copyto(out, grey)
+        return out
+
+    @staticmethod
+    def difference(a, b):
+        """Mean absolute pixel difference (0-255)"""
+        if a.shape != b.shape:
+            return 255.0
+        return cv2.norm(a, b, cv2.NORM_L1) / a.size
+
+    def wait(self, region, baseline=None, timeout=5.0, settle=0.3, min_wait=0.0):
+        """Block until region differs from baseline (if given) and stays still for settle seconds
+
+        Returns True once settled, False if timeout ran out first.
+        """
+        start = self.clock()
+        state = Settle(self, baseline, settle, min_wait, start)
+        self.waits += 1
+        key = tuple(region)
+        spare, other = self.slots.get(key, (None, None))
+
+        try:
+            while True:
+                now = self.clock()
+                elapsed = now - start
+                current = self.signature(region, spare)
+                if state.update(current, now):
+                    self.waited += elapsed
+                    return True
+
+                # The signature before previous is no longer needed; overwrite it next
+                if other is None or other.shape != current.shape:
+                    other = np.empty_like(current)
+                spare, other = other, current
+                if elapsed >= timeout:
+                    self.timeouts += 1
+                    self.waited += elapsed
+                    return False
+                self.sleep(self.poll)
+        finally:
+            self.slots[key] = (spare, other)
+
+    def stats(self):
+        return {'waits': self.waits, 'timeouts': self.timeouts, 'waited_s': self.waited}
+
+
+class Settle:
+    """The change-then-hold-still test of ScreenWaiter.wait, fed one signature at a time
+
+    The signature passed last is kept as `previous`, so the caller must not overwrite
+    it before the next update.
+    """
+
+    def __init__(self, waiter, baseline=None, settle=0.3, min_wait=0.0, start=0.0):
+        self.waiter = waiter
+        self.baseline = baseline
+        self.settle = settle
+        self.min_wait = min_wait
+        self.start = start
+        self.changed = baseline is None
+        self.previous = None
+        self.stable_since = None
+
+    def update(self, current, now):
+        """True once the region has differed from baseline and then held still for settle seconds"""
+        waiter = self.waiter
+        if not self.changed and waiter.difference(current, self.baseline) > waiter.change_threshold:
+            self.changed = True
+
+        if self.changed and self.previous is not None and \
+                waiter.difference(current, self.previous) <= waiter.stable_threshold:
+            if self.stable_since is None:
+                self.stable_since = now
+            if now - self.stable_since >= self.settle and now - self.start >= self.min_wait:
+                return True
+        else:
+            self.stable_since = None
+
+        self.previous = current
+        return False